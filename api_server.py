@@ -0,0 +1,360 @@
+"""
+Headless HTTP API for the resume analyzer
+
+    python api_server.py --port 8000 --llm stub
+
+Endpoints:
+    GET  /health              liveness check
+    GET  /v1/stats            admission and embedding-batching statistics
+    GET  /metrics             per-stage timing histograms (Prometheus text)
+    POST /v1/analyze          one resume vs one job description
+    POST /v1/analyze/batch    many resumes vs one job description; with
+                              "top_k": N only the N closest resumes by
+                              embedding are fully analyzed and saved
+
+Add "debug": true to a request for its per-stage timing breakdown, or
+"profile": "cprofile" / "pyinstrument" for a profile as well.
+
+Documents are sent as {"filename": ..., "text": ...} or
+{"filename": ..., "content_base64": ..., "content_type": "application/pdf"}.
+"""
+import argparse
+import base64
+import binascii
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.database import AnalysisDatabase
+from utils.compact import CompactEmbeddingStore
+from utils.document import Document
+from utils.embedding_pool import EmbeddingProcessPool
+from utils.embedding_service import EmbeddingService
+from utils.feature_extractor import ResumeJobMatcher
+from utils.instrumentation import METRICS, request_trace
+from utils.llm_suggester import GeminiSuggester, StubSuggester
+from utils.pipeline import run_analysis
+from utils.skill_extractor import SkillExtractor
+
+
+class Overloaded(Exception):
+    """Raised when admission control rejects a request"""
+
+
+class RequestError(Exception):
+    """Raised for malformed request bodies"""
+
+
+class AdmissionController:
+    """
+    Bounds work in flight: at most max_concurrency analyses run at once and
+    at most max_queue wait for a slot; anything beyond is rejected with 503
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=16, queue_timeout=30.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected = 0
+        self._completed = 0
+
+    def __enter__(self):
+        with self._lock:
+            if self._admitted >= self.max_concurrency + self.max_queue:
+                self._rejected += 1
+                raise Overloaded("Server is at capacity, retry later")
+            self._admitted += 1
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._admitted -= 1
+                self._rejected += 1
+            raise Overloaded("Timed out waiting for an analysis slot")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._slots.release()
+        with self._lock:
+            self._admitted -= 1
+            self._completed += 1
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight_or_queued': self._admitted,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'completed': self._completed,
+                'rejected': self._rejected
+            }
+
+
+class AnalysisService:
+    """Model instances shared by every request handled by the server"""
+
+    def __init__(self, db_name='resume_analysis.db', llm='gemini', stub_latency_ms=0,
+                 max_concurrency=4, max_queue=16, max_batch_size=100,
+                 embedding_processes=0, embedding_threads=None):
+        # With a pool the model lives in the pool's processes only
+        self.matcher = ResumeJobMatcher(load_model=not embedding_processes)
+        # Optionally run forward passes on a pool of thread-pinned worker processes
+        self.embedding_pool = None
+        batch_size = 32
+        if embedding_processes:
+            self.embedding_pool = EmbeddingProcessPool(
+                self.matcher.model_name, embedding_processes, embedding_threads
+            ).start()
+            self.matcher.use_pool(self.embedding_pool)
+            batch_size = 32 * self.embedding_pool.config['processes']
+        # Concurrent requests share micro-batched forward passes
+        self.embedding_service = EmbeddingService(self.matcher.encode_batch, max_batch_size=batch_size, max_wait_ms=5)
+        self.matcher.use_service(self.embedding_service)
+        self.skill_extractor = SkillExtractor()
+        self.db = AnalysisDatabase(db_name)
+        self.llm_suggester = self._load_llm(llm, stub_latency_ms)
+        self.admission = AdmissionController(max_concurrency, max_queue)
+        self.max_batch_size = max_batch_size
+
+    def close(self):
+        """Stop the embedding service and pool"""
+        self.embedding_service.stop()
+        if self.embedding_pool is not None:
+            self.embedding_pool.close()
+
+    @staticmethod
+    def _load_llm(llm, stub_latency_ms):
+        if llm == 'stub':
+            return StubSuggester(stub_latency_ms)
+        if llm == 'gemini':
+            try:
+                return GeminiSuggester()
+            except ValueError as e:
+                print(f"⚠️ {e}; suggestions disabled")
+        return None
+
+    @staticmethod
+    def parse_document(payload, field):
+        """Build a Document from a JSON document object"""
+        if not isinstance(payload, dict):
+            raise RequestError(f"'{field}' must be an object")
+        filename = payload.get('filename') or field
+        if 'text' in payload:
+            return Document(str(payload['text']), filename=filename)
+        if 'content_base64' in payload:
+            try:
+                raw_bytes = base64.b64decode(payload['content_base64'], validate=True)
+            except (binascii.Error, ValueError):
+                raise RequestError(f"'{field}.content_base64' is not valid base64")
+            document = Document.from_bytes(raw_bytes, filename, payload.get('content_type'))
+            if document.extraction_error:
+                raise RequestError(f"'{field}' could not be read: {document.extraction_error}")
+            return document
+        raise RequestError(f"'{field}' needs 'text' or 'content_base64'")
+
+    def analyze(self, body):
+        llm_suggester = self.llm_suggester if body.get('include_suggestions', True) else None
+        with self.admission, request_trace(profile=body.get('profile')) as trace:
+            resume_doc = self.parse_document(body.get('resume'), 'resume')
+            jd_doc = self.parse_document(body.get('job_description'), 'job_description')
+            result = run_analysis(resume_doc, jd_doc, self.matcher, self.skill_extractor, self.db, llm_suggester)
+        if body.get('debug') or body.get('profile'):
+            result['debug'] = trace.summary()
+        return result
+
+    def analyze_batch(self, body):
+        resumes = body.get('resumes')
+        if not isinstance(resumes, list) or not resumes:
+            raise RequestError("'resumes' must be a non-empty list")
+        if len(resumes) > self.max_batch_size:
+            raise RequestError(f"At most {self.max_batch_size} resumes per batch")
+        top_k = body.get('top_k')
+        if top_k is not None and (not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1):
+            raise RequestError("'top_k' must be a positive integer")
+        llm_suggester = self.llm_suggester if body.get('include_suggestions', False) else None
+        with self.admission, request_trace(profile=body.get('profile')) as trace:
+            # The JD is parsed once so its cleaned text, skills and embedding are shared
+            jd_doc = self.parse_document(body.get('job_description'), 'job_description')
+            resume_docs = [self.parse_document(item, f'resumes[{i}]') for i, item in enumerate(resumes)]
+            # Embed every document together before scoring
+            self.matcher.embed_documents([jd_doc] + resume_docs)
+            if top_k is not None:
+                resume_docs = self.shortlist(jd_doc, resume_docs, top_k)
+            results = [
+                run_analysis(resume_doc, jd_doc, self.matcher, self.skill_extractor, self.db, llm_suggester)
+                for resume_doc in resume_docs
+            ]
+        results.sort(key=lambda result: result['similarity_score'], reverse=True)
+        response = {'count': len(results), 'screened': len(resumes), 'results': results}
+        if body.get('debug') or body.get('profile'):
+            response['debug'] = trace.summary()
+        return response
+
+    def shortlist(self, jd_doc, resume_docs, k):
+        """
+        The k resumes closest to the JD by embedding, best first
+        Skills, suggestions and saving then run for those only. Vectors are
+        held as float16, which is precise enough to rank; run_analysis
+        recomputes the exact scores.
+        """
+        vectors = [doc.embedding(self.matcher) for doc in resume_docs]
+        store = CompactEmbeddingStore(dim=len(vectors[0]), precision='float16', capacity=len(vectors))
+        store.add(vectors)
+        indices, _ = store.top_k(jd_doc.embedding(self.matcher), k)
+        return [resume_docs[i] for i in indices]
+
+    def stats(self):
+        stats = {
+            'admission': self.admission.stats(),
+            'embedding_service': self.embedding_service.stats()
+        }
+        if self.embedding_pool is not None:
+            stats['embedding_pool'] = self.embedding_pool.stats()
+        return stats
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ResumeAnalyzerAPI/1.0'
+    max_body_bytes = 20 * 1024 * 1024
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _content_length(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Without a usable length the body can't be skipped either
+            self.close_connection = True
+            raise RequestError("Invalid Content-Length header")
+        return length
+
+    def _read_json(self):
+        length = self._content_length()
+        if length > self.max_body_bytes:
+            # The unread body would corrupt the next request on this connection
+            self.close_connection = True
+            raise RequestError("Request body too large")
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            raise RequestError(f"Invalid JSON: {e}")
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/v1/stats':
+            self._send_json(200, self.service.stats())
+        elif self.path == '/metrics':
+            body = METRICS.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        routes = {
+            '/v1/analyze': self.service.analyze,
+            '/v1/analyze/batch': self.service.analyze_batch
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            # The body is never read, so it must not be parsed as the next request
+            self.close_connection = True
+            self._send_json(404, {'error': 'Not found'})
+            return
+        started = time.perf_counter()
+        try:
+            body = self._read_json()
+            if not isinstance(body, dict):
+                raise RequestError("Request body must be a JSON object")
+            result = handler(body)
+        except RequestError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Overloaded as e:
+            self._send_json(503, {'error': str(e)}, headers={'Retry-After': '1'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': f"Analysis failed: {e}"})
+            return
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._send_json(200, result, headers={'X-Elapsed-Ms': str(elapsed_ms)})
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class AnalysisHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for many keep-alive clients; admission control bounds the actual work
+    request_queue_size = 128
+
+    def __init__(self, address, service, quiet=False):
+        super().__init__(address, AnalysisRequestHandler)
+        self.service = service
+        self.quiet = quiet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resume analyzer HTTP API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--db', default='resume_analysis.db', help="SQLite database file")
+    parser.add_argument('--llm', choices=['gemini', 'stub', 'none'], default='gemini')
+    parser.add_argument('--stub-latency-ms', type=int, default=0, help="Simulated latency of the stub LLM")
+    parser.add_argument('--max-concurrency', type=int, default=4, help="Analyses running at once")
+    parser.add_argument('--max-queue', type=int, default=16, help="Requests allowed to wait for a slot")
+    parser.add_argument('--max-batch-size', type=int, default=100, help="Resumes per batch request")
+    parser.add_argument('--embedding-processes', type=int, default=0,
+                        help="Embedding worker processes (0: encode in the server process)")
+    parser.add_argument('--embedding-threads', type=int,
+                        help="PyTorch threads per embedding process (default: an even share of the cores)")
+    parser.add_argument('--quiet', action='store_true', help="Disable per-request logging")
+    args = parser.parse_args()
+
+    service = AnalysisService(
+        db_name=args.db,
+        llm=args.llm,
+        stub_latency_ms=args.stub_latency_ms,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        max_batch_size=args.max_batch_size,
+        embedding_processes=args.embedding_processes,
+        embedding_threads=args.embedding_threads
+    )
+    server = AnalysisHTTPServer((args.host, args.port), service, quiet=args.quiet)
+    print(f"✅ Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,16 @@
 import streamlit as st
-from utils.text_processor import extract_text_from_pdf, extract_text_from_txt, clean_text
-from utils.feature_extractor import ResumeJobMatcher
-from utils.skill_extractor import SkillExtractor
-from utils.llm_suggester import GeminiSuggester
+import os
+import time
+from collections import Counter
+from utils.job_queue import JobQueue, JobWorkerPool
 from utils.visualizations import (
     create_gauge_chart, 
     create_skill_comparison_chart,
-    create_category_breakdown_chart
+    create_category_breakdown_chart,
+    get_score_trend_figure
 )
 from utils.database import AnalysisDatabase
-import plotly.express as px
+import pandas as pd
 from datetime import datetime
 
 # Page configuration
@@ -19,22 +20,136 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize models and database
+# Initialize database and job queue
+db = AnalysisDatabase()
+job_queue = JobQueue(db.db_name)
+
+# Start background workers once per server process. Models are loaded inside
+# the workers; set ANALYSIS_WORKERS=0 to run them separately with
+# `python -m utils.job_queue --workers N`.
 @st.cache_resource
-def load_models():
-    matcher = ResumeJobMatcher()
-    skill_extractor = SkillExtractor()
-    try:
-        llm_suggester = GeminiSuggester()
-    except ValueError as e:
-        st.error(f"⚠️ {str(e)}")
-        llm_suggester = None
-    return matcher, skill_extractor, llm_suggester
+def start_job_workers():
+    num_workers = int(os.getenv('ANALYSIS_WORKERS', '2'))
+    if num_workers <= 0:
+        return None
+    return JobWorkerPool(db.db_name, num_workers=num_workers).start()
 
-matcher, skill_extractor, llm_suggester = load_models()
+start_job_workers()
 
-# Initialize database
-db = AnalysisDatabase()
+# Job ids submitted from this browser session (restored from the URL on reload)
+if 'job_ids' not in st.session_state:
+    st.session_state.job_ids = [int(j) for j in st.query_params.get_all("job") if j.isdigit()]
+
+def render_analysis(result, job_id):
+    """
+    Render a finished analysis result (as produced by utils.pipeline.run_analysis)
+    job_id keys the charts, so several results can be shown on one page
+    """
+    similarity_score = result['similarity_score']
+    match_category = result['match_category']
+    skill_analysis = result['skill_analysis']
+    
+    # Display Gauge Charts
+    st.markdown("---")
+    st.subheader("📊 Match Score Visualization")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        gauge1 = create_gauge_chart(similarity_score, "Semantic Match Score")
+        st.plotly_chart(gauge1, use_container_width=True, key=f"gauge-semantic-{job_id}")
+    
+    with col2:
+        gauge2 = create_gauge_chart(skill_analysis['skill_match_percentage'], "Skills Match Score")
+        st.plotly_chart(gauge2, use_container_width=True, key=f"gauge-skills-{job_id}")
+    
+    # Display Key Metrics
+    st.markdown("---")
+    st.subheader("📈 Key Performance Indicators")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            label="Overall Match",
+            value=f"{similarity_score}%",
+            delta=match_category
+        )
+    
+    with col2:
+        st.metric(
+            label="Matched Skills",
+            value=skill_analysis['total_matched'],
+            delta=f"{skill_analysis['skill_match_percentage']}%"
+        )
+    
+    with col3:
+        st.metric(
+            label="Missing Skills",
+            value=len(skill_analysis['missing_skills']),
+            delta="Needs work" if len(skill_analysis['missing_skills']) > 0 else "Perfect",
+            delta_color="inverse"
+        )
+    
+    with col4:
+        st.metric(
+            label="Bonus Skills",
+            value=len(skill_analysis['extra_skills']),
+            delta="Added value"
+        )
+    
+    # Skill Comparison Chart
+    st.markdown("---")
+    skill_comparison = create_skill_comparison_chart(
+        skill_analysis['total_matched'],
+        len(skill_analysis['missing_skills']),
+        len(skill_analysis['extra_skills'])
+    )
+    st.plotly_chart(skill_comparison, use_container_width=True, key=f"skill-comparison-{job_id}")
+    
+    # AI-Powered Suggestions
+    if result['suggestions']:
+        st.markdown("---")
+        st.subheader("🤖 AI-Powered Career Coaching")
+        st.markdown(result['suggestions'])
+        
+        # Quick Tip
+        if result['quick_tip']:
+            with st.expander("💡 Priority Action Item", expanded=True):
+                st.info(result['quick_tip'])
+    
+    # Detailed Skill Analysis (condensed for space)
+    st.markdown("---")
+    st.subheader("🎯 Detailed Skill Breakdown")
+    
+    tab1, tab2, tab3 = st.tabs(["✅ Matched", "❌ Missing", "➕ Bonus"])
+    
+    with tab1:
+        if skill_analysis['matched_skills']:
+            st.success(f"**{len(skill_analysis['matched_skills'])} matched skills**")
+            st.write(", ".join(skill_analysis['matched_skills'][:20]))
+    
+    with tab2:
+        if skill_analysis['missing_skills']:
+            st.error(f"**{len(skill_analysis['missing_skills'])} missing skills**")
+            st.write(", ".join(skill_analysis['missing_skills'][:20]))
+    
+    with tab3:
+        if skill_analysis['extra_skills']:
+            st.info(f"**{len(skill_analysis['extra_skills'])} bonus skills**")
+            st.write(", ".join(skill_analysis['extra_skills'][:20]))
+    
+    # Debug panel: where the time went for this analysis
+    debug = result.get('debug')
+    if debug:
+        with st.expander("🐞 Debug: Timing Breakdown"):
+            st.write(f"Total: **{debug['total_ms']} ms**")
+            timings_df = pd.DataFrame(debug['stages'])
+            if not timings_df.empty:
+                st.bar_chart(timings_df.set_index('stage')['total_ms'])
+                st.dataframe(timings_df, use_container_width=True, hide_index=True, key=f"timings-{job_id}")
+            if debug.get('profile'):
+                st.code(debug['profile'])
 
 # Custom CSS
 st.markdown("""
@@ -65,6 +180,32 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### About")
     st.info("AI-powered resume analyzer using Sentence-BERT and Gemini AI")
+    
+    with st.expander("⚙️ Job Queue"):
+        queue_stats = job_queue.get_queue_stats()
+        st.metric("Queued", queue_stats.get('queued', 0))
+        st.metric("Running", queue_stats.get('running', 0))
+        st.metric("Done", queue_stats.get('done', 0))
+        st.metric("Failed", queue_stats.get('failed', 0))
+    
+    with st.expander("⚙️ Embedding Service"):
+        # Each worker process has its own service; workers publish their stats to the jobs table
+        worker_stats = job_queue.get_worker_stats()
+        if worker_stats:
+            histogram = Counter()
+            for service_stats in worker_stats.values():
+                histogram.update({int(size): count for size, count in service_stats['batch_size_histogram'].items()})
+            total_requests = sum(size * count for size, count in histogram.items())
+            total_batches = sum(histogram.values())
+            st.metric("Queue Depth", sum(s['queue_depth'] for s in worker_stats.values()))
+            st.metric("Avg Batch Size", round(total_requests / total_batches, 2) if total_batches else 0.0)
+            # Percentiles can't be merged across workers; show the slowest worker's
+            st.write(f"p50 latency: {max(s['p50_latency_ms'] for s in worker_stats.values())} ms")
+            st.write(f"p99 latency: {max(s['p99_latency_ms'] for s in worker_stats.values())} ms")
+            st.json(dict(sorted(histogram.items())))
+            st.caption(f"{len(worker_stats)} worker process(es)")
+        else:
+            st.caption("No worker has published stats in the last minute")
 
 # Main content based on page selection
 if page == "🔍 New Analysis":
@@ -99,160 +240,69 @@ if page == "🔍 New Analysis":
         if jd_file is not None:
             st.success(f"✅ Job Description uploaded: {jd_file.name}")
 
-    # Analyze button
+    # Analyze button: queue the job; background workers do the heavy lifting
     if resume_file and jd_file:
         if st.button("🔍 Analyze Job Fit", type="primary", use_container_width=True):
-            with st.spinner("🔄 Processing documents and generating AI insights..."):
-                
-                # Extract Resume Text
-                if resume_file.type == "application/pdf":
-                    resume_text = extract_text_from_pdf(resume_file)
-                else:
-                    resume_text = extract_text_from_txt(resume_file)
-                
-                # Extract Job Description Text
-                if jd_file.type == "application/pdf":
-                    jd_text = extract_text_from_pdf(jd_file)
-                else:
-                    jd_text = extract_text_from_txt(jd_file)
-                
-                # Clean both texts
-                resume_cleaned = clean_text(resume_text)
-                jd_cleaned = clean_text(jd_text)
-                
-                # Calculate metrics
-                resume_word_count = len(resume_cleaned.split())
-                jd_word_count = len(jd_cleaned.split())
-                
-                # Calculate semantic similarity score
-                similarity_score = matcher.calculate_similarity(resume_cleaned, jd_cleaned)
-                match_category, status_type = matcher.get_match_category(similarity_score)
-                
-                # Extract and compare skills
-                skill_analysis = skill_extractor.compare_skills(resume_text, jd_text)
-                
-                # Save to database
-                analysis_id = db.save_analysis(
-                    resume_file.name,
-                    jd_file.name,
-                    similarity_score,
-                    skill_analysis,
-                    match_category,
-                    resume_word_count,
-                    jd_word_count
-                )
-                
-                st.success(f"✅ Analysis completed and saved! (ID: {analysis_id})")
-                
-                # Display Gauge Charts
-                st.markdown("---")
-                st.subheader("📊 Match Score Visualization")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    gauge1 = create_gauge_chart(similarity_score, "Semantic Match Score")
-                    st.plotly_chart(gauge1, use_container_width=True)
-                
-                with col2:
-                    gauge2 = create_gauge_chart(skill_analysis['skill_match_percentage'], "Skills Match Score")
-                    st.plotly_chart(gauge2, use_container_width=True)
-                
-                # Display Key Metrics
-                st.markdown("---")
-                st.subheader("📈 Key Performance Indicators")
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric(
-                        label="Overall Match",
-                        value=f"{similarity_score}%",
-                        delta=match_category
-                    )
-                
-                with col2:
-                    st.metric(
-                        label="Matched Skills",
-                        value=skill_analysis['total_matched'],
-                        delta=f"{skill_analysis['skill_match_percentage']}%"
-                    )
-                
-                with col3:
-                    st.metric(
-                        label="Missing Skills",
-                        value=len(skill_analysis['missing_skills']),
-                        delta="Needs work" if len(skill_analysis['missing_skills']) > 0 else "Perfect",
-                        delta_color="inverse"
-                    )
-                
-                with col4:
-                    st.metric(
-                        label="Bonus Skills",
-                        value=len(skill_analysis['extra_skills']),
-                        delta="Added value"
-                    )
-                
-                # Skill Comparison Chart
-                st.markdown("---")
-                skill_comparison = create_skill_comparison_chart(
-                    skill_analysis['total_matched'],
-                    len(skill_analysis['missing_skills']),
-                    len(skill_analysis['extra_skills'])
-                )
-                st.plotly_chart(skill_comparison, use_container_width=True)
-                
-                # AI-Powered Suggestions
-                if llm_suggester:
-                    st.markdown("---")
-                    st.subheader("🤖 AI-Powered Career Coaching")
-                    
-                    with st.spinner("🧠 Gemini AI is analyzing your profile..."):
-                        suggestions = llm_suggester.generate_suggestions(
-                            similarity_score,
-                            skill_analysis['skill_match_percentage'],
-                            skill_analysis['matched_skills'],
-                            skill_analysis['missing_skills'],
-                            skill_analysis['extra_skills']
-                        )
-                    
-                    st.markdown(suggestions)
-                    
-                    # Quick Tip
-                    if skill_analysis['missing_skills']:
-                        with st.expander("💡 Priority Action Item", expanded=True):
-                            quick_tip = llm_suggester.generate_quick_tip(skill_analysis['missing_skills'])
-                            st.info(quick_tip)
-                
-                # Detailed Skill Analysis (condensed for space)
-                st.markdown("---")
-                st.subheader("🎯 Detailed Skill Breakdown")
-                
-                tab1, tab2, tab3 = st.tabs(["✅ Matched", "❌ Missing", "➕ Bonus"])
-                
-                with tab1:
-                    if skill_analysis['matched_skills']:
-                        st.success(f"**{len(skill_analysis['matched_skills'])} matched skills**")
-                        st.write(", ".join(skill_analysis['matched_skills'][:20]))
-                
-                with tab2:
-                    if skill_analysis['missing_skills']:
-                        st.error(f"**{len(skill_analysis['missing_skills'])} missing skills**")
-                        st.write(", ".join(skill_analysis['missing_skills'][:20]))
-                
-                with tab3:
-                    if skill_analysis['extra_skills']:
-                        st.info(f"**{len(skill_analysis['extra_skills'])} bonus skills**")
-                        st.write(", ".join(skill_analysis['extra_skills'][:20]))
+            job_id = job_queue.submit(
+                resume_file.getvalue(), resume_file.name, resume_file.type,
+                jd_file.getvalue(), jd_file.name, jd_file.type
+            )
+            st.session_state.job_ids.append(job_id)
+            # Keep job ids in the URL so they survive page reloads
+            st.query_params["job"] = [str(j) for j in st.session_state.job_ids]
+            st.success(f"✅ Analysis queued (Job ID: {job_id})")
+    
+    # Poll submitted jobs, newest first
+    if st.session_state.job_ids:
+        st.markdown("---")
+        st.subheader("🗂️ Your Analyses")
+        auto_refresh = st.checkbox("Auto-refresh while jobs are running", value=True)
+        
+        pending = False
+        for position, job_id in enumerate(reversed(st.session_state.job_ids)):
+            job = job_queue.get_job(job_id)
+            if job is None:
+                continue
+            label = f"Job {job_id}: {job['resume_filename']} vs {job['jd_filename']} ({job['status']})"
+            
+            if job['status'] == 'done':
+                with st.expander(f"✅ {label}", expanded=position == 0):
+                    st.success(f"✅ Analysis completed and saved! (ID: {job['result']['analysis_id']})")
+                    render_analysis(job['result'], job_id)
+            elif job['status'] == 'failed':
+                with st.expander(f"❌ {label}"):
+                    st.error(f"Analysis failed after {job['attempts']} attempts")
+                    st.code(job['error'] or "Unknown error")
+            else:
+                pending = True
+                retry_note = f" (attempt {job['attempts']} of {job['max_attempts']})" if job['attempts'] > 1 else ""
+                st.info(f"🔄 {label}{retry_note}")
+        
+        if st.button("🧹 Clear list"):
+            st.session_state.job_ids = []
+            st.query_params.clear()
+            st.rerun()
+        
+        if pending and auto_refresh:
+            time.sleep(2)
+            st.rerun()
 
 elif page == "📜 History":
     st.title("📜 Analysis History")
     
-    # Get all analyses
-    history_df = db.get_all_analyses()
+    total_analyses = db.count_analyses()
     
-    if not history_df.empty:
-        st.info(f"📊 Total analyses recorded: **{len(history_df)}**")
+    if total_analyses > 0:
+        st.info(f"📊 Total analyses recorded: **{total_analyses}**")
+        
+        # Only one page of rows is sent to the browser
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+        num_pages = max(1, -(-total_analyses // page_size))
+        with col2:
+            page_number = st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, value=1, step=1)
+        history_df = db.get_analyses_page(limit=page_size, offset=(page_number - 1) * page_size)
         
         # Display history table
         st.dataframe(
@@ -313,17 +363,41 @@ elif page == "📈 Statistics":
         st.markdown("---")
         st.subheader("📊 Score Trends Over Time")
         
-        history_df = db.get_all_analyses()
-        
-        fig = px.line(
-            history_df,
-            x='timestamp',
-            y=['semantic_score', 'skill_match_score'],
-            title='Match Scores Trend',
-            labels={'value': 'Score (%)', 'timestamp': 'Date'},
-        )
+        # Downsampled in SQL and cached until new analyses arrive
+        fig = get_score_trend_figure(db)
         st.plotly_chart(fig, use_container_width=True)
         
+        # LLM cost per match band
+        llm_usage_df = db.get_llm_usage_by_band()
+        if not llm_usage_df.empty:
+            st.markdown("---")
+            st.subheader("🤖 AI Suggestions: Latency & Tokens by Match Band")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                avg_latency = (llm_usage_df['avg_latency_ms'] * llm_usage_df['analyses']).sum() / llm_usage_df['analyses'].sum()
+                st.metric("Avg LLM Time per Analysis", f"{avg_latency / 1000:.2f}s")
+            with col2:
+                st.metric("Total LLM Tokens", f"{int(llm_usage_df['total_tokens'].sum()):,}")
+            
+            st.dataframe(
+                llm_usage_df.drop(columns='estimated'),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "match_category": "Match Band",
+                    "analyses": "Analyses",
+                    "avg_latency_ms": st.column_config.NumberColumn("Avg Latency (ms)", format="%.0f"),
+                    "avg_input_tokens": st.column_config.NumberColumn("Avg Input Tokens", format="%.0f"),
+                    "avg_output_tokens": st.column_config.NumberColumn("Avg Output Tokens", format="%.0f"),
+                    "total_tokens": "Total Tokens",
+                    "empty_pct": st.column_config.NumberColumn("Empty Answers (%)", format="%.1f"),
+                    "truncated_pct": st.column_config.NumberColumn("Truncated Answers (%)", format="%.1f"),
+                }
+            )
+            if llm_usage_df['estimated'].sum():
+                st.caption("Token counts are estimated (~4 characters per token) where the API reported no usage.")
+        
     else:
         st.warning("No statistics available yet. Complete analyses to see trends!")
 
@@ -0,0 +1,102 @@
+"""
+Load test for api_server.py
+
+Start the server with the stub LLM, then drive it with keep-alive clients:
+
+    python api_server.py --llm stub --stub-latency-ms 300 --quiet
+    python benchmarks/api_load_test.py --clients 16 --requests 50
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import percentile
+from benchmarks.corpus import synthetic_text
+
+
+def run_client(args, client_id, results):
+    rng = random.Random(args.seed + client_id)
+    conn = http.client.HTTPConnection(args.host, args.port, timeout=args.timeout)
+    for _ in range(args.requests):
+        if args.batch_size > 1:
+            path = '/v1/analyze/batch'
+            body = {
+                'job_description': {'filename': 'jd.txt', 'text': synthetic_text(rng, kind='jd')},
+                'resumes': [
+                    {'filename': f'resume-{client_id}-{i}.txt', 'text': synthetic_text(rng)}
+                    for i in range(args.batch_size)
+                ],
+                'include_suggestions': args.suggestions
+            }
+        else:
+            path = '/v1/analyze'
+            body = {
+                'resume': {'filename': f'resume-{client_id}.txt', 'text': synthetic_text(rng)},
+                'job_description': {'filename': 'jd.txt', 'text': synthetic_text(rng, kind='jd')},
+                'include_suggestions': args.suggestions
+            }
+        payload = json.dumps(body)
+        started = time.perf_counter()
+        try:
+            conn.request('POST', path, body=payload, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            # Reconnect on a dropped keep-alive connection
+            conn.close()
+            conn = http.client.HTTPConnection(args.host, args.port, timeout=args.timeout)
+            status = 'error'
+        results.append((status, (time.perf_counter() - started) * 1000))
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the analysis HTTP API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent keep-alive clients")
+    parser.add_argument('--requests', type=int, default=25, help="Requests per client")
+    parser.add_argument('--batch-size', type=int, default=1, help="Resumes per request (>1 uses the batch endpoint)")
+    parser.add_argument('--suggestions', action='store_true', help="Ask for LLM suggestions")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    results = []
+    threads = [threading.Thread(target=run_client, args=(args, i, results)) for i in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = [latency for status, latency in results if status == 200]
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report = {
+        'clients': args.clients,
+        'requests': len(results),
+        'documents_per_request': args.batch_size,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'resumes_per_s': round(len(ok) * args.batch_size / elapsed, 2) if elapsed else 0.0,
+        'status_counts': statuses,
+        'p50_ms': round(percentile(ok, 50), 2),
+        'p95_ms': round(percentile(ok, 95), 2),
+        'p99_ms': round(percentile(ok, 99), 2)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Shared helpers for the benchmark and load-test scripts"""
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0.0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(latencies_ms):
+    """mean/p50/p95/p99/max of a list of latencies in milliseconds"""
+    if not latencies_ms:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'mean_ms': round(sum(latencies_ms) / len(latencies_ms), 4),
+        'p50_ms': round(percentile(latencies_ms, 50), 4),
+        'p95_ms': round(percentile(latencies_ms, 95), 4),
+        'p99_ms': round(percentile(latencies_ms, 99), 4),
+        'max_ms': round(max(latencies_ms), 4)
+    }
+
+
+def git_commit():
+    """Current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def default_output_path(prefix='bench_results'):
+    """A result file name unique to this commit and moment, so runs never overwrite each other"""
+    commit = (git_commit() or 'nogit')[:10]
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return f"{prefix}-{commit}-{stamp}.json"
+
+
+def run_metadata(**params):
+    """Environment details stored alongside every result file"""
+    return {
+        'git_commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params
+    }
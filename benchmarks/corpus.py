@@ -0,0 +1,98 @@
+"""
+Synthetic resume / job description corpus generator
+
+Documents are deterministic for a given seed, with a controlled length (words)
+and skill density (fraction of words that are skills from SKILLS_DATABASE).
+
+    python benchmarks/corpus.py --out corpus/ --count 100 --format pdf
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.skills_database import SKILLS_DATABASE
+
+ALL_SKILLS_SORTED = sorted({skill for skill_list in SKILLS_DATABASE.values() for skill in skill_list})
+
+FILLER = (
+    "experienced engineer delivered projects across teams with strong ownership and "
+    "measurable impact on production systems designed built maintained services improved "
+    "reliability reduced costs mentored colleagues collaborated with stakeholders "
+    "requirements responsibilities candidate role company product customers growth"
+).split()
+
+RESUME_SECTIONS = ["Summary", "Experience", "Projects", "Skills", "Education"]
+JD_SECTIONS = ["About the Role", "Responsibilities", "Requirements", "Nice to Have"]
+
+
+def synthetic_text(rng, words=300, skill_density=0.05, kind='resume'):
+    """
+    Random resume/JD-like text
+    About `words * skill_density` of the words are skills drawn from SKILLS_DATABASE
+    """
+    num_skills = min(len(ALL_SKILLS_SORTED), max(0, int(round(words * skill_density))))
+    skills = rng.sample(ALL_SKILLS_SORTED, num_skills)
+    tokens = [rng.choice(FILLER) for _ in range(max(0, words - num_skills))]
+    for skill in skills:
+        tokens.insert(rng.randrange(len(tokens) + 1), skill)
+
+    # Split into titled sections so extraction sees realistic line structure
+    sections = RESUME_SECTIONS if kind == 'resume' else JD_SECTIONS
+    per_section = max(1, len(tokens) // len(sections))
+    lines = []
+    for i, title in enumerate(sections):
+        chunk = tokens[i * per_section:] if i == len(sections) - 1 else tokens[i * per_section:(i + 1) * per_section]
+        lines.append(title)
+        lines.extend(' '.join(chunk[j:j + 12]) for j in range(0, len(chunk), 12))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def generate_texts(count, words=300, skill_density=0.05, kind='resume', seed=7):
+    """Generate `count` synthetic texts"""
+    rng = random.Random(f"{seed}-{kind}")
+    return [synthetic_text(rng, words, skill_density, kind) for _ in range(count)]
+
+
+def text_to_pdf_bytes(text):
+    """Render text into a PDF (one or more A4 pages) using PyMuPDF"""
+    import pymupdf
+
+    doc = pymupdf.open()
+    lines = text.split('\n')
+    lines_per_page = 60
+    for start in range(0, max(1, len(lines)), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((50, 50), '\n'.join(lines[start:start + lines_per_page]), fontsize=9)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic resume/JD corpus")
+    parser.add_argument('--out', required=True, help="Output directory")
+    parser.add_argument('--count', type=int, default=100, help="Resumes to generate")
+    parser.add_argument('--jds', type=int, default=10, help="Job descriptions to generate")
+    parser.add_argument('--words', type=int, default=300)
+    parser.add_argument('--skill-density', type=float, default=0.05)
+    parser.add_argument('--format', choices=['txt', 'pdf', 'mixed'], default='mixed')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for kind, count in (('resume', args.count), ('jd', args.jds)):
+        texts = generate_texts(count, args.words, args.skill_density, kind, args.seed)
+        for i, text in enumerate(texts):
+            as_pdf = args.format == 'pdf' or (args.format == 'mixed' and i % 2 == 0)
+            path = os.path.join(args.out, f"{kind}_{i:06d}.{'pdf' if as_pdf else 'txt'}")
+            with open(path, 'wb') as f:
+                f.write(text_to_pdf_bytes(text) if as_pdf else text.encode('utf-8'))
+    print(f"✅ Wrote {args.count} resumes and {args.jds} job descriptions to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Concurrent-user load test for the full analysis flow
+
+Runs the deployed path end to end: N analysts each loop over picking an
+uploaded resume/JD (mixed PDF and TXT of varying length), submitting it to the
+JobQueue the way app.py does and polling until the job finishes. A
+JobWorkerPool claims the jobs, renews their leases and completes them
+(embedding, skills, stub Gemini with configurable latency, analysis row
+written in the job's completion transaction), all in one shared SQLite file.
+
+    python benchmarks/load_test.py --concurrency 1,2,4,8,16 --duration 30 \
+        --workers 2 --jobs-per-worker 4 --llm-latency-ms 1500 --slo-p95-ms 8000
+
+For each concurrency level it reports throughput, end-to-end p50/p95/p99
+latency (submit to result, as the UI sees it), per-stage latency inside the
+workers plus the time spent queued and committing, failed jobs (SQLite lock
+errors separately) and CPU/RSS per worker process, and names the first level
+where the p95 SLO breaks.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import latency_summary, run_metadata
+from benchmarks.corpus import generate_texts, text_to_pdf_bytes
+from utils.job_queue import JobQueue, JobWorkerPool
+
+
+def build_corpus(directory, count, pdf_ratio, min_words, max_words, seed):
+    """Write a realistic mix of PDF/TXT resumes and JDs; returns [(path, mime, kind)]"""
+    rng = random.Random(seed)
+    files = []
+    for kind in ('resume', 'jd'):
+        for i in range(count):
+            words = rng.randint(min_words, max_words)
+            text = generate_texts(1, words, rng.uniform(0.02, 0.08), kind, seed=f"{seed}-{i}")[0]
+            as_pdf = rng.random() < pdf_ratio
+            path = os.path.join(directory, f"{kind}_{i:04d}.{'pdf' if as_pdf else 'txt'}")
+            with open(path, 'wb') as f:
+                f.write(text_to_pdf_bytes(text) if as_pdf else text.encode('utf-8'))
+            files.append((path, 'application/pdf' if as_pdf else 'text/plain', kind))
+    return files
+
+
+def process_usage(pid):
+    """
+    CPU seconds, current and peak RSS in MB of another process (Linux /proc)
+    Returns None where /proc is unavailable or the process has exited
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the parenthesised command name; utime and stime are 12th and 13th
+            fields = f.read().rsplit(')', 1)[1].split()
+        memory = {}
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    memory[line.split(':')[0]] = round(int(line.split()[1]) / 1024, 1)
+    except (OSError, IndexError):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    return {
+        'cpu_s': (int(fields[11]) + int(fields[12])) / ticks,
+        'rss_mb': memory.get('VmRSS'),
+        'peak_rss_mb': memory.get('VmHWM')
+    }
+
+
+def classify_error(error):
+    """Short label for a failed job's traceback"""
+    if 'database is locked' in error:
+        return 'db_locked'
+    lines = error.strip().splitlines()
+    return lines[-1] if lines else 'unknown'
+
+
+def wait_for_workers(pool, jobs, timeout):
+    """
+    Wait until every worker has loaded its models (its first stats are published)
+    Raises RuntimeError if a worker exits first or timeout seconds pass
+    """
+    prefix = f"worker-{os.getpid()}-"
+    deadline = time.perf_counter() + timeout
+    while True:
+        ready = [worker_id for worker_id in jobs.get_worker_stats() if worker_id.startswith(prefix)]
+        if len(ready) >= pool.num_workers:
+            return
+        if len(pool.worker_pids()) < pool.num_workers:
+            raise RuntimeError("A job worker exited while loading the models (see its traceback above)")
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Job workers were not ready within {timeout:.0f}s")
+        time.sleep(0.5)
+
+
+def analyst(analyst_index, args, jobs, resumes, jds, deadline, stop_event, records, records_lock):
+    """Submit an analysis, poll it to completion, repeat until the deadline"""
+    rng = random.Random(f"{args.seed}-{analyst_index}")
+    # An analysis submitted just before the deadline still gets report_timeout to finish
+    give_up_at = deadline + args.report_timeout
+    while time.perf_counter() < deadline and not stop_event.is_set():
+        resume_path, resume_mime, _ = rng.choice(resumes)
+        jd_path, jd_mime, _ = rng.choice(jds)
+        with open(resume_path, 'rb') as f:
+            resume_bytes = f.read()
+        with open(jd_path, 'rb') as f:
+            jd_bytes = f.read()
+
+        record = {'error': None}
+        started = time.perf_counter()
+        try:
+            job_id = jobs.submit(resume_bytes, os.path.basename(resume_path), resume_mime,
+                                 jd_bytes, os.path.basename(jd_path), jd_mime)
+            job = jobs.get_job(job_id)
+            while job['status'] not in ('done', 'failed'):
+                if time.perf_counter() > give_up_at or stop_event.is_set():
+                    record['error'] = 'timeout'
+                    break
+                time.sleep(args.poll_ms / 1000.0)
+                job = jobs.get_job(job_id)
+        except sqlite3.OperationalError as e:
+            # The submit or a poll itself hit the lock, as the UI would
+            record['error'] = 'db_locked' if 'locked' in str(e) else 'db_error'
+        record['total_ms'] = (time.perf_counter() - started) * 1000
+
+        if record['error'] is None and job['status'] == 'failed':
+            record['error'] = classify_error(job['error'] or '')
+        if record['error'] is None:
+            debug = job['result']['debug']
+            record['stages'] = {stage['stage']: stage['total_ms'] for stage in debug['stages']}
+            # Waiting for a worker, lease and completion transactions, and polling
+            record['stages']['queue_and_commit'] = max(0.0, record['total_ms'] - debug['total_ms'])
+        with records_lock:
+            records.append(record)
+        if args.think_time_ms:
+            time.sleep(rng.uniform(0, 2 * args.think_time_ms) / 1000.0)
+
+
+def run_level(concurrency, args, files, pool, jobs):
+    """Run one concurrency level against the worker pool and aggregate the records"""
+    resumes = [f for f in files if f[2] == 'resume']
+    jds = [f for f in files if f[2] == 'jd']
+    usage_start = {pid: process_usage(pid) for pid in pool.worker_pids()}
+    records = []
+    records_lock = threading.Lock()
+    stop_event = threading.Event()
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=analyst, args=(i, args, jobs, resumes, jds, deadline, stop_event,
+                                               records, records_lock))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    # Analysts give up on their own after report_timeout; stop early if a worker dies
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(1.0)
+        if len(pool.worker_pids()) < pool.num_workers:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+            raise RuntimeError("A job worker exited during the run (see its traceback above)")
+    elapsed = time.perf_counter() - started
+
+    per_worker = []
+    for i, (pid, before) in enumerate(usage_start.items()):
+        after = process_usage(pid)
+        if before is None or after is None:
+            per_worker.append({'worker': i, 'pid': pid})
+            continue
+        cpu_s = after['cpu_s'] - before['cpu_s']
+        per_worker.append({
+            'worker': i,
+            'pid': pid,
+            'cpu_s': round(cpu_s, 2),
+            'cpu_percent': round(cpu_s / elapsed * 100, 1) if elapsed else 0.0,
+            'rss_mb': after['rss_mb'],
+            'peak_rss_mb': after['peak_rss_mb']
+        })
+
+    ok = [record for record in records if record['error'] is None]
+    errors = {}
+    for record in records:
+        if record['error']:
+            errors[record['error']] = errors.get(record['error'], 0) + 1
+
+    stage_names = sorted({stage for record in ok for stage in record['stages']})
+    stages = {
+        stage: latency_summary([record['stages'][stage] for record in ok if stage in record['stages']])
+        for stage in stage_names
+    }
+    total = latency_summary([record['total_ms'] for record in ok])
+    return {
+        'concurrency': concurrency,
+        'workers': pool.num_workers,
+        'jobs_per_worker': pool.jobs_per_worker,
+        'elapsed_s': round(elapsed, 2),
+        'completed': len(ok),
+        'throughput_per_s': round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        'errors': errors,
+        'db_lock_errors': errors.get('db_locked', 0),
+        'latency': total,
+        'stages': stages,
+        'per_worker': per_worker
+    }
+
+
+def print_level(level, slo_ms):
+    latency = level['latency']
+    verdict = '✅' if latency['p95_ms'] <= slo_ms and not level['errors'] else '❌'
+    print(f"\n{verdict} concurrency={level['concurrency']} workers={level['workers']}x{level['jobs_per_worker']} "
+          f"throughput={level['throughput_per_s']}/s completed={level['completed']} errors={level['errors']}")
+    print(f"   total  p50={latency['p50_ms']:.0f}ms p95={latency['p95_ms']:.0f}ms p99={latency['p99_ms']:.0f}ms")
+    for stage, summary in level['stages'].items():
+        print(f"   {stage:<18} p50={summary['p50_ms']:.1f}ms p95={summary['p95_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms")
+    for worker in level['per_worker']:
+        if 'cpu_percent' not in worker:
+            continue
+        print(f"   worker {worker['worker']} (pid {worker['pid']}): cpu={worker['cpu_percent']}% "
+              f"rss={worker['rss_mb']}MB peak={worker['peak_rss_mb']}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-analyst load test with SLO reporting")
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help="Comma-separated analyst counts to sweep")
+    parser.add_argument('--workers', type=int, default=2, help="Job worker processes")
+    parser.add_argument('--jobs-per-worker', type=int, default=4, help="Concurrent jobs per worker process")
+    parser.add_argument('--threads-per-worker', type=int,
+                        help="PyTorch threads per worker (default: an even share of the cores)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument('--think-time-ms', type=float, default=0.0, help="Mean pause between an analyst's analyses")
+    parser.add_argument('--poll-ms', type=float, default=100.0, help="How often an analyst polls its job")
+    parser.add_argument('--llm-latency-ms', type=int, default=1500, help="Latency of each stub Gemini call")
+    parser.add_argument('--corpus-size', type=int, default=40, help="Resumes and JDs in the file mix")
+    parser.add_argument('--pdf-ratio', type=float, default=0.6, help="Fraction of files that are PDFs")
+    parser.add_argument('--min-words', type=int, default=150)
+    parser.add_argument('--max-words', type=int, default=1200)
+    parser.add_argument('--db', help="Shared SQLite file (default: a fresh temporary file)")
+    parser.add_argument('--slo-p95-ms', type=float, default=8000.0, help="End-to-end p95 latency SLO")
+    parser.add_argument('--startup-timeout', type=float, default=600.0,
+                        help="Seconds to wait for every worker to load the models")
+    parser.add_argument('--report-timeout', type=float, default=120.0,
+                        help="Seconds past --duration to wait for the last submitted jobs")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_results_load.json', help="JSON result file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        files = build_corpus(tmp, args.corpus_size, args.pdf_ratio, args.min_words, args.max_words, args.seed)
+        db_path = args.db or os.path.join(tmp, 'load_test.db')
+        jobs = JobQueue(db_path)
+
+        # One pool for the whole sweep, like a deployment; models load once
+        pool = JobWorkerPool(db_path, args.workers, args.jobs_per_worker, args.threads_per_worker,
+                             llm='stub', stub_latency_ms=args.llm_latency_ms).start()
+        results = []
+        slo_broken_at = None
+        try:
+            wait_for_workers(pool, jobs, args.startup_timeout)
+            for concurrency in levels:
+                level = run_level(concurrency, args, files, pool, jobs)
+                print_level(level, args.slo_p95_ms)
+                results.append(level)
+                if slo_broken_at is None and (level['latency']['p95_ms'] > args.slo_p95_ms or level['errors']):
+                    slo_broken_at = concurrency
+        except RuntimeError as e:
+            print(f"\n❌ {e}")
+            sys.exit(1)
+        finally:
+            pool.shutdown()
+
+    report = {
+        'meta': run_metadata(**vars(args)),
+        'slo_p95_ms': args.slo_p95_ms,
+        'slo_broken_at_concurrency': slo_broken_at,
+        'levels': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if slo_broken_at is None:
+        print(f"\n✅ SLO (p95 <= {args.slo_p95_ms:.0f}ms) held up to concurrency {levels[-1]}")
+    else:
+        print(f"\n❌ SLO (p95 <= {args.slo_p95_ms:.0f}ms) first broke at concurrency {slo_broken_at}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
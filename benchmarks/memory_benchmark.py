@@ -0,0 +1,223 @@
+"""
+Memory benchmark for in-memory ranking structures at 1M documents
+
+    python benchmarks/memory_benchmark.py --documents 1000000 --output bench_results_memory.json
+
+Compares the bytes needed to hold N embeddings and N analysis results:
+
+* embeddings: one float32 ndarray per document (what generate_embeddings
+  returns) vs CompactEmbeddingStore in float32 / float16 / int8
+* results: compare_skills dicts vs SkillResult records vs a ResultBatch
+
+Embedding stores are filled to the full N in chunks. Python object sizes are
+measured on a --sample of records with a deep getsizeof and scaled to N, since
+building a million dicts only to measure them takes minutes. Score accuracy of
+every precision is checked against exact float32 cosine on the sample. The
+sample is Gaussian; --model-sample N also checks N synthetic resumes encoded
+by the embedding model (--model), whose vectors are far from Gaussian:
+
+    python benchmarks/memory_benchmark.py --documents 100000 --model-sample 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import run_metadata
+from benchmarks.corpus import ALL_SKILLS_SORTED, generate_texts
+from utils.compact import CompactEmbeddingStore, ResultBatch, SkillResult, normalize
+
+CATEGORIES = ResultBatch.CATEGORIES
+
+
+def deep_sizeof(obj, seen=None):
+    """getsizeof of an object and everything it references, counting shared objects once"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_sizeof(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+def synthetic_skill_analysis(rng):
+    """A compare_skills-shaped dict with realistic list lengths"""
+    jd = rng.sample(ALL_SKILLS_SORTED, rng.randint(8, 25))
+    resume = rng.sample(ALL_SKILLS_SORTED, rng.randint(10, 40))
+    jd_set, resume_set = set(jd), set(resume)
+    matched = sorted(jd_set & resume_set)
+    return {
+        "matched_skills": matched,
+        "missing_skills": sorted(jd_set - resume_set),
+        "extra_skills": sorted(resume_set - jd_set),
+        "skill_match_percentage": round(len(matched) / len(jd_set) * 100, 2),
+        "total_jd_skills": len(jd_set),
+        "total_resume_skills": len(resume_set),
+        "total_matched": len(matched)
+    }
+
+
+def mb(num_bytes):
+    return round(num_bytes / 1024 / 1024, 2)
+
+
+def embedding_benchmarks(args, np_rng):
+    """Fill each store with N vectors; returns sizes, build times and score errors"""
+    results = []
+    sample = np_rng.standard_normal((args.sample, args.dim)).astype(np.float32)
+    query = np_rng.standard_normal(args.dim).astype(np.float32)
+    exact = normalize(sample) @ normalize(query)[0]
+
+    # Baseline: a list of per-document float32 arrays; ndarray overhead is constant per object
+    per_array = sys.getsizeof(np.zeros(args.dim, dtype=np.float32))
+    baseline_bytes = args.documents * (per_array + 8)  # + list slot
+    results.append({
+        'structure': 'list[np.ndarray float32]', 'documents': args.documents,
+        'bytes': baseline_bytes, 'mb': mb(baseline_bytes), 'bytes_per_doc': round(baseline_bytes / args.documents, 1),
+        'extrapolated': True, 'max_abs_score_error_pct': 0.0
+    })
+
+    for precision in ('float32', 'float16', 'int8'):
+        store = CompactEmbeddingStore(dim=args.dim, precision=precision, capacity=args.documents)
+        started = time.perf_counter()
+        store.add(sample)
+        remaining = args.documents - args.sample
+        while remaining > 0:
+            count = min(args.chunk, remaining)
+            store.add(np_rng.standard_normal((count, args.dim)).astype(np.float32))
+            remaining -= count
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scores = store.cosine_scores(query)
+        score_s = time.perf_counter() - started
+        # Score error in the 0-100 points shown to users
+        error = float(np.abs(scores[:args.sample] - exact).max() * 100)
+        results.append({
+            'structure': f'CompactEmbeddingStore {precision}', 'documents': len(store),
+            'bytes': store.nbytes, 'mb': mb(store.nbytes), 'bytes_per_doc': round(store.nbytes / len(store), 1),
+            'extrapolated': False, 'build_s': round(build_s, 2), 'score_all_s': round(score_s, 3),
+            'max_abs_score_error_pct': round(error, 4)
+        })
+        del store
+    return results
+
+
+def model_embedding_benchmarks(args):
+    """Score error of every precision on real model embeddings of synthetic resumes vs JDs"""
+    from utils.feature_extractor import DEFAULT_MODEL_NAME, ResumeJobMatcher
+
+    matcher = ResumeJobMatcher(args.model or DEFAULT_MODEL_NAME)
+    resumes = np.asarray(matcher.encode_batch(generate_texts(args.model_sample, seed=args.seed)), dtype=np.float32)
+    queries = np.asarray(matcher.encode_batch(generate_texts(10, kind='jd', seed=args.seed)), dtype=np.float32)
+    exact = normalize(resumes) @ normalize(queries).T
+
+    results = []
+    for precision in ('float32', 'float16', 'int8'):
+        store = CompactEmbeddingStore(dim=resumes.shape[1], precision=precision, capacity=len(resumes))
+        store.add(resumes)
+        scores = np.stack([store.cosine_scores(query) for query in queries], axis=1)
+        error = float(np.abs(scores - exact).max() * 100)
+        results.append({
+            'structure': f'CompactEmbeddingStore {precision} ({matcher.model_name})', 'documents': len(store),
+            'bytes': store.nbytes, 'mb': mb(store.nbytes), 'bytes_per_doc': round(store.nbytes / len(store), 1),
+            'extrapolated': False, 'max_abs_score_error_pct': round(error, 4)
+        })
+    return results
+
+
+def result_benchmarks(args, rng):
+    """Size of compare_skills dicts vs SkillResult vs ResultBatch, scaled to N"""
+    analyses = [
+        (i + 1, round(rng.uniform(0, 100), 2), synthetic_skill_analysis(rng), rng.choice(CATEGORIES))
+        for i in range(args.sample)
+    ]
+    scale = args.documents / args.sample
+
+    # Skill names are shared by every structure, so they are excluded from all of them
+    shared = set(id(skill) for skill in ALL_SKILLS_SORTED)
+    dict_rows = [
+        {'analysis_id': i, 'similarity_score': score, 'match_category': category, 'skill_analysis': skill_analysis}
+        for i, score, skill_analysis, category in analyses
+    ]
+    dict_bytes = deep_sizeof(dict_rows, set(shared))
+
+    records = [SkillResult(i, score, skill_analysis, category) for i, score, skill_analysis, category in analyses]
+    record_bytes = deep_sizeof(records, set(shared))
+
+    batch = ResultBatch.from_analyses(analyses)
+    assert batch[0]['matched_skills'] == analyses[0][2]['matched_skills']
+    batch_bytes = batch.nbytes
+
+    results = []
+    for structure, sample_bytes in (('list[dict] (compare_skills)', dict_bytes),
+                                    ('list[SkillResult]', record_bytes),
+                                    ('ResultBatch', batch_bytes)):
+        total = int(sample_bytes * scale)
+        results.append({
+            'structure': structure, 'documents': args.documents, 'bytes': total, 'mb': mb(total),
+            'bytes_per_doc': round(sample_bytes / args.sample, 1), 'extrapolated': scale != 1
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of embedding and result structures")
+    parser.add_argument('--documents', type=int, default=1_000_000, help="Documents to size for")
+    parser.add_argument('--dim', type=int, default=384, help="Embedding dimension (all-MiniLM-L6-v2: 384)")
+    parser.add_argument('--sample', type=int, default=10_000, help="Records measured exactly and checked for accuracy")
+    parser.add_argument('--chunk', type=int, default=50_000, help="Vectors generated per fill step")
+    parser.add_argument('--model-sample', type=int, default=0,
+                        help="Also check score error on this many real model embeddings")
+    parser.add_argument('--model', help="Embedding model for --model-sample (default: ResumeJobMatcher's default)")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="Max score error (percentage points) for int8")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_results_memory.json', help="JSON result file")
+    args = parser.parse_args()
+    args.sample = min(args.sample, args.documents)
+
+    embeddings = embedding_benchmarks(args, np.random.default_rng(args.seed))
+    if args.model_sample:
+        embeddings.extend(model_embedding_benchmarks(args))
+    results = result_benchmarks(args, random.Random(args.seed))
+
+    print(f"\nEmbeddings ({args.documents:,} x {args.dim})")
+    for row in embeddings:
+        print(f"  {row['structure']:<32} {row['mb']:>10.1f} MB  {row['bytes_per_doc']:>8.1f} B/doc  "
+              f"max error {row['max_abs_score_error_pct']:.4f} pts")
+    print(f"\nAnalysis results ({args.documents:,})")
+    for row in results:
+        note = ' (extrapolated)' if row['extrapolated'] else ''
+        print(f"  {row['structure']:<32} {row['mb']:>10.1f} MB  {row['bytes_per_doc']:>8.1f} B/doc{note}")
+
+    worst = max(row['max_abs_score_error_pct'] for row in embeddings)
+    report = {
+        'meta': run_metadata(**vars(args)),
+        'embeddings': embeddings,
+        'results': results,
+        'within_tolerance': worst <= args.tolerance
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if worst > args.tolerance:
+        print(f"\n❌ Score error {worst:.4f} exceeds tolerance {args.tolerance} points")
+        sys.exit(1)
+    print(f"\n✅ Score error within {args.tolerance} points. Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
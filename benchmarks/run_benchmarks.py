@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark suite on a synthetic corpus
+
+    python benchmarks/run_benchmarks.py --scales 1000,10000,100000 --output bench_results_baseline.json
+    python benchmarks/run_benchmarks.py --scales 1000 --compare bench_results_baseline.json
+    python benchmarks/run_benchmarks.py --scales 1000 --only clean_text --pool-scaling 1,2,4,8
+
+Every stage is timed per call; results (throughput and latency percentiles per
+benchmark and scale) are written as JSON together with the git commit, so two
+runs can be compared with --compare. Without --output the file is named after
+the commit and time, so a run never overwrites the baseline it compares
+against. Gemini is replaced by StubSuggester.
+--pool-scaling adds the EmbeddingProcessPool throughput curve over core counts.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import default_output_path, latency_summary, run_metadata
+from benchmarks.corpus import generate_texts, text_to_pdf_bytes
+
+BENCHMARKS = [
+    'extract_text_from_pdf', 'clean_text', 'extract_skills', 'generate_embeddings',
+    'encode_batch', 'calculate_similarity', 'db_write', 'db_read_all', 'db_read_by_id',
+    'db_statistics', 'db_read_page', 'db_score_trend', 'pipeline'
+]
+
+
+def measure(name, scale, func, items, documents=None):
+    """
+    Call func on every item, timing each call
+    documents: total documents handled, if calls are batched (defaults to one per call)
+    """
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        call_started = time.perf_counter()
+        func(item)
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    total = time.perf_counter() - started
+    documents = len(items) if documents is None else documents
+    result = {
+        'benchmark': name,
+        'scale': scale,
+        'calls': len(items),
+        'documents': documents,
+        'total_s': round(total, 4),
+        'throughput_docs_per_s': round(documents / total, 2) if total else 0.0
+    }
+    result.update(latency_summary(latencies))
+    print(f"  {name:<24} n={documents:<8} {result['throughput_docs_per_s']:>12.1f} docs/s  p50={result['p50_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms")
+    return result
+
+
+def run_scale(scale, args, models, selected):
+    from utils.database import AnalysisDatabase
+    from utils.document import Document
+    from utils.llm_suggester import StubSuggester
+    from utils.pipeline import run_analysis
+    from utils.text_processor import clean_text, extract_text_from_pdf
+
+    matcher, skill_extractor = models
+    rng = random.Random(args.seed)
+    results = []
+
+    print(f"\n▶ scale={scale}")
+    resumes = generate_texts(scale, args.words, args.skill_density, 'resume', args.seed)
+    jds = generate_texts(max(1, scale // 100), args.words, args.skill_density, 'jd', args.seed)
+    embed_n = min(scale, args.embed_limit)
+
+    if 'extract_text_from_pdf' in selected:
+        pdfs = [text_to_pdf_bytes(text) for text in resumes[:min(scale, args.pdf_limit)]]
+        results.append(measure('extract_text_from_pdf', scale,
+                               lambda pdf: extract_text_from_pdf(io.BytesIO(pdf)), pdfs))
+
+    if 'clean_text' in selected:
+        results.append(measure('clean_text', scale, clean_text, resumes))
+
+    if 'extract_skills' in selected:
+        results.append(measure('extract_skills', scale, skill_extractor.extract_skills, resumes))
+
+    cleaned = None
+    if selected & {'generate_embeddings', 'encode_batch', 'calculate_similarity'}:
+        cleaned = [clean_text(text) for text in resumes[:embed_n]]
+
+    if 'generate_embeddings' in selected:
+        results.append(measure('generate_embeddings', scale, matcher.generate_embeddings, cleaned))
+
+    if 'encode_batch' in selected:
+        batches = [cleaned[i:i + args.batch_size] for i in range(0, len(cleaned), args.batch_size)]
+        results.append(measure('encode_batch', scale, matcher.encode_batch, batches, documents=len(cleaned)))
+        results[-1]['batch_size'] = args.batch_size
+
+    if 'calculate_similarity' in selected:
+        jd_cleaned = clean_text(jds[0])
+        results.append(measure('calculate_similarity', scale,
+                               lambda text: matcher.calculate_similarity(text, jd_cleaned), cleaned))
+
+    needs_rows = {'db_write', 'db_read_all', 'db_read_by_id', 'db_statistics', 'db_read_page', 'db_score_trend'}
+    db_selected = selected & (needs_rows | {'pipeline'})
+    if db_selected:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = AnalysisDatabase(os.path.join(tmp, 'bench.db'))
+            jd_doc = Document(jds[0], filename='jd_000000.txt')
+            skill_analysis = skill_extractor.compare_skills(resumes[0], jds[0])
+
+            # Reads need the table populated, so the write benchmark always runs with them
+            if selected & needs_rows:
+                docs = [Document(text, filename=f'resume_{i:06d}.txt') for i, text in enumerate(resumes)]
+                # Word counts and the document store (compression, term index) are
+                # filled up front, so only the analysis_history insert and commit are timed
+                jd_sha256 = db.document_store.put(jd_doc)
+                sha256s = {id(doc): db.document_store.put(doc) for doc in docs}
+                for doc in docs + [jd_doc]:
+                    doc.word_count
+
+                def write_row(doc):
+                    conn = sqlite3.connect(db.db_name)
+                    db.insert_analysis(conn.cursor(), doc, jd_doc, sha256s[id(doc)], jd_sha256, 50.0,
+                                       skill_analysis, 'Partial Fit')
+                    conn.commit()
+                    conn.close()
+
+                result = measure('db_write', scale, write_row, docs)
+                if 'db_write' in selected:
+                    results.append(result)
+
+            if 'db_read_all' in selected:
+                results.append(measure('db_read_all', scale, lambda _: db.get_all_analyses(), range(args.read_repeats)))
+                results[-1]['rows'] = scale
+
+            if 'db_read_by_id' in selected:
+                ids = [rng.randint(1, scale) for _ in range(min(scale, 1000))]
+                results.append(measure('db_read_by_id', scale, db.get_analysis_by_id, ids))
+
+            if 'db_statistics' in selected:
+                results.append(measure('db_statistics', scale, lambda _: db.get_statistics(), range(args.read_repeats)))
+                results[-1]['rows'] = scale
+
+            if 'db_read_page' in selected:
+                offsets = [rng.randrange(0, scale, 50) for _ in range(min(scale, 200))]
+                results.append(measure('db_read_page', scale, lambda offset: db.get_analyses_page(50, offset), offsets))
+
+            if 'db_score_trend' in selected:
+                results.append(measure('db_score_trend', scale, lambda _: db.get_score_trend(), range(args.read_repeats)))
+                results[-1]['rows'] = scale
+
+            if 'pipeline' in selected:
+                stub = StubSuggester(latency_ms=args.stub_latency_ms)
+                pipeline_jd = Document(jds[0], filename='jd_000000.txt')
+                pipeline_docs = [Document(text, filename=f'resume_{i:06d}.txt') for i, text in enumerate(resumes[:embed_n])]
+                results.append(measure('pipeline', scale,
+                                       lambda doc: run_analysis(doc, pipeline_jd, matcher, skill_extractor, db, stub),
+                                       pipeline_docs))
+    return results
+
+
+def run_pool_scaling(args):
+    """Embedding throughput of EmbeddingProcessPool from 1 to N cores"""
+    from utils.embedding_pool import EmbeddingProcessPool, available_cores
+    from utils.text_processor import clean_text
+
+    core_counts = [int(cores) for cores in args.pool_scaling.split(',')]
+    rng = random.Random(args.seed)
+    # Short, typical and long documents so the length-balanced distribution matters
+    per_group = max(1, args.pool_docs // 3)
+    texts = [
+        clean_text(text)
+        for words in (max(20, args.words // 3), args.words, args.words * 3)
+        for text in generate_texts(per_group, words, args.skill_density, 'resume', args.seed)
+    ]
+    rng.shuffle(texts)
+    batches = [texts[i:i + args.pool_batch] for i in range(0, len(texts), args.pool_batch)]
+
+    print(f"\n▶ embedding pool scaling ({len(texts)} docs, {args.pool_threads} thread(s) per process, "
+          f"{available_cores()} cores available)")
+    results = []
+    for cores in core_counts:
+        with EmbeddingProcessPool(processes=max(1, cores // args.pool_threads),
+                                  threads_per_process=args.pool_threads) as pool:
+            # Fewer processes than asked when the machine has fewer cores
+            processes = pool.config['processes']
+            # Warm-up so the first timed call doesn't pay for lazy initialisation
+            pool.encode_batch(batches[0])
+            result = measure(f'embedding_pool_{cores}c', len(texts), pool.encode_batch, batches, documents=len(texts))
+        # Speedup and parallel efficiency relative to the smallest pool
+        base = results[0] if results else result
+        speedup = result['throughput_docs_per_s'] / base['throughput_docs_per_s'] if base['throughput_docs_per_s'] else 0.0
+        result.update({
+            'cores': cores,
+            'processes': processes,
+            'threads_per_process': args.pool_threads,
+            'batch_size': args.pool_batch,
+            'speedup': round(speedup, 2),
+            'efficiency': round(speedup / (cores / core_counts[0]), 2)
+        })
+        results.append(result)
+
+    print("\n  cores  processes  docs/s      speedup  efficiency")
+    for result in results:
+        print(f"  {result['cores']:<6} {result['processes']:<10} {result['throughput_docs_per_s']:<11.1f} "
+              f"{result['speedup']:<8.2f} {result['efficiency']:.2f}")
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Print throughput changes against a previous result file; returns the regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['benchmark'], r['scale']): r for r in baseline['results']}
+    regressions = []
+    print(f"\nComparison with {baseline_path} (commit {baseline['meta'].get('git_commit')})")
+    for result in results:
+        old = previous.get((result['benchmark'], result['scale']))
+        if not old or not old['throughput_docs_per_s']:
+            continue
+        change = result['throughput_docs_per_s'] / old['throughput_docs_per_s'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  ⚠️ REGRESSION'
+            regressions.append({'benchmark': result['benchmark'], 'scale': result['scale'], 'change': round(change, 4)})
+        print(f"  {result['benchmark']:<24} scale={result['scale']:<8} {change:+.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on a synthetic corpus")
+    parser.add_argument('--scales', default='1000,10000,100000', help="Comma-separated document counts")
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help="Comma-separated benchmarks to run")
+    parser.add_argument('--words', type=int, default=300, help="Words per document")
+    parser.add_argument('--skill-density', type=float, default=0.05, help="Fraction of words that are skills")
+    parser.add_argument('--pdf-limit', type=int, default=2000, help="Max PDFs generated per scale")
+    parser.add_argument('--embed-limit', type=int, default=2000, help="Max documents embedded per scale")
+    parser.add_argument('--batch-size', type=int, default=32, help="Batch size for encode_batch")
+    parser.add_argument('--read-repeats', type=int, default=5, help="Repetitions of full-table reads")
+    parser.add_argument('--stub-latency-ms', type=int, default=0, help="Simulated LLM latency in the pipeline benchmark")
+    parser.add_argument('--pool-scaling', help="Comma-separated core counts for the embedding pool scaling curve")
+    parser.add_argument('--pool-threads', type=int, default=1, help="PyTorch threads per pool process")
+    parser.add_argument('--pool-docs', type=int, default=600, help="Documents encoded per pool size")
+    parser.add_argument('--pool-batch', type=int, default=128, help="Texts per pool encode_batch call")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="JSON result file (default: bench_results-<commit>-<time>.json)")
+    parser.add_argument('--compare', help="Previous result file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Throughput drop flagged as a regression")
+    args = parser.parse_args()
+    args.output = args.output or default_output_path()
+    if args.compare and os.path.realpath(args.output) == os.path.realpath(args.compare):
+        parser.error("--output is the --compare baseline; write the new results to another file")
+
+    selected = {name.strip() for name in args.only.split(',') if name.strip()}
+    unknown = selected - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    scales = [int(scale) for scale in args.scales.split(',')]
+
+    from utils.feature_extractor import ResumeJobMatcher
+    from utils.skill_extractor import SkillExtractor
+    needs_model = bool(selected & {'generate_embeddings', 'encode_batch', 'calculate_similarity', 'pipeline'})
+    models = (ResumeJobMatcher() if needs_model else None, SkillExtractor())
+
+    results = []
+    for scale in scales:
+        results.extend(run_scale(scale, args, models, selected))
+    if args.pool_scaling:
+        results.extend(run_pool_scaling(args))
+
+    report = {'meta': run_metadata(**vars(args)), 'results': results}
+    if args.compare:
+        report['regressions'] = compare(results, args.compare, args.threshold)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
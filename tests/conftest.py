@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make `utils` importable however pytest is invoked (spawned workers inherit sys.path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+"""A shard whose lease expires mid-run is committed exactly once across worker processes"""
+import multiprocessing
+import os
+import queue
+import sqlite3
+import time
+
+from utils.distributed import ScreeningQueue, work_key
+
+LEASE_SECONDS = 1
+RESUMES = 40
+SHARD_SIZE = 5
+
+
+class RowWriter:
+    """Stands in for AnalysisDatabase.insert_analysis; a plain INSERT shows any double commit"""
+
+    def insert_analysis(self, cursor, work_key, resume_filename):
+        cursor.execute('INSERT INTO analysis_history (work_key, resume_filename) VALUES (?, ?)',
+                       (work_key, resume_filename))
+
+
+def analyses_for(shard):
+    return [
+        {'work_key': work_key(shard['run_id'], path), 'resume_filename': os.path.basename(path)}
+        for path in shard['items']
+    ]
+
+
+def stalled_worker(db_name, claimed, results):
+    """Claims a shard, stalls past its lease without renewing it, then tries to commit"""
+    screening = ScreeningQueue(db_name, lease_seconds=LEASE_SECONDS)
+    shard = screening.claim_shard('stalled')
+    claimed.set()
+    time.sleep(LEASE_SECONDS * 3)
+    committed = screening.commit_shard(shard['id'], shard['lease_token'], RowWriter(), analyses_for(shard))
+    results.put(('stalled', shard['id'], committed))
+
+
+def healthy_worker(db_name, worker_id, results):
+    """Claims and commits shards until none is queued or running"""
+    screening = ScreeningQueue(db_name, lease_seconds=LEASE_SECONDS)
+    while screening.has_pending_work():
+        shard = screening.claim_shard(worker_id)
+        if shard is None:
+            time.sleep(0.05)
+            continue
+        committed = screening.commit_shard(shard['id'], shard['lease_token'], RowWriter(), analyses_for(shard))
+        results.put((worker_id, shard['id'], committed))
+
+
+def test_expired_shard_is_committed_exactly_once(tmp_path):
+    db_name = str(tmp_path / 'screening.db')
+    screening = ScreeningQueue(db_name, lease_seconds=LEASE_SECONDS)
+    conn = sqlite3.connect(db_name)
+    conn.execute('CREATE TABLE analysis_history (id INTEGER PRIMARY KEY, work_key TEXT, resume_filename TEXT)')
+    conn.commit()
+    conn.close()
+    paths = [str(tmp_path / f'resume_{i:03d}.txt') for i in range(RESUMES)]
+    run_id = screening.submit_run(b'Python developer', 'jd.txt', 'text/plain', paths, SHARD_SIZE)
+
+    context = multiprocessing.get_context('spawn')
+    claimed = context.Event()
+    results = context.Queue()
+    stalled = context.Process(target=stalled_worker, args=(db_name, claimed, results))
+    stalled.start()
+    assert claimed.wait(60)
+    healthy = [
+        context.Process(target=healthy_worker, args=(db_name, f'healthy-{i}', results))
+        for i in range(3)
+    ]
+    for process in healthy:
+        process.start()
+
+    outcomes = []
+    deadline = time.time() + 120
+    while time.time() < deadline and (stalled.is_alive() or any(p.is_alive() for p in healthy)):
+        try:
+            outcomes.append(results.get(timeout=0.5))
+        except queue.Empty:
+            pass
+    for process in [stalled] + healthy:
+        process.join(10)
+        assert process.exitcode == 0
+    while True:
+        try:
+            outcomes.append(results.get(timeout=0.5))
+        except queue.Empty:
+            break
+
+    # The stalled worker lost its lease, so its commit was refused
+    stalled_outcomes = [outcome for outcome in outcomes if outcome[0] == 'stalled']
+    assert len(stalled_outcomes) == 1
+    _, stalled_shard, stalled_committed = stalled_outcomes[0]
+    assert stalled_committed is False
+
+    # Every shard, including the stalled one, was committed by exactly one worker
+    committed = [shard_id for worker_id, shard_id, ok in outcomes if ok]
+    assert len(committed) == len(set(committed)) == RESUMES // SHARD_SIZE
+    assert stalled_shard in committed
+
+    conn = sqlite3.connect(db_name)
+    total, distinct = conn.execute('SELECT COUNT(*), COUNT(DISTINCT work_key) FROM analysis_history').fetchone()
+    conn.close()
+    assert total == distinct == RESUMES
+
+    status = screening.get_run_status(run_id)
+    assert status['shards'] == {'done': RESUMES // SHARD_SIZE}
+    assert status['committed_items'] == RESUMES
@@ -0,0 +1,110 @@
+"""EmbeddingProcessPool reassembles chunks in input order, fails calls on close and survives worker deaths"""
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from utils.embedding_pool import EmbeddingProcessPool, plan_pool
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)))]
+
+
+class FakeModel:
+    """
+    Stands in for a SentenceTransformer: a text's vector is its length and character sum
+    'slow...' texts take half a second; 'crash:<path>' kills the worker unless
+    <path> exists (creating it first); 'poison' always kills it.
+    """
+
+    def encode(self, texts, convert_to_tensor=False, batch_size=None):
+        for text in texts:
+            if text == 'poison':
+                os._exit(1)
+            if text.startswith('crash:'):
+                marker = text[len('crash:'):]
+                if not os.path.exists(marker):
+                    open(marker, 'w').close()
+                    os._exit(1)
+            if text.startswith('slow'):
+                time.sleep(0.5)
+        return [vector(text) for text in texts]
+
+
+def load_fake_model(model_name):
+    return FakeModel()
+
+
+def fake_pool(**kwargs):
+    # encode_batch assembles its result with numpy
+    pytest.importorskip('numpy')
+    kwargs.setdefault('processes', 2)
+    return EmbeddingProcessPool('fake-model', threads_per_process=1, model_loader=load_fake_model,
+                                start_timeout=60, **kwargs)
+
+
+def test_encode_batch_returns_vectors_in_input_order():
+    rng = random.Random(3)
+    texts = [f"text {i} " + 'x' * rng.randint(0, 200) for i in range(25)]
+    rng.shuffle(texts)
+    with fake_pool(max_chunk_size=3) as pool:
+        vectors = pool.encode_batch(texts)
+    assert vectors.shape == (25, 2)
+    assert vectors.tolist() == [vector(text) for text in texts]
+
+
+def test_close_fails_pending_calls():
+    pool = fake_pool(processes=1, max_chunk_size=1).start()
+    errors = []
+
+    def encode():
+        try:
+            pool.encode_batch([f'slow {i}' for i in range(6)])
+        except RuntimeError as e:
+            errors.append(e)
+
+    caller = threading.Thread(target=encode)
+    caller.start()
+    time.sleep(0.3)
+    pool.close(timeout=0.5)
+    caller.join(10)
+    assert not caller.is_alive()
+    assert len(errors) == 1 and 'closed' in str(errors[0])
+    with pytest.raises(RuntimeError, match='closed'):
+        pool.encode_batch(['after close'])
+
+
+def test_dead_worker_is_restarted_and_its_chunk_retried(tmp_path):
+    texts = ['first', f"crash:{tmp_path / 'crashed'}", 'third', 'fourth']
+    with fake_pool(max_chunk_size=1) as pool:
+        assert pool.encode_batch(texts).tolist() == [vector(text) for text in texts]
+        assert pool.stats()['restarts'] == 1
+        assert pool.stats()['alive_processes'] == pool.config['processes']
+        assert pool.encode_batch(['later']).tolist() == [vector('later')]
+
+
+def test_chunk_that_keeps_killing_workers_fails_alone():
+    with fake_pool(processes=1, max_restarts=5) as pool:
+        with pytest.raises(RuntimeError, match='died twice'):
+            pool.encode_batch(['poison'])
+        assert pool.encode_batch(['healthy']).tolist() == [vector('healthy')]
+
+
+def test_pool_fails_once_restarts_are_used_up():
+    with fake_pool(processes=1, max_restarts=1) as pool:
+        with pytest.raises(RuntimeError, match='died'):
+            pool.encode_batch(['poison'])
+        with pytest.raises(RuntimeError, match='died'):
+            pool.encode_batch(['healthy'])
+
+
+def test_plan_pool_never_oversubscribes_the_cores():
+    assert plan_pool(cores=8) == {'cores': 8, 'processes': 8, 'threads_per_process': 1}
+    assert plan_pool(2, cores=8) == {'cores': 8, 'processes': 2, 'threads_per_process': 4}
+    # Too many processes for the cores are lowered, given threads or not
+    assert plan_pool(12, cores=8) == {'cores': 8, 'processes': 8, 'threads_per_process': 1}
+    assert plan_pool(5, 2, cores=8) == {'cores': 8, 'processes': 4, 'threads_per_process': 2}
+    assert plan_pool(4, 2, cores=10, reserve_cores=4) == {'cores': 6, 'processes': 3, 'threads_per_process': 2}
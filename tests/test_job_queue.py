@@ -0,0 +1,140 @@
+"""An expired job lease is re-claimed, the stale worker is fenced out, and each job saves one row"""
+import multiprocessing
+import queue
+import sqlite3
+import time
+
+from utils.job_queue import JobQueue, LeaseHeartbeat
+
+LEASE_SECONDS = 1
+JOBS = 6
+
+
+class RowWriter:
+    """Stands in for AnalysisDatabase.insert_analysis; a plain INSERT shows any double save"""
+
+    def insert_analysis(self, cursor, work_key, resume_filename):
+        cursor.execute('INSERT INTO analysis_history (work_key, resume_filename) VALUES (?, ?)',
+                       (work_key, resume_filename))
+
+
+def stalled_worker(db_name, claimed, results):
+    """Claims a job, stalls past its lease without a heartbeat, then tries to complete it"""
+    jobs = JobQueue(db_name, lease_seconds=LEASE_SECONDS)
+    job = jobs.claim_next('stalled')
+    claimed.set()
+    time.sleep(LEASE_SECONDS * 3)
+    completed = jobs.complete(job['id'], job['lease_token'], {'worker': 'stalled'}, RowWriter(),
+                              {'resume_filename': job['resume_filename']})
+    results.put(('stalled', job['id'], completed))
+
+
+def healthy_worker(db_name, worker_id, results):
+    """Runs jobs for longer than the lease, kept alive by a LeaseHeartbeat"""
+    jobs = JobQueue(db_name, lease_seconds=LEASE_SECONDS)
+    while True:
+        stats = jobs.get_queue_stats()
+        if not stats.get('queued') and not stats.get('running'):
+            return
+        job = jobs.claim_next(worker_id)
+        if job is None:
+            time.sleep(0.05)
+            continue
+        with LeaseHeartbeat(jobs, job['id'], job['lease_token']) as heartbeat:
+            time.sleep(LEASE_SECONDS * 1.5)
+            completed = not heartbeat.lost and jobs.complete(
+                job['id'], job['lease_token'], {'worker': worker_id}, RowWriter(),
+                {'resume_filename': job['resume_filename']}
+            )
+        results.put((worker_id, job['id'], completed))
+
+
+def submit_jobs(jobs, count):
+    return [
+        jobs.submit(b'resume', f'resume_{i}.txt', 'text/plain', b'Python developer', 'jd.txt', 'text/plain')
+        for i in range(count)
+    ]
+
+
+def test_expired_job_is_completed_exactly_once(tmp_path):
+    db_name = str(tmp_path / 'jobs.db')
+    jobs = JobQueue(db_name, lease_seconds=LEASE_SECONDS)
+    conn = sqlite3.connect(db_name)
+    conn.execute('CREATE TABLE analysis_history (id INTEGER PRIMARY KEY, work_key TEXT, resume_filename TEXT)')
+    conn.commit()
+    conn.close()
+    job_ids = submit_jobs(jobs, JOBS)
+
+    context = multiprocessing.get_context('spawn')
+    claimed = context.Event()
+    results = context.Queue()
+    stalled = context.Process(target=stalled_worker, args=(db_name, claimed, results))
+    stalled.start()
+    assert claimed.wait(60)
+    healthy = [
+        context.Process(target=healthy_worker, args=(db_name, f'healthy-{i}', results))
+        for i in range(2)
+    ]
+    for process in healthy:
+        process.start()
+
+    outcomes = []
+    deadline = time.time() + 120
+    while time.time() < deadline and (stalled.is_alive() or any(p.is_alive() for p in healthy)):
+        try:
+            outcomes.append(results.get(timeout=0.5))
+        except queue.Empty:
+            pass
+    for process in [stalled] + healthy:
+        process.join(10)
+        assert process.exitcode == 0
+    while True:
+        try:
+            outcomes.append(results.get(timeout=0.5))
+        except queue.Empty:
+            break
+
+    # The stalled worker's lease expired and its completion was refused
+    stalled_outcomes = [outcome for outcome in outcomes if outcome[0] == 'stalled']
+    assert len(stalled_outcomes) == 1
+    _, stalled_job, stalled_completed = stalled_outcomes[0]
+    assert stalled_completed is False
+
+    # Every job, including the stalled one, was completed by exactly one healthy worker
+    completed = [job_id for worker_id, job_id, ok in outcomes if ok]
+    assert sorted(completed) == job_ids
+    assert all(worker_id != 'stalled' for worker_id, _, ok in outcomes if ok)
+
+    # One analysis row per job, under its work_key, linked from the job's result
+    conn = sqlite3.connect(db_name)
+    rows = dict(conn.execute('SELECT work_key, id FROM analysis_history').fetchall())
+    total = conn.execute('SELECT COUNT(*) FROM analysis_history').fetchone()[0]
+    conn.close()
+    assert total == len(rows) == JOBS
+    for job_id in job_ids:
+        job = jobs.get_job(job_id)
+        assert job['status'] == 'done'
+        assert job['result']['analysis_id'] == rows[f'job:{job_id}']
+        assert job['result']['worker'].startswith('healthy')
+        # Only the stalled job needed a second attempt; heartbeats kept the others' leases
+        assert job['attempts'] == (2 if job_id == stalled_job else 1)
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), max_attempts=2, lease_seconds=0.1)
+    job_id, = submit_jobs(jobs, 1)
+
+    # First attempt fails and is re-queued; a stale token can't record anything
+    first = jobs.claim_next('worker')
+    jobs.fail(job_id, 'stale-token', 'ignored')
+    assert jobs.get_job(job_id)['status'] == 'running'
+    jobs.fail(job_id, first['lease_token'], 'boom')
+    assert jobs.get_job(job_id)['status'] == 'queued'
+
+    # Second attempt's lease expires; with no attempts left the job fails
+    jobs.claim_next('worker')
+    time.sleep(0.2)
+    assert jobs.claim_next('worker') is None
+    job = jobs.get_job(job_id)
+    assert job['status'] == 'failed'
+    assert job['attempts'] == 2
@@ -0,0 +1,189 @@
+"""Incremental re-scoring matches a full recompute and resumes from its checkpoint"""
+import json
+import sqlite3
+import string
+
+import pytest
+
+for module in ('numpy', 'pandas', 'pymupdf', 'nltk', 'bs4'):
+    pytest.importorskip(module)
+try:
+    # utils.text_processor needs the stopwords corpus, which it can only download with network access
+    import nltk
+    nltk.data.find('corpora/stopwords')
+except LookupError:
+    pytest.skip("NLTK stopwords corpus not available", allow_module_level=True)
+
+from utils.database import AnalysisDatabase
+from utils.document import Document
+from utils.rescoring import EMBEDDING_LOAD_AHEAD, Rescorer
+from utils.skill_extractor import SkillExtractor
+from utils.skills_database import ALL_SKILLS, TAXONOMY_VERSION
+
+OLD_TAXONOMY = 'old-taxonomy'
+SKILLS = sorted(ALL_SKILLS)
+# Skills the old taxonomy didn't have; only documents mentioning them need re-extraction
+ADDED_SKILLS = set(SKILLS[5:60:11])
+PAIRS = 14
+
+
+class Interrupted(Exception):
+    pass
+
+
+class LetterModel:
+    """Stands in for a SentenceTransformer: a text's vector is its letter counts"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, convert_to_tensor=False, batch_size=None):
+        import numpy as np
+
+        self.calls += 1
+        single = isinstance(texts, str)
+        vectors = np.array([
+            [text.lower().count(letter) for letter in string.ascii_lowercase]
+            for text in ([texts] if single else texts)
+        ], dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+def letter_matcher():
+    pytest.importorskip('sklearn')
+    from utils.feature_extractor import ResumeJobMatcher
+
+    matcher = ResumeJobMatcher('test/letter-counts', load_model=False)
+    matcher._model = LetterModel()
+    return matcher
+
+
+def texts(i):
+    """A resume and JD sharing some skills; every third resume mentions an added skill"""
+    resume_skills = SKILLS[i * 3:i * 3 + 8]
+    jd_skills = SKILLS[i * 2:i * 2 + 6]
+    if i % 3 == 0:
+        resume_skills = resume_skills + sorted(ADDED_SKILLS)[:2]
+    resume = f"Experienced engineer. Skills: {', '.join(resume_skills)}. Led several projects."
+    jd = f"We are hiring. Requirements: {', '.join(jd_skills)}. Remote friendly."
+    return resume, jd
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    """Analyses saved under the old taxonomy, with their documents stored"""
+    db_name = str(tmp_path / 'analyses.db')
+    db = AnalysisDatabase(db_name)
+    db.record_taxonomy(OLD_TAXONOMY, ALL_SKILLS - ADDED_SKILLS)
+    old_extractor = SkillExtractor()
+    old_extractor.all_skills = ALL_SKILLS - ADDED_SKILLS
+    for i in range(PAIRS):
+        resume, jd = texts(i)
+        db.save_analysis(
+            Document(resume, f'resume_{i}.txt'), Document(jd, f'jd_{i}.txt'), 50.0,
+            old_extractor.compare_skills(resume, jd), 'Partial Fit', taxonomy_version=OLD_TAXONOMY
+        )
+    return db_name
+
+
+def stored_analyses(db_name):
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute('''
+        SELECT id, taxonomy_version, skill_match_score, matched_skills, missing_skills, extra_skills
+        FROM analysis_history ORDER BY id
+    ''').fetchall()
+    conn.close()
+    return rows
+
+
+def interrupt_after(rescorer, batches):
+    """Make the skills phase fail after committing `batches` batches"""
+    commit = rescorer._commit_skill_batch
+    committed = []
+
+    def limited(*args):
+        if len(committed) == batches:
+            raise Interrupted()
+        commit(*args)
+        committed.append(args)
+
+    rescorer._commit_skill_batch = limited
+
+
+def test_incremental_rescore_matches_full_recompute_and_resumes(db_name):
+    first = Rescorer(db_name, batch_size=3, workers=2)
+    interrupt_after(first, 2)
+    with pytest.raises(Interrupted):
+        first.rescore_skills()
+
+    # Two batches of three rows were committed together with the checkpoint
+    rows = stored_analyses(db_name)
+    assert first.get_checkpoint('skills') == rows[5][0]
+    assert [row[1] for row in rows] == [TAXONOMY_VERSION] * 6 + [OLD_TAXONOMY] * (PAIRS - 6)
+
+    # A new run with the same job name picks up after the checkpoint
+    summary = Rescorer(db_name, batch_size=3, workers=2).run()
+    assert summary['skills']['rows'] == PAIRS - 6
+    assert summary['skills']['recomputed'] > 0
+    assert summary['skills']['recomputed'] + summary['skills']['unchanged'] == PAIRS - 6
+
+    extractor = SkillExtractor()
+    for i, (_, version, score, matched, missing, extra) in enumerate(stored_analyses(db_name)):
+        expected = extractor.compare_skills(*texts(i))
+        assert version == TAXONOMY_VERSION
+        assert score == expected['skill_match_percentage']
+        assert json.loads(matched) == expected['matched_skills']
+        assert json.loads(missing) == expected['missing_skills']
+        assert json.loads(extra) == expected['extra_skills']
+
+    # Finished: the checkpoint is cleared and nothing is stale any more
+    assert Rescorer(db_name).get_checkpoint('skills') == 0
+    assert Rescorer(db_name).describe()['stale_taxonomy_rows'] == 0
+
+
+def stored_scores(db_name):
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute('''
+        SELECT id, model_version, semantic_score, match_category FROM analysis_history ORDER BY id
+    ''').fetchall()
+    conn.close()
+    return rows
+
+
+def test_embedding_rescore_matches_full_recompute_and_loads_boundedly(db_name):
+    matcher = letter_matcher()
+    first = Rescorer(db_name, matcher, batch_size=2)
+
+    # Fail the third encode; count how many batches were loaded by then
+    loaded = []
+    iter_documents = first.store.iter_documents
+    first.store.iter_documents = lambda *args, **kwargs: (loaded.append(1), iter_documents(*args, **kwargs))[1]
+    encode_batch = matcher.encode_batch
+
+    def failing_encode(texts):
+        if matcher._model.calls == 2:
+            raise Interrupted()
+        return encode_batch(texts)
+
+    matcher.encode_batch = failing_encode
+    with pytest.raises(Interrupted):
+        first.rescore_embeddings()
+    # Loading runs at most EMBEDDING_LOAD_AHEAD batches past the one encoding
+    assert len(loaded) <= 3 + EMBEDDING_LOAD_AHEAD < PAIRS // 2
+    rows = stored_scores(db_name)
+    assert first.get_checkpoint('embeddings') == rows[3][0]
+    assert [row[1] for row in rows[:4]] == [matcher.model_name] * 4
+    assert matcher.model_name not in [row[1] for row in rows[4:]]
+
+    # Resume from the checkpoint with a working model
+    matcher = letter_matcher()
+    summary = Rescorer(db_name, matcher, batch_size=2).rescore_embeddings()
+    assert summary['rows'] == summary['recomputed'] == PAIRS - 4
+
+    for i, (_, version, score, category) in enumerate(stored_scores(db_name)):
+        resume, jd = texts(i)
+        expected = matcher.calculate_similarity(Document(resume, 'resume.txt'), Document(jd, 'jd.txt'))
+        assert version == matcher.model_name
+        assert score == pytest.approx(expected, abs=0.011)
+        assert category == matcher.get_match_category(score)[0]
+    assert Rescorer(db_name, matcher).describe()['stale_model_rows'] == 0
@@ -0,0 +1,280 @@
+"""
+Compact in-memory representations for ranking many analyses
+
+* CompactEmbeddingStore keeps L2-normalised embeddings as float16 (2 bytes per
+  dimension) or scalar-quantised int8 with one float32 scale per vector
+  (1 byte per dimension), instead of one float32 ndarray per document.
+  benchmarks/memory_benchmark.py reports the score error against float32,
+  on random vectors and (--model-sample) on real model embeddings.
+  The API's batch endpoint uses it to shortlist resumes (top_k).
+* SkillResult is a __slots__ record for one compare_skills result.
+* ResultBatch stores many results column-wise in NumPy arrays, with skill
+  lists as integer ids into the sorted skill vocabulary.
+"""
+import numpy as np
+
+from utils.skills_database import ALL_SKILLS
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+def normalize(vectors):
+    """L2-normalise rows so cosine similarity becomes a dot product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(vectors):
+    """
+    Symmetric per-vector int8 quantisation
+    Returns (codes int8 [n, dim], scales float32 [n]) with vectors ~= codes * scales[:, None]
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes, scales):
+    return codes.astype(np.float32) * scales[:, None]
+
+
+class CompactEmbeddingStore:
+    """
+    Growable matrix of normalised embeddings in float32, float16 or int8
+    Scores are computed chunk by chunk so the full matrix is never upcast at once.
+    """
+
+    def __init__(self, dim=384, precision='float16', capacity=1024, chunk_size=65536):
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}")
+        self.dim = dim
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self._size = 0
+        dtype = np.int8 if precision == 'int8' else np.dtype(precision)
+        self._vectors = np.empty((capacity, dim), dtype=dtype)
+        self._scales = np.empty(capacity, dtype=np.float32) if precision == 'int8' else None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Bytes used by the stored vectors (excluding spare capacity)"""
+        per_vector = self._vectors.itemsize * self.dim + (4 if self._scales is not None else 0)
+        return self._size * per_vector
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= len(self._vectors):
+            return
+        capacity = max(needed, len(self._vectors) * 2)
+        vectors = np.empty((capacity, self.dim), dtype=self._vectors.dtype)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        if self._scales is not None:
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    def add(self, vectors):
+        """Append one or more embeddings; returns the range of their row indices"""
+        vectors = normalize(vectors)
+        count = len(vectors)
+        self._reserve(count)
+        start = self._size
+        if self.precision == 'int8':
+            codes, scales = quantize_int8(vectors)
+            self._vectors[start:start + count] = codes
+            self._scales[start:start + count] = scales
+        else:
+            self._vectors[start:start + count] = vectors.astype(self._vectors.dtype)
+        self._size += count
+        return range(start, start + count)
+
+    def get(self, index):
+        """Decoded float32 vector at a row index"""
+        if self.precision == 'int8':
+            return self._vectors[index].astype(np.float32) * self._scales[index]
+        return self._vectors[index].astype(np.float32)
+
+    def cosine_scores(self, query):
+        """Cosine similarity of a query embedding against every stored vector (float32)"""
+        query = normalize(query)[0]
+        scores = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, self.chunk_size):
+            end = min(start + self.chunk_size, self._size)
+            chunk = self._vectors[start:end].astype(np.float32)
+            scores[start:end] = chunk @ query
+            if self._scales is not None:
+                scores[start:end] *= self._scales[start:end]
+        return scores
+
+    def match_scores(self, query):
+        """Scores on the same 0-100 scale as ResumeJobMatcher.calculate_similarity"""
+        return np.round(self.cosine_scores(query) * 100, 2)
+
+    def top_k(self, query, k=10):
+        """(indices, scores) of the k most similar vectors, best first"""
+        scores = self.cosine_scores(query)
+        k = min(k, len(scores))
+        if k == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        indices = np.argpartition(-scores, k - 1)[:k]
+        indices = indices[np.argsort(-scores[indices])]
+        return indices, scores[indices]
+
+
+class SkillResult:
+    """One analysis result as a slotted record instead of a dict of lists"""
+
+    __slots__ = (
+        'analysis_id', 'semantic_score', 'skill_match_percentage', 'match_category',
+        'matched_skills', 'missing_skills', 'extra_skills', 'total_jd_skills',
+        'total_resume_skills'
+    )
+
+    def __init__(self, analysis_id, semantic_score, skill_analysis, match_category=None):
+        self.analysis_id = analysis_id
+        self.semantic_score = semantic_score
+        self.skill_match_percentage = skill_analysis['skill_match_percentage']
+        self.match_category = match_category
+        # Tuples of interned strings: one shared copy of every skill name
+        self.matched_skills = tuple(map(_intern, skill_analysis['matched_skills']))
+        self.missing_skills = tuple(map(_intern, skill_analysis['missing_skills']))
+        self.extra_skills = tuple(map(_intern, skill_analysis['extra_skills']))
+        self.total_jd_skills = skill_analysis['total_jd_skills']
+        self.total_resume_skills = skill_analysis['total_resume_skills']
+
+    @property
+    def total_matched(self):
+        return len(self.matched_skills)
+
+    def to_dict(self):
+        """Same shape as SkillExtractor.compare_skills"""
+        return {
+            "matched_skills": list(self.matched_skills),
+            "missing_skills": list(self.missing_skills),
+            "extra_skills": list(self.extra_skills),
+            "skill_match_percentage": self.skill_match_percentage,
+            "total_jd_skills": self.total_jd_skills,
+            "total_resume_skills": self.total_resume_skills,
+            "total_matched": self.total_matched
+        }
+
+
+_interned = {}
+
+
+def _intern(skill):
+    return _interned.setdefault(skill, skill)
+
+
+class ResultBatch:
+    """
+    Column-wise batch of analysis results
+
+    Scores are float32 arrays, match categories uint8 codes and the skill lists
+    are CSR-style (uint16 skill ids + int64 offsets) into a sorted vocabulary.
+    """
+
+    CATEGORIES = ("Excellent Match", "Moderate Match", "Partial Fit", "Poor Fit")
+
+    def __init__(self, vocabulary=None):
+        self.vocabulary = sorted(vocabulary if vocabulary is not None else ALL_SKILLS)
+        self._skill_ids = {skill: i for i, skill in enumerate(self.vocabulary)}
+        self._category_ids = {category: i for i, category in enumerate(self.CATEGORIES)}
+        self.analysis_id = np.empty(0, dtype=np.int64)
+        self.semantic_score = np.empty(0, dtype=np.float32)
+        self.skill_match_percentage = np.empty(0, dtype=np.float32)
+        self.match_category = np.empty(0, dtype=np.uint8)
+        self.total_jd_skills = np.empty(0, dtype=np.uint16)
+        self.total_resume_skills = np.empty(0, dtype=np.uint16)
+        self._lists = {
+            name: (np.empty(0, dtype=np.uint16), np.zeros(1, dtype=np.int64))
+            for name in ('matched_skills', 'missing_skills', 'extra_skills')
+        }
+
+    @classmethod
+    def from_analyses(cls, analyses, vocabulary=None):
+        """
+        Build a batch from (analysis_id, semantic_score, skill_analysis, match_category) tuples
+        """
+        batch = cls(vocabulary)
+        batch.extend(analyses)
+        return batch
+
+    def extend(self, analyses):
+        """Append (analysis_id, semantic_score, skill_analysis, match_category) tuples"""
+        ids, semantic, skill_pct, categories, jd_totals, resume_totals = [], [], [], [], [], []
+        lists = {name: ([], []) for name in self._lists}
+        for analysis_id, semantic_score, skill_analysis, match_category in analyses:
+            ids.append(analysis_id)
+            semantic.append(semantic_score)
+            skill_pct.append(skill_analysis['skill_match_percentage'])
+            categories.append(self._category_ids.get(match_category, len(self.CATEGORIES) - 1))
+            jd_totals.append(skill_analysis['total_jd_skills'])
+            resume_totals.append(skill_analysis['total_resume_skills'])
+            for name, (values, lengths) in lists.items():
+                skill_ids = [self._skill_ids[skill] for skill in skill_analysis[name]]
+                values.extend(skill_ids)
+                lengths.append(len(skill_ids))
+
+        self.analysis_id = np.concatenate([self.analysis_id, np.asarray(ids, dtype=np.int64)])
+        self.semantic_score = np.concatenate([self.semantic_score, np.asarray(semantic, dtype=np.float32)])
+        self.skill_match_percentage = np.concatenate([self.skill_match_percentage, np.asarray(skill_pct, dtype=np.float32)])
+        self.match_category = np.concatenate([self.match_category, np.asarray(categories, dtype=np.uint8)])
+        self.total_jd_skills = np.concatenate([self.total_jd_skills, np.asarray(jd_totals, dtype=np.uint16)])
+        self.total_resume_skills = np.concatenate([self.total_resume_skills, np.asarray(resume_totals, dtype=np.uint16)])
+        for name, (values, lengths) in lists.items():
+            old_values, old_offsets = self._lists[name]
+            new_offsets = old_offsets[-1] + np.cumsum(np.asarray(lengths, dtype=np.int64))
+            self._lists[name] = (
+                np.concatenate([old_values, np.asarray(values, dtype=np.uint16)]),
+                np.concatenate([old_offsets, new_offsets])
+            )
+
+    def __len__(self):
+        return len(self.analysis_id)
+
+    @property
+    def nbytes(self):
+        columns = (self.analysis_id, self.semantic_score, self.skill_match_percentage,
+                   self.match_category, self.total_jd_skills, self.total_resume_skills)
+        lists = sum(values.nbytes + offsets.nbytes for values, offsets in self._lists.values())
+        return sum(column.nbytes for column in columns) + lists
+
+    def skills(self, name, index):
+        """Skill names of one list ('matched_skills', 'missing_skills', 'extra_skills') for a row"""
+        values, offsets = self._lists[name]
+        return [self.vocabulary[i] for i in values[offsets[index]:offsets[index + 1]]]
+
+    def counts(self, name):
+        """Length of a skill list for every row, as an array"""
+        return np.diff(self._lists[name][1])
+
+    def __getitem__(self, index):
+        """Row as a compare_skills-shaped dict plus its scores"""
+        matched = self.skills('matched_skills', index)
+        return {
+            "analysis_id": int(self.analysis_id[index]),
+            "semantic_score": float(self.semantic_score[index]),
+            "match_category": self.CATEGORIES[self.match_category[index]],
+            "matched_skills": matched,
+            "missing_skills": self.skills('missing_skills', index),
+            "extra_skills": self.skills('extra_skills', index),
+            "skill_match_percentage": float(self.skill_match_percentage[index]),
+            "total_jd_skills": int(self.total_jd_skills[index]),
+            "total_resume_skills": int(self.total_resume_skills[index]),
+            "total_matched": len(matched)
+        }
+
+    def rank(self, by='semantic_score', k=None):
+        """Row indices sorted best first by a score column"""
+        order = np.argsort(-getattr(self, by), kind='stable')
+        return order if k is None else order[:k]
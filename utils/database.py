@@ -2,12 +2,17 @@ import sqlite3
 import pandas as pd
 from datetime import datetime
 import json
+from utils.document_store import DocumentStore
+from utils.skills_database import ALL_SKILLS, TAXONOMY_VERSION
+from utils.instrumentation import timed
 
 class AnalysisDatabase:
     def __init__(self, db_name='resume_analysis.db'):
         """Initialize SQLite database connection"""
         self.db_name = db_name
         self.create_tables()
+        self.document_store = DocumentStore(db_name)
+        self.record_taxonomy(TAXONOMY_VERSION, ALL_SKILLS)
     
     def create_tables(self):
         """Create tables if they don't exist"""
@@ -31,34 +36,151 @@ class AnalysisDatabase:
                 extra_skills TEXT,
                 match_category TEXT,
                 resume_word_count INTEGER,
-                jd_word_count INTEGER
+                jd_word_count INTEGER,
+                resume_sha256 TEXT,
+                jd_sha256 TEXT,
+                taxonomy_version TEXT,
+                model_version TEXT,
+                work_key TEXT,
+                llm_calls INTEGER,
+                llm_input_tokens INTEGER,
+                llm_output_tokens INTEGER,
+                llm_latency_ms REAL,
+                llm_tokens_estimated INTEGER,
+                llm_empty_responses INTEGER,
+                llm_truncated_responses INTEGER
             )
         ''')
         
+        # Add columns introduced after the table was first created
+        self._add_missing_columns(cursor, {
+            'resume_sha256': 'TEXT',
+            'jd_sha256': 'TEXT',
+            'taxonomy_version': 'TEXT',
+            'model_version': 'TEXT',
+            'work_key': 'TEXT',
+            'llm_calls': 'INTEGER',
+            'llm_input_tokens': 'INTEGER',
+            'llm_output_tokens': 'INTEGER',
+            'llm_latency_ms': 'REAL',
+            'llm_tokens_estimated': 'INTEGER',
+            'llm_empty_responses': 'INTEGER',
+            'llm_truncated_responses': 'INTEGER'
+        })
+        
+        # Bulk screening commits each work item at most once (NULLs don't collide)
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_work_key ON analysis_history(work_key)')
+        
+        # Skill list of every taxonomy version seen, so re-scoring can diff them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS taxonomy_versions (
+                version TEXT PRIMARY KEY,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                skills TEXT NOT NULL
+            )
+        ''')
+        
+        # Trend charts bucket and history pages sort by timestamp
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_timestamp ON analysis_history(timestamp)')
+        
+        # Change counter of analysis_history, bumped by triggers on every write,
+        # so cached charts know when their data is stale
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('analysis_history', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS analysis_history_version_{event.lower()}
+                AFTER {event} ON analysis_history
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = 'analysis_history';
+                END
+            ''')
+        
+        conn.commit()
+        conn.close()
+    
+    def _add_missing_columns(self, cursor, columns):
+        """ALTER TABLE analysis_history for any column it doesn't have yet"""
+        cursor.execute('PRAGMA table_info(analysis_history)')
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE analysis_history ADD COLUMN {name} {column_type}')
+    
+    def record_taxonomy(self, version, skills):
+        """Store the skill list of a taxonomy version (no-op if already known)"""
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('''
+            INSERT OR IGNORE INTO taxonomy_versions (version, skills) VALUES (?, ?)
+        ''', (version, json.dumps(sorted(skills))))
         conn.commit()
         conn.close()
     
-    def save_analysis(self, resume_filename, jd_filename, similarity_score, 
-                     skill_analysis, match_category, resume_word_count, jd_word_count):
-        """Save analysis results to database"""
+    def get_taxonomy_skills(self, version):
+        """Skill set of a recorded taxonomy version, or None if unknown"""
+        conn = sqlite3.connect(self.db_name)
+        row = conn.execute('SELECT skills FROM taxonomy_versions WHERE version = ?', (version,)).fetchone()
+        conn.close()
+        return set(json.loads(row[0])) if row else None
+    
+    @timed('db_save')
+    def save_analysis(self, resume_doc, jd_doc, similarity_score,
+                     skill_analysis, match_category, model_version=None, taxonomy_version=TAXONOMY_VERSION,
+                     llm_usage=None):
+        """
+        Save analysis results to database
+        resume_doc and jd_doc are Document objects; filenames and word
+        counts are read from their memoized views, and their texts are kept
+        in the document store so the analysis can be re-scored later.
+        model_version and taxonomy_version record what produced the scores,
+        llm_usage (an LLMUsage) the tokens and latency of the suggestions.
+        """
+        resume_sha256 = self.document_store.put(resume_doc)
+        jd_sha256 = self.document_store.put(jd_doc)
+        
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
+        self.insert_analysis(cursor, resume_doc, jd_doc, resume_sha256, jd_sha256, similarity_score,
+                             skill_analysis, match_category, model_version, taxonomy_version,
+                             llm_usage=llm_usage)
+        conn.commit()
+        conn.close()
         
+        return cursor.lastrowid
+    
+    def insert_analysis(self, cursor, resume_doc, jd_doc, resume_sha256, jd_sha256, similarity_score,
+                        skill_analysis, match_category, model_version=None,
+                        taxonomy_version=TAXONOMY_VERSION, work_key=None, llm_usage=None):
+        """
+        Insert one analysis row with the caller's cursor without committing, so
+        it can be part of a larger transaction. The documents must already be in
+        the document store (put them before opening the transaction).
+        With a work_key, a row already committed for that key is left as is.
+        Returns True if a row was inserted.
+        """
         # Convert skill lists to JSON strings
         matched_skills_json = json.dumps(skill_analysis['matched_skills'])
         missing_skills_json = json.dumps(skill_analysis['missing_skills'])
         extra_skills_json = json.dumps(skill_analysis['extra_skills'])
         
-        cursor.execute('''
-            INSERT INTO analysis_history 
+        cursor.execute(f'''
+            INSERT {'OR IGNORE ' if work_key is not None else ''}INTO analysis_history 
             (resume_filename, jd_filename, semantic_score, skill_match_score,
              total_matched_skills, total_missing_skills, total_extra_skills,
              matched_skills, missing_skills, extra_skills, match_category,
-             resume_word_count, jd_word_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             resume_word_count, jd_word_count, resume_sha256, jd_sha256,
+             taxonomy_version, model_version, work_key, llm_calls, llm_input_tokens,
+             llm_output_tokens, llm_latency_ms, llm_tokens_estimated, llm_empty_responses,
+             llm_truncated_responses)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            resume_filename,
-            jd_filename,
+            resume_doc.filename,
+            jd_doc.filename,
             similarity_score,
             skill_analysis['skill_match_percentage'],
             skill_analysis['total_matched'],
@@ -68,15 +190,48 @@ class AnalysisDatabase:
             missing_skills_json,
             extra_skills_json,
             match_category,
-            resume_word_count,
-            jd_word_count
+            resume_doc.word_count,
+            jd_doc.word_count,
+            resume_sha256,
+            jd_sha256,
+            taxonomy_version,
+            model_version,
+            work_key,
+            llm_usage.calls if llm_usage else None,
+            llm_usage.input_tokens if llm_usage else None,
+            llm_usage.output_tokens if llm_usage else None,
+            round(llm_usage.latency_ms, 1) if llm_usage else None,
+            int(llm_usage.estimated) if llm_usage else None,
+            llm_usage.empty_responses if llm_usage else None,
+            llm_usage.truncated_responses if llm_usage else None
         ))
-        
-        conn.commit()
+        return cursor.rowcount > 0
+    
+    def get_llm_usage_by_band(self):
+        """
+        Average LLM latency and tokens per analysis for each match band, and the
+        share of analyses with an empty or truncated (max_output_tokens) answer
+        """
+        conn = sqlite3.connect(self.db_name)
+        df = pd.read_sql_query('''
+            SELECT match_category,
+                   COUNT(*) AS analyses,
+                   ROUND(AVG(llm_latency_ms), 1) AS avg_latency_ms,
+                   ROUND(AVG(llm_input_tokens), 1) AS avg_input_tokens,
+                   ROUND(AVG(llm_output_tokens), 1) AS avg_output_tokens,
+                   SUM(llm_input_tokens + llm_output_tokens) AS total_tokens,
+                   ROUND(100.0 * SUM(llm_empty_responses > 0) / COUNT(*), 1) AS empty_pct,
+                   ROUND(100.0 * SUM(llm_truncated_responses > 0) / COUNT(*), 1) AS truncated_pct,
+                   SUM(llm_tokens_estimated) AS estimated
+            FROM analysis_history
+            WHERE llm_calls > 0
+            GROUP BY match_category
+            ORDER BY avg_latency_ms DESC
+        ''', conn)
         conn.close()
-        
-        return cursor.lastrowid
+        return df
     
+    @timed('db_read_all')
     def get_all_analyses(self):
         """Retrieve all analysis records"""
         conn = sqlite3.connect(self.db_name)
@@ -90,6 +245,71 @@ class AnalysisDatabase:
         conn.close()
         return df
     
+    @timed('db_read_page')
+    def get_analyses_page(self, limit=50, offset=0):
+        """Retrieve one page of analysis records, newest first"""
+        conn = sqlite3.connect(self.db_name)
+        df = pd.read_sql_query('''
+            SELECT id, timestamp, resume_filename, jd_filename, 
+                   semantic_score, skill_match_score, total_matched_skills,
+                   total_missing_skills, match_category
+            FROM analysis_history
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', conn, params=(limit, offset))
+        conn.close()
+        return df
+    
+    def count_analyses(self):
+        """Number of analysis records"""
+        conn = sqlite3.connect(self.db_name)
+        count = conn.execute('SELECT COUNT(*) FROM analysis_history').fetchone()[0]
+        conn.close()
+        return count
+    
+    def get_data_version(self):
+        """Counter that changes whenever analysis_history is written"""
+        conn = sqlite3.connect(self.db_name)
+        row = conn.execute("SELECT version FROM data_versions WHERE name = 'analysis_history'").fetchone()
+        conn.close()
+        return row[0] if row else 0
+    
+    @timed('db_score_trend')
+    def get_score_trend(self, buckets=500):
+        """
+        Score trend aggregated into at most `buckets` equal time buckets
+        One row per non-empty bucket: first timestamp, count and
+        mean/min/max of the semantic and skill match scores.
+        """
+        conn = sqlite3.connect(self.db_name)
+        start, end = conn.execute('''
+            SELECT MIN(julianday(timestamp)), MAX(julianday(timestamp)) FROM analysis_history
+        ''').fetchone()
+        if start is None:
+            conn.close()
+            return pd.DataFrame(columns=[
+                'timestamp', 'count', 'semantic_mean', 'semantic_min', 'semantic_max',
+                'skill_mean', 'skill_min', 'skill_max'
+            ])
+        width = max(end - start, 1e-9) / buckets
+        df = pd.read_sql_query('''
+            SELECT MIN(CAST((julianday(timestamp) - ?) / ? AS INTEGER), ? - 1) AS bucket,
+                   MIN(timestamp) AS timestamp,
+                   COUNT(*) AS count,
+                   AVG(semantic_score) AS semantic_mean,
+                   MIN(semantic_score) AS semantic_min,
+                   MAX(semantic_score) AS semantic_max,
+                   AVG(skill_match_score) AS skill_mean,
+                   MIN(skill_match_score) AS skill_min,
+                   MAX(skill_match_score) AS skill_max
+            FROM analysis_history
+            GROUP BY bucket
+            ORDER BY bucket
+        ''', conn, params=(start, width, buckets))
+        conn.close()
+        return df.drop(columns='bucket')
+    
+    @timed('db_read_one')
     def get_analysis_by_id(self, analysis_id):
         """Get detailed analysis by ID"""
         conn = sqlite3.connect(self.db_name)
@@ -103,6 +323,27 @@ class AnalysisDatabase:
         conn.close()
         return result
     
+    def get_analysis_documents(self, analysis_id):
+        """
+        Get the stored (resume, job description) Documents of an analysis
+        Either is None if the analysis predates the document store
+        """
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT resume_sha256, jd_sha256 FROM analysis_history WHERE id = ?
+        ''', (analysis_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None, None
+        resume_sha256, jd_sha256 = row
+        return (
+            self.document_store.get(resume_sha256) if resume_sha256 else None,
+            self.document_store.get(jd_sha256) if jd_sha256 else None
+        )
+    
+    @timed('db_statistics')
     def get_statistics(self):
         """Get overall statistics from all analyses"""
         conn = sqlite3.connect(self.db_name)
@@ -0,0 +1,525 @@
+"""
+Distributed bulk screening
+
+A coordinator splits a screening run (one job description against many resume
+files) into shards stored in the analysis database. Any number of worker
+processes, on this machine or on other hosts that mount the same volume, claim
+shards under a time-limited lease, run extraction, embedding and skill
+comparison, and commit a shard's analyses and its 'done' status in one
+transaction. The commit is fenced by the lease token, and every analysis
+carries a unique work_key, so each resume of a run is committed exactly once
+even when a slow worker's lease expires and the shard is retried elsewhere.
+
+    python -m utils.distributed run --jd jd.pdf --processes 4 resumes/
+    python -m utils.distributed submit --db /shared/resume_analysis.db --jd jd.pdf /shared/resumes/
+    python -m utils.distributed work --db /shared/resume_analysis.db --processes 8
+    python -m utils.distributed status --db /shared/resume_analysis.db --run 1
+
+Resume paths are stored as given (made absolute), so every host must see the
+files under the same path. WAL mode only works on one host; when workers on
+several hosts share the file, use --journal-mode delete on a filesystem with
+working POSIX locks.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+import uuid
+
+from utils.job_queue import LeaseHeartbeat
+
+RESUME_EXTENSIONS = ('.pdf', '.txt')
+
+
+class ScreeningQueue:
+    """Screening runs and their leased shards, stored next to `analysis_history`"""
+
+    def __init__(self, db_name='resume_analysis.db', lease_seconds=300, max_attempts=3, journal_mode='wal'):
+        self.db_name = db_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.journal_mode = journal_mode
+        self.create_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_tables(self):
+        """Create the screening tables if they don't exist"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'PRAGMA journal_mode={self.journal_mode}')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS screening_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                name TEXT,
+                jd_filename TEXT,
+                jd_type TEXT,
+                jd_bytes BLOB,
+                total_items INTEGER NOT NULL,
+                shard_size INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS screening_shards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER NOT NULL,
+                shard_index INTEGER NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                worker_id TEXT,
+                lease_token TEXT,
+                lease_expires REAL,
+                items TEXT NOT NULL,
+                committed_items INTEGER NOT NULL DEFAULT 0,
+                failed_items TEXT,
+                error TEXT,
+                UNIQUE (run_id, shard_index)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_screening_shards_status ON screening_shards (status, id)')
+        conn.commit()
+        conn.close()
+
+    def submit_run(self, jd_bytes, jd_filename, jd_type, resume_paths, shard_size=500, name=None):
+        """
+        Create a run and split its resumes into shards of shard_size paths
+        Returns the run id
+        """
+        paths = sorted({os.path.abspath(path) for path in resume_paths})
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute('''
+                INSERT INTO screening_runs (name, jd_filename, jd_type, jd_bytes, total_items, shard_size)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (name, jd_filename, jd_type, sqlite3.Binary(jd_bytes), len(paths), shard_size))
+            run_id = cursor.lastrowid
+            conn.executemany('''
+                INSERT INTO screening_shards (run_id, shard_index, max_attempts, items)
+                VALUES (?, ?, ?, ?)
+            ''', (
+                (run_id, index, self.max_attempts, json.dumps(paths[start:start + shard_size]))
+                for index, start in enumerate(range(0, len(paths), shard_size))
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+        return run_id
+
+    def get_run_jd(self, run_id):
+        """(jd_bytes, jd_filename, jd_type) of a run"""
+        conn = self._connect()
+        row = conn.execute('SELECT jd_bytes, jd_filename, jd_type FROM screening_runs WHERE id = ?', (run_id,)).fetchone()
+        conn.close()
+        if row is None:
+            raise KeyError(f"Unknown screening run {run_id}")
+        return bytes(row['jd_bytes']), row['jd_filename'], row['jd_type']
+
+    def claim_shard(self, worker_id):
+        """
+        Atomically claim the oldest queued shard (or one whose lease expired)
+        Returns the shard with a fresh lease token, or None if nothing is claimable
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Give up on shards whose last attempt's lease ran out
+            conn.execute('''
+                UPDATE screening_shards
+                SET status = 'failed', error = COALESCE(error, 'Lease expired'),
+                    lease_token = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+            ''', (now,))
+            row = conn.execute('''
+                SELECT id, run_id, shard_index, attempts, items FROM screening_shards
+                WHERE (status = 'queued' OR (status = 'running' AND lease_expires < ?))
+                  AND attempts < max_attempts
+                ORDER BY id
+                LIMIT 1
+            ''', (now,)).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            lease_token = uuid.uuid4().hex
+            conn.execute('''
+                UPDATE screening_shards
+                SET status = 'running', attempts = attempts + 1, worker_id = ?,
+                    lease_token = ?, lease_expires = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (worker_id, lease_token, now + self.lease_seconds, row['id']))
+            conn.commit()
+        finally:
+            conn.close()
+        shard = dict(row)
+        shard['items'] = json.loads(shard['items'])
+        shard['attempts'] += 1
+        shard['lease_token'] = lease_token
+        return shard
+
+    def renew_lease(self, shard_id, lease_token):
+        """Extend a held lease; returns False if it was lost to another worker"""
+        conn = self._connect()
+        cursor = conn.execute('''
+            UPDATE screening_shards SET lease_expires = ?
+            WHERE id = ? AND lease_token = ? AND status = 'running'
+        ''', (time.time() + self.lease_seconds, shard_id, lease_token))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+
+    def commit_shard(self, shard_id, lease_token, db, analyses, failed_items=()):
+        """
+        Insert a shard's analyses into AnalysisDatabase and mark it done, atomically
+        analyses: dicts of AnalysisDatabase.insert_analysis keyword arguments,
+        each with a work_key. Documents must already be in db.document_store.
+        Returns False (and writes nothing) if the lease token no longer holds.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Fencing: only the current lease holder may commit
+            row = conn.execute('''
+                SELECT 1 FROM screening_shards WHERE id = ? AND lease_token = ? AND status = 'running'
+            ''', (shard_id, lease_token)).fetchone()
+            if row is None:
+                conn.rollback()
+                return False
+            cursor = conn.cursor()
+            for analysis in analyses:
+                db.insert_analysis(cursor, **analysis)
+            conn.execute('''
+                UPDATE screening_shards
+                SET status = 'done', committed_items = ?, failed_items = ?, error = NULL,
+                    lease_token = NULL, lease_expires = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (len(analyses), json.dumps(list(failed_items)) if failed_items else None, shard_id))
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def fail_shard(self, shard_id, lease_token, error):
+        """Record a failure; the shard is re-queued until max_attempts is reached"""
+        conn = self._connect()
+        conn.execute('''
+            UPDATE screening_shards
+            SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                error = ?, lease_token = NULL, lease_expires = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_token = ? AND status = 'running'
+        ''', (error, shard_id, lease_token))
+        conn.commit()
+        conn.close()
+
+    def has_pending_work(self, run_id=None):
+        """True while any shard (of a run) is queued or running"""
+        conn = self._connect()
+        query = "SELECT 1 FROM screening_shards WHERE status IN ('queued', 'running')"
+        params = ()
+        if run_id is not None:
+            query += ' AND run_id = ?'
+            params = (run_id,)
+        row = conn.execute(query + ' LIMIT 1', params).fetchone()
+        conn.close()
+        return row is not None
+
+    def get_run_status(self, run_id):
+        """Shard counts per status plus committed and failed item totals"""
+        conn = self._connect()
+        run = conn.execute('SELECT id, name, total_items, shard_size FROM screening_runs WHERE id = ?', (run_id,)).fetchone()
+        if run is None:
+            conn.close()
+            return None
+        shards = conn.execute('''
+            SELECT status, COUNT(*) FROM screening_shards WHERE run_id = ? GROUP BY status
+        ''', (run_id,)).fetchall()
+        committed, failed_json = conn.execute('''
+            SELECT SUM(committed_items), json_group_array(failed_items) FROM screening_shards
+            WHERE run_id = ? AND status = 'done'
+        ''', (run_id,)).fetchone()
+        conn.close()
+        failed_items = sum(len(json.loads(items)) for items in json.loads(failed_json or '[]') if items)
+        status = dict(run)
+        status['shards'] = {row[0]: row[1] for row in shards}
+        status['committed_items'] = committed or 0
+        status['failed_items'] = failed_items
+        return status
+
+
+def work_key(run_id, path):
+    """Identity of one resume within a run; unique in analysis_history"""
+    return f"screening:{run_id}:{path}"
+
+
+def screen_shard(run_id, paths, jd_doc, matcher, skill_extractor, db, embed_batch_size=64):
+    """
+    Extract, embed and compare one shard's resumes against the run's JD
+    Returns (analyses for commit_shard, failed items). Files that can't be
+    opened or extracted, or contain no text, are reported as failed items
+    instead of failing the whole shard.
+    """
+    from utils.document import Document
+
+    documents, failed = [], []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                document = Document.from_bytes(f.read(), os.path.basename(path))
+        except Exception as e:
+            failed.append({'path': path, 'error': f"{type(e).__name__}: {e}"})
+            continue
+        # The extract functions return an error message instead of raising
+        if document.extraction_error:
+            failed.append({'path': path, 'error': document.extraction_error})
+        elif not document.raw_text.strip():
+            failed.append({'path': path, 'error': "No extractable text"})
+        else:
+            documents.append((path, document))
+
+    # Batched forward passes instead of one encode per resume
+    docs = [doc for _, doc in documents]
+    matcher.embed_documents([jd_doc])
+    for start in range(0, len(docs), embed_batch_size):
+        matcher.embed_documents(docs[start:start + embed_batch_size])
+
+    jd_sha256 = db.document_store.put(jd_doc)
+    analyses = []
+    for path, resume_doc in documents:
+        similarity_score = float(matcher.calculate_similarity(resume_doc, jd_doc))
+        match_category, _ = matcher.get_match_category(similarity_score)
+        analyses.append({
+            'resume_doc': resume_doc,
+            'jd_doc': jd_doc,
+            'resume_sha256': db.document_store.put(resume_doc),
+            'jd_sha256': jd_sha256,
+            'similarity_score': similarity_score,
+            'skill_analysis': skill_extractor.compare_skills(resume_doc, jd_doc),
+            'match_category': match_category,
+            'model_version': matcher.model_name,
+            'taxonomy_version': skill_extractor.taxonomy_version,
+            'work_key': work_key(run_id, path)
+        })
+    return analyses, failed
+
+
+def run_screening_worker(db_name, worker_id, stop_event=None, lease_seconds=300, journal_mode='wal',
+                         exit_when_idle=False, poll_interval=1.0, embed_batch_size=64, threads=None):
+    """
+    Worker process: load the models once, then claim and screen shards until
+    stop_event is set (or, with exit_when_idle, until no shard is queued or running)
+    threads pins PyTorch's intra-op threads (see utils.embedding_pool.plan_pool).
+    """
+    if threads:
+        from utils.embedding_pool import pin_threads
+        pin_threads(threads)
+    # Imported here so the coordinator doesn't need the models loaded
+    from utils.database import AnalysisDatabase
+    from utils.document import Document
+    from utils.feature_extractor import ResumeJobMatcher
+    from utils.skill_extractor import SkillExtractor
+
+    queue = ScreeningQueue(db_name, lease_seconds=lease_seconds, journal_mode=journal_mode)
+    db = AnalysisDatabase(db_name)
+    matcher = ResumeJobMatcher()
+    skill_extractor = SkillExtractor()
+    jd_docs = {}
+    print(f"✅ {worker_id} ready")
+
+    while stop_event is None or not stop_event.is_set():
+        shard = queue.claim_shard(worker_id)
+        if shard is None:
+            if exit_when_idle and not queue.has_pending_work():
+                break
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            with LeaseHeartbeat(queue, shard['id'], shard['lease_token']) as heartbeat:
+                if shard['run_id'] not in jd_docs:
+                    jd_bytes, jd_filename, jd_type = queue.get_run_jd(shard['run_id'])
+                    jd_docs[shard['run_id']] = Document.from_bytes(jd_bytes, jd_filename, jd_type)
+                analyses, failed = screen_shard(
+                    shard['run_id'], shard['items'], jd_docs[shard['run_id']],
+                    matcher, skill_extractor, db, embed_batch_size
+                )
+                committed = not heartbeat.lost and queue.commit_shard(
+                    shard['id'], shard['lease_token'], db, analyses, failed
+                )
+            if committed:
+                print(f"✅ {worker_id}: run {shard['run_id']} shard {shard['shard_index']} "
+                      f"({len(analyses)} committed, {len(failed)} failed)")
+            else:
+                print(f"⚠️ {worker_id}: lost the lease on run {shard['run_id']} shard {shard['shard_index']}")
+        except Exception:
+            print(f"❌ {worker_id}: run {shard['run_id']} shard {shard['shard_index']} failed")
+            queue.fail_shard(shard['id'], shard['lease_token'], traceback.format_exc())
+
+
+class ScreeningWorkerPool:
+    """
+    Local worker processes draining the screening queue
+    Each worker loads its own model; threads_per_worker defaults to an even
+    share of the cores (plan_pool), so the workers don't oversubscribe the CPU.
+    """
+
+    def __init__(self, db_name='resume_analysis.db', num_workers=2, lease_seconds=300,
+                 journal_mode='wal', exit_when_idle=False, embed_batch_size=64,
+                 threads_per_worker=None):
+        from utils.embedding_pool import plan_pool
+
+        self.db_name = db_name
+        self.config = plan_pool(num_workers, threads_per_worker)
+        # plan_pool lowers a worker count that would oversubscribe the cores
+        self.num_workers = min(num_workers, self.config['processes'])
+        self.worker_kwargs = {
+            'lease_seconds': lease_seconds,
+            'journal_mode': journal_mode,
+            'exit_when_idle': exit_when_idle,
+            'embed_batch_size': embed_batch_size,
+            'threads': self.config['threads_per_process']
+        }
+        # spawn avoids forking a process that may already hold PyTorch threads
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._processes = []
+
+    def start(self):
+        """Start the worker processes"""
+        from utils.embedding_pool import thread_env
+
+        host = os.uname().nodename if hasattr(os, 'uname') else 'host'
+        with thread_env(self.config['threads_per_process']):
+            for i in range(self.num_workers):
+                worker_id = f"screen-{host}-{os.getpid()}-{i}"
+                process = self._context.Process(
+                    target=run_screening_worker,
+                    args=(self.db_name, worker_id, self._stop_event),
+                    kwargs=self.worker_kwargs,
+                    name=worker_id
+                )
+                process.start()
+                self._processes.append(process)
+        return self
+
+    def is_alive(self):
+        return any(process.is_alive() for process in self._processes)
+
+    def shutdown(self, timeout=60):
+        """Ask workers to stop after their current shard and wait for them"""
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+
+def collect_resume_paths(inputs):
+    """Resume files from a mix of file and directory arguments"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(
+                    os.path.join(root, name) for name in files
+                    if name.lower().endswith(RESUME_EXTENSIONS)
+                )
+        else:
+            paths.append(item)
+    return paths
+
+
+def submit_from_args(queue, args):
+    with open(args.jd, 'rb') as f:
+        jd_bytes = f.read()
+    paths = collect_resume_paths(args.resumes)
+    run_id = queue.submit_run(jd_bytes, os.path.basename(args.jd), None, paths, args.shard_size, args.name)
+    print(f"✅ Run {run_id}: {len(paths)} resumes in shards of {args.shard_size}")
+    return run_id
+
+
+def print_status(status):
+    shards = ', '.join(f"{name}={count}" for name, count in sorted(status['shards'].items()))
+    print(f"Run {status['id']}: {status['committed_items']}/{status['total_items']} committed, "
+          f"{status['failed_items']} failed items; shards: {shards}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed bulk resume screening")
+    parser.add_argument('--db', default='resume_analysis.db', help="Shared SQLite database file")
+    parser.add_argument('--journal-mode', default='wal', choices=['wal', 'delete'],
+                        help="Use 'delete' when workers on several hosts share the file")
+    parser.add_argument('--lease-seconds', type=int, default=300, help="Shard lease duration")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_submit_args(command):
+        command.add_argument('--jd', required=True, help="Job description file (PDF or TXT)")
+        command.add_argument('--shard-size', type=int, default=500, help="Resumes per shard")
+        command.add_argument('--name', help="Run name")
+        command.add_argument('resumes', nargs='+', help="Resume files or directories")
+
+    def add_worker_args(command):
+        command.add_argument('--processes', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                             help="Worker processes on this host")
+        command.add_argument('--embed-batch-size', type=int, default=64, help="Resumes per embedding forward pass")
+        command.add_argument('--threads-per-worker', type=int,
+                             help="PyTorch threads per process (default: an even share of the cores)")
+
+    add_submit_args(commands.add_parser('submit', help="Split a run into shards"))
+    work = commands.add_parser('work', help="Run workers on this host")
+    add_worker_args(work)
+    work.add_argument('--exit-when-idle', action='store_true', help="Stop once no shard is queued or running")
+    status = commands.add_parser('status', help="Show a run's progress")
+    status.add_argument('--run', type=int, required=True)
+    run = commands.add_parser('run', help="Submit a run and process it with local workers")
+    add_submit_args(run)
+    add_worker_args(run)
+    args = parser.parse_args()
+
+    queue = ScreeningQueue(args.db, lease_seconds=args.lease_seconds, journal_mode=args.journal_mode)
+    if args.command == 'submit':
+        submit_from_args(queue, args)
+        return
+    if args.command == 'status':
+        run_status = queue.get_run_status(args.run)
+        if run_status is None:
+            parser.error(f"Unknown run {args.run}")
+        print_status(run_status)
+        return
+
+    run_id = submit_from_args(queue, args) if args.command == 'run' else None
+    pool = ScreeningWorkerPool(
+        args.db, args.processes, args.lease_seconds, args.journal_mode,
+        exit_when_idle=args.command == 'run' or args.exit_when_idle,
+        embed_batch_size=args.embed_batch_size,
+        threads_per_worker=args.threads_per_worker
+    ).start()
+    started = time.time()
+    try:
+        while pool.is_alive():
+            time.sleep(5)
+            if run_id is not None:
+                print_status(queue.get_run_status(run_id))
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+    finally:
+        pool.shutdown()
+    if run_id is not None:
+        print_status(queue.get_run_status(run_id))
+        print(f"Finished in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
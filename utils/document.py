@@ -0,0 +1,122 @@
+import hashlib
+import io
+from functools import cached_property
+
+from utils.text_processor import (
+    extract_text_from_pdf,
+    extract_text_from_txt,
+    is_extraction_error,
+    tokenize_lowered_text
+)
+from utils.instrumentation import METRICS
+
+class Document:
+    """
+    A resume or job description plus lazily computed, memoized views
+
+    Every derived view (lowercased text, cleaned text, tokens, word count,
+    content hash, skills, embedding) is computed at most once per document,
+    so the pipeline can pass the same object to every stage.
+    """
+
+    def __init__(self, raw_text, filename=None, raw_bytes=None):
+        self.raw_text = raw_text
+        self.filename = filename
+        self.raw_bytes = raw_bytes
+        # Set by from_bytes when the file could not be read
+        self.extraction_error = None
+        self._skills = {}
+        self._embeddings = {}
+
+    @classmethod
+    def from_upload(cls, file):
+        """
+        Build a Document from an uploaded file (PDF or TXT)
+        The raw bytes are kept so the content hash covers the original upload
+        """
+        raw_bytes = file.getvalue() if hasattr(file, 'getvalue') else file.read()
+        filename = getattr(file, 'name', None)
+        return cls.from_bytes(raw_bytes, filename, getattr(file, 'type', None))
+
+    @classmethod
+    def from_bytes(cls, raw_bytes, filename=None, mime_type=None):
+        """Build a Document from raw PDF or TXT bytes"""
+        is_pdf = mime_type == "application/pdf" or (
+            mime_type is None and (filename or '').lower().endswith('.pdf')
+        )
+        if is_pdf:
+            raw_text = extract_text_from_pdf(io.BytesIO(raw_bytes))
+        else:
+            raw_text = extract_text_from_txt(io.BytesIO(raw_bytes))
+        document = cls(raw_text, filename=filename, raw_bytes=raw_bytes)
+        if is_extraction_error(raw_text):
+            document.extraction_error = raw_text
+        return document
+
+    @classmethod
+    def from_store(cls, raw_text, cleaned, filename=None, content_hash=None):
+        """
+        Rebuild a Document from stored texts without re-running clean_text
+        The original bytes aren't stored, so the stored content hash is kept
+        """
+        document = cls(raw_text, filename=filename)
+        # Seed the cached_property values directly
+        document.__dict__['tokens'] = cleaned.split()
+        document.__dict__['cleaned'] = cleaned
+        if content_hash is not None:
+            document.__dict__['content_hash'] = content_hash
+        return document
+
+    @cached_property
+    def lowercased(self):
+        """Lowercased raw text"""
+        return self.raw_text.lower()
+
+    @cached_property
+    def tokens(self):
+        """Tokens after the clean_text pipeline (stopwords removed)"""
+        return tokenize_lowered_text(self.lowercased)
+
+    @cached_property
+    def cleaned(self):
+        """Cleaned text, identical to clean_text(raw_text)"""
+        return ' '.join(self.tokens)
+
+    @cached_property
+    def word_count(self):
+        """Number of words in the cleaned text"""
+        return len(self.tokens)
+
+    @cached_property
+    def content_hash(self):
+        """SHA-256 of the raw upload bytes (or of the UTF-8 text if no bytes)"""
+        data = self.raw_bytes if self.raw_bytes is not None else self.raw_text.encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+
+    def skills(self, skill_extractor):
+        """Skills found in the document, extracted once per taxonomy version"""
+        taxonomy_version = getattr(skill_extractor, 'taxonomy_version', None)
+        if taxonomy_version not in self._skills:
+            METRICS.cache_miss('document_skills')
+            self._skills[taxonomy_version] = skill_extractor.match_skills(self.lowercased)
+        else:
+            METRICS.cache_hit('document_skills')
+        return self._skills[taxonomy_version]
+
+    def has_embedding(self, matcher):
+        """Whether the embedding for this matcher's model is already cached"""
+        return getattr(matcher, 'model_name', None) in self._embeddings
+
+    def set_embedding(self, matcher, vector):
+        """Store an embedding computed elsewhere (e.g. as part of a batch)"""
+        self._embeddings[getattr(matcher, 'model_name', None)] = vector
+
+    def embedding(self, matcher):
+        """Embedding of the cleaned text, computed once per model"""
+        model_name = getattr(matcher, 'model_name', None)
+        if model_name not in self._embeddings:
+            METRICS.cache_miss('document_embedding')
+            self._embeddings[model_name] = matcher.generate_embeddings(self.cleaned)
+        else:
+            METRICS.cache_hit('document_embedding')
+        return self._embeddings[model_name]
@@ -0,0 +1,269 @@
+import re
+import sqlite3
+import zlib
+
+from utils.document import Document
+from utils.instrumentation import METRICS, timed
+
+# zstd is optional; zlib (stdlib) is used when it isn't installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def extract_terms(text_lower):
+    """
+    Word-character runs of lowercased text, as stored in the term index
+    Every run inside a skill that matches a text (see SkillExtractor.match_skills)
+    is also a whole run of that text, so a document can only contain a skill
+    if it contains all of the skill's terms.
+    """
+    return set(TERM_PATTERN.findall(text_lower))
+
+
+def _compressor(codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("codec='zstd' needs the 'zstandard' package; install it or use codec='zlib'")
+        return zstandard.ZstdCompressor(level=3).compress
+    return lambda data: zlib.compress(data, 6)
+
+
+def _decompressor(codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Document was stored with zstd; install the 'zstandard' package to read it")
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+class DocumentStore:
+    """
+    Content-addressed store of extracted and cleaned document text
+
+    Documents are keyed by the SHA-256 of the uploaded bytes (Document.content_hash),
+    so identical uploads are stored once. Both texts are compressed with zstd when
+    available, zlib otherwise; the codec is recorded per row.
+    """
+
+    def __init__(self, db_name='resume_analysis.db', codec=None):
+        self.db_name = db_name
+        self.codec = codec or ('zstd' if zstandard is not None else 'zlib')
+        self._compress = _compressor(self.codec)
+        self.create_tables()
+
+    def create_tables(self):
+        """Create the documents table if it doesn't exist"""
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                sha256 TEXT PRIMARY KEY,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                filename TEXT,
+                codec TEXT NOT NULL,
+                raw_size INTEGER,
+                text_size INTEGER,
+                cleaned_size INTEGER,
+                text_blob BLOB,
+                cleaned_blob BLOB,
+                terms_indexed INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('PRAGMA table_info(documents)')
+        if 'terms_indexed' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute('ALTER TABLE documents ADD COLUMN terms_indexed INTEGER NOT NULL DEFAULT 0')
+        
+        # Inverted index term -> documents, used to find the documents a
+        # taxonomy change can affect without scanning every text
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS term_index (
+                term TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (term, sha256)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+
+    @timed('store_put')
+    def put(self, document):
+        """
+        Store a Document's extracted and cleaned text if not already present
+        Returns its SHA-256 key
+        """
+        sha256 = document.content_hash
+        conn = sqlite3.connect(self.db_name)
+        try:
+            exists = conn.execute('SELECT 1 FROM documents WHERE sha256 = ?', (sha256,)).fetchone()
+            if exists:
+                METRICS.cache_hit('document_store')
+                return sha256
+            METRICS.cache_miss('document_store')
+
+            text_bytes = document.raw_text.encode('utf-8')
+            cleaned_bytes = document.cleaned.encode('utf-8')
+            raw_size = len(document.raw_bytes) if document.raw_bytes is not None else len(text_bytes)
+            # OR IGNORE: a concurrent writer may have stored the same content meanwhile
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO documents
+                (sha256, filename, codec, raw_size, text_size, cleaned_size, text_blob, cleaned_blob, terms_indexed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+            ''', (
+                sha256,
+                document.filename,
+                self.codec,
+                raw_size,
+                len(text_bytes),
+                len(cleaned_bytes),
+                sqlite3.Binary(self._compress(text_bytes)),
+                sqlite3.Binary(self._compress(cleaned_bytes))
+            ))
+            if cursor.rowcount:
+                self._insert_terms(conn, sha256, document.lowercased)
+            conn.commit()
+        finally:
+            conn.close()
+        return sha256
+
+    def _insert_terms(self, conn, sha256, text_lower):
+        conn.executemany(
+            'INSERT OR IGNORE INTO term_index (term, sha256) VALUES (?, ?)',
+            ((term, sha256) for term in extract_terms(text_lower))
+        )
+
+    def build_term_index(self, batch_size=500):
+        """
+        Index documents stored before the term index existed
+        Returns the number of documents indexed
+        """
+        pending = sorted(self.unindexed_documents())
+        indexed = 0
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            conn = sqlite3.connect(self.db_name)
+            for sha256, text, _ in self.iter_documents(include_cleaned=False, sha256s=chunk):
+                self._insert_terms(conn, sha256, text.lower())
+                conn.execute('UPDATE documents SET terms_indexed = 1 WHERE sha256 = ?', (sha256,))
+                indexed += 1
+            conn.commit()
+            conn.close()
+        return indexed
+
+    def unindexed_documents(self):
+        """Keys of documents not in the term index yet (see build_term_index)"""
+        conn = sqlite3.connect(self.db_name)
+        pending = {row[0] for row in conn.execute('SELECT sha256 FROM documents WHERE terms_indexed = 0')}
+        conn.close()
+        return pending
+
+    def find_documents_with_terms(self, terms):
+        """Keys of documents containing every one of the given terms"""
+        terms = sorted(set(terms))
+        if not terms:
+            return set()
+        conn = sqlite3.connect(self.db_name)
+        rows = conn.execute(f'''
+            SELECT sha256 FROM term_index
+            WHERE term IN ({', '.join('?' * len(terms))})
+            GROUP BY sha256
+            HAVING COUNT(*) = ?
+        ''', (*terms, len(terms))).fetchall()
+        conn.close()
+        return {row[0] for row in rows}
+
+    def find_documents_with_skills(self, skills):
+        """Candidate documents that may contain any of the given skills (a superset)"""
+        candidates = set()
+        for skill in skills:
+            candidates |= self.find_documents_with_terms(extract_terms(skill.lower()))
+        return candidates
+
+    def exists(self, sha256):
+        conn = sqlite3.connect(self.db_name)
+        row = conn.execute('SELECT 1 FROM documents WHERE sha256 = ?', (sha256,)).fetchone()
+        conn.close()
+        return row is not None
+
+    @timed('store_get')
+    def get(self, sha256):
+        """
+        Return a Document rebuilt from the store (cleaned text pre-cached), or None
+        """
+        conn = sqlite3.connect(self.db_name)
+        row = conn.execute('''
+            SELECT filename, codec, text_blob, cleaned_blob FROM documents WHERE sha256 = ?
+        ''', (sha256,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        filename, codec, text_blob, cleaned_blob = row
+        decompress = _decompressor(codec)
+        return Document.from_store(
+            decompress(text_blob).decode('utf-8'),
+            decompress(cleaned_blob).decode('utf-8'),
+            filename=filename,
+            content_hash=sha256
+        )
+
+    def iter_documents(self, batch_size=500, include_text=True, include_cleaned=True, sha256s=None):
+        """
+        Stream (sha256, text, cleaned) tuples in key order without loading the table
+        Rows are fetched batch_size at a time and decompressed one by one; pass
+        include_text/include_cleaned=False to skip reading a column entirely.
+        sha256s optionally restricts the scan to the given keys.
+        """
+        columns = ['sha256', 'codec',
+                   'text_blob' if include_text else 'NULL',
+                   'cleaned_blob' if include_cleaned else 'NULL']
+        query = f"SELECT {', '.join(columns)} FROM documents"
+        keys = sorted(set(sha256s)) if sha256s is not None else None
+
+        conn = sqlite3.connect(self.db_name)
+        try:
+            if keys is None:
+                batches = [conn.execute(query + ' ORDER BY sha256')]
+            else:
+                # Chunk IN-lists below SQLite's host-parameter limit
+                batches = (
+                    conn.execute(
+                        query + f" WHERE sha256 IN ({', '.join('?' * len(chunk))}) ORDER BY sha256", chunk
+                    )
+                    for chunk in (keys[i:i + 500] for i in range(0, len(keys), 500))
+                )
+            for cursor in batches:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for sha256, codec, text_blob, cleaned_blob in rows:
+                        decompress = _decompressor(codec)
+                        yield (
+                            sha256,
+                            decompress(text_blob).decode('utf-8') if text_blob is not None else None,
+                            decompress(cleaned_blob).decode('utf-8') if cleaned_blob is not None else None
+                        )
+        finally:
+            conn.close()
+
+    def get_statistics(self):
+        """Document count and raw vs compressed sizes"""
+        conn = sqlite3.connect(self.db_name)
+        row = conn.execute('''
+            SELECT COUNT(*), SUM(raw_size), SUM(text_size + cleaned_size),
+                   SUM(LENGTH(text_blob) + LENGTH(cleaned_blob))
+            FROM documents
+        ''').fetchone()
+        conn.close()
+        count, raw_size, text_size, stored_size = (value or 0 for value in row)
+        return {
+            'documents': count,
+            'raw_bytes': raw_size,
+            'text_bytes': text_size,
+            'stored_bytes': stored_size,
+            'compression_ratio': round(text_size / stored_size, 2) if stored_size else 0.0
+        }
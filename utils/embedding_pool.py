@@ -0,0 +1,410 @@
+"""
+Multi-process embedding pool with per-process thread governance
+
+By default every process that loads the SentenceTransformer starts one PyTorch
+intra-op thread per core. Several Streamlit sessions plus a bulk job on the
+same host then oversubscribe the CPU and throughput collapses. This pool runs
+a fixed number of worker processes instead. Each loads the model once and is
+pinned to threads_per_process threads, sized so that
+processes x threads_per_process matches the cores available:
+
+    pool = EmbeddingProcessPool(processes=4, threads_per_process=2).start()
+    service = EmbeddingService(pool.encode_batch, max_batch_size=128)
+    ...
+    pool.close()
+
+Texts are sorted by length and cut into chunks of similar length (less padding
+per forward pass). Chunks are queued longest first and idle workers pull the
+next one, so long documents don't pile up on one process.
+
+A worker that dies is restarted, up to max_restarts times over the pool's
+life. Which chunk it held isn't known, so every chunk in flight is queued
+again once (a duplicate result is dropped); a chunk still pending at a second
+death fails. Once the restarts are used up, or a restarted worker can't load
+the model, the pool fails every pending and later call and must be replaced.
+
+The job workers (utils.job_queue), screening workers (utils.distributed) and
+re-scoring (utils.rescoring) load their own model per process; they are sized
+with the same plan_pool and started with the same thread_env, so every model
+on the host shares one thread budget.
+
+Configuration (constructor arguments override the environment):
+    EMBEDDING_POOL_PROCESSES    worker processes (default: cores // threads)
+    EMBEDDING_POOL_THREADS      threads per process (default: cores // processes
+                                when the process count is given, else 1)
+"""
+import itertools
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# A spawned worker re-imports the parent's __main__ module (api_server, app, a
+# benchmark - usually importing numpy/torch) before its target function runs,
+# so the BLAS/OpenMP limits are put in the environment the child inherits at
+# start (thread_env). pin_threads in the worker then sets torch's own pools.
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def available_cores():
+    """CPU cores this process may run on (respects affinity masks and cgroups' cpusets)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def plan_pool(processes=None, threads_per_process=None, cores=None, reserve_cores=0):
+    """
+    Size the pool so processes x threads_per_process fits the machine
+    Given only the process count, each process gets an even share of the
+    cores; given neither, one thread per process and a process per core.
+    A process count that can't fit is lowered to cores // threads, with a
+    warning. reserve_cores are left free for the web server, the database
+    and the OS. Returns {'cores', 'processes', 'threads_per_process'}.
+    """
+    cores = max(1, (cores or available_cores()) - reserve_cores)
+    processes = processes or int(os.getenv('EMBEDDING_POOL_PROCESSES', 0))
+    threads = (threads_per_process or int(os.getenv('EMBEDDING_POOL_THREADS', 0))
+               or (max(1, cores // processes) if processes else 1))
+    threads = min(threads, cores)
+    max_processes = max(1, cores // threads)
+    if processes > max_processes:
+        print(f"⚠️ {processes} processes x {threads} threads would oversubscribe {cores} cores; "
+              f"using {max_processes} processes")
+        processes = max_processes
+    processes = processes or max_processes
+    return {'cores': cores, 'processes': processes, 'threads_per_process': threads}
+
+
+def _thread_env_vars(threads):
+    env = {name: str(threads) for name in THREAD_ENV_VARS}
+    # The Rust tokenizers spawn their own thread pool per process
+    env['TOKENIZERS_PARALLELISM'] = 'false'
+    return env
+
+
+@contextmanager
+def thread_env(threads):
+    """
+    Set the thread limits in this process's environment, restoring them on exit
+    Wrap Process.start() of spawned workers so they inherit the limits before
+    any of their imports run.
+    """
+    env = _thread_env_vars(threads)
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def pin_threads(threads):
+    """
+    Limit this process to `threads` intra-op threads
+    The environment variables only reach BLAS/OpenMP if numpy/torch are not
+    imported yet; start spawned workers inside thread_env for that.
+    """
+    os.environ.update(_thread_env_vars(threads))
+    try:
+        import torch
+    except ImportError:
+        # Encoders without PyTorch are governed by the environment alone
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before the first parallel op
+        pass
+
+
+def load_sentence_transformer(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def _worker_main(model_loader, model_name, threads, tasks, results):
+    """
+    Worker process: pin threads, load the model once, encode chunks until told to stop
+    results is this worker's own pipe: a worker killed mid-write can't leave a
+    lock held that the other workers' results would wait on forever.
+    """
+    pin_threads(threads)
+    try:
+        model = model_loader(model_name)
+    except Exception:
+        results.send(('failed', os.getpid(), traceback.format_exc()))
+        return
+    results.send(('ready', os.getpid(), None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, texts = task
+        try:
+            vectors = model.encode(texts, convert_to_tensor=False, batch_size=len(texts))
+            results.send((task_id, vectors, None))
+        except Exception:
+            results.send((task_id, None, traceback.format_exc()))
+
+
+class EmbeddingProcessPool:
+    """
+    Pool of embedding worker processes with a thread-safe encode_batch
+
+    encode_batch has the same contract as ResumeJobMatcher.encode_batch, so it
+    can back an EmbeddingService or ResumeJobMatcher.use_pool. model_loader
+    builds the model from model_name in each worker; it must be a module-level
+    function (spawned workers import it) returning an object with
+    SentenceTransformer's encode.
+    """
+
+    def __init__(self, model_name=None, processes=None, threads_per_process=None,
+                 reserve_cores=0, max_chunk_size=32, start_timeout=300, max_restarts=3,
+                 model_loader=load_sentence_transformer):
+        if model_name is None:
+            from utils.feature_extractor import DEFAULT_MODEL_NAME
+            model_name = DEFAULT_MODEL_NAME
+        self.model_name = model_name
+        self.config = plan_pool(processes, threads_per_process, reserve_cores=reserve_cores)
+        self.max_chunk_size = max_chunk_size
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self.model_loader = model_loader
+        self.restarts = 0
+        # spawn: workers must not inherit the parent's PyTorch thread pools
+        self._context = multiprocessing.get_context('spawn')
+        self._tasks = self._context.Queue()
+        self._processes = []
+        # Read end of each worker's result pipe, by the same index
+        self._readers = []
+        # task_id -> (future, texts); texts are kept to re-queue the chunk if a worker dies
+        self._pending = {}
+        self._retried = set()
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._collector = None
+        self._closed = threading.Event()
+        self._error = None
+
+    def _spawn(self, index):
+        """Start worker `index`; returns (process, read end of its result pipe)"""
+        threads = self.config['threads_per_process']
+        reader, writer = self._context.Pipe(duplex=False)
+        with thread_env(threads):
+            process = self._context.Process(
+                target=_worker_main,
+                args=(self.model_loader, self.model_name, threads, self._tasks, writer),
+                name=f"embedding-pool-{index}",
+                daemon=True
+            )
+            process.start()
+        # Only the worker holds the write end, so its exit shows up as EOF
+        writer.close()
+        return process, reader
+
+    def start(self):
+        """Start the workers and wait until every one has loaded the model"""
+        for i in range(self.config['processes']):
+            process, reader = self._spawn(i)
+            self._processes.append(process)
+            self._readers.append(reader)
+
+        deadline = time.monotonic() + self.start_timeout
+        for reader in self._readers:
+            try:
+                if not reader.poll(max(0.0, deadline - time.monotonic())):
+                    raise TimeoutError()
+                status, pid, error = reader.recv()
+            except (TimeoutError, EOFError, OSError):
+                self.close()
+                raise RuntimeError("Embedding workers did not start in time")
+            if status == 'failed':
+                self.close()
+                raise RuntimeError(f"Embedding worker {pid} failed to load {self.model_name}:\n{error}")
+
+        self._collector = threading.Thread(target=self._collect, name="embedding-pool-collector", daemon=True)
+        self._collector.start()
+        print(f"✅ Embedding pool ready: {self.config['processes']} processes x "
+              f"{self.config['threads_per_process']} threads")
+        return self
+
+    def _collect(self):
+        """Resolve futures as workers return results; restart workers that die"""
+        while not self._closed.is_set():
+            # Checked on every pass, not only when idle: under steady load results never stop
+            if not self._replace_dead_workers():
+                return
+            for reader in multiprocessing.connection.wait(list(self._readers), timeout=1.0):
+                try:
+                    message = reader.recv()
+                except (EOFError, OSError):
+                    # The worker exited; wait for it so the next pass replaces it
+                    self._processes[self._readers.index(reader)].join(1.0)
+                    continue
+                if not self._handle_result(*message):
+                    return
+
+    def _handle_result(self, task_id, vectors, error):
+        """Resolve the future of one worker message; returns False if the pool has failed"""
+        if task_id == 'ready':
+            return True
+        if task_id == 'failed':
+            self._fail_pending(RuntimeError(
+                f"Restarted embedding worker {vectors} failed to load {self.model_name}:\n{error}"
+            ))
+            return False
+        with self._pending_lock:
+            future, _ = self._pending.pop(task_id, (None, None))
+            self._retried.discard(task_id)
+        if future is None:
+            # Already answered by the other copy of a re-queued chunk
+            return True
+        if error is None:
+            future.set_result(vectors)
+        else:
+            future.set_exception(RuntimeError(f"Embedding worker failed:\n{error}"))
+        return True
+
+    def _replace_dead_workers(self):
+        """
+        Restart dead workers and queue the chunks in flight again
+        Returns False once max_restarts is exhausted and the pool has failed
+        """
+        if self._closed.is_set():
+            return True
+        dead = [i for i, process in enumerate(self._processes) if not process.is_alive()]
+        if not dead:
+            return True
+        if self.restarts + len(dead) > self.max_restarts:
+            self._fail_pending(RuntimeError(
+                f"An embedding worker process died ({self.restarts} restarts already used)"
+            ))
+            return False
+        for i in dead:
+            self._readers[i].close()
+            self._processes[i], self._readers[i] = self._spawn(i)
+            self.restarts += 1
+        print(f"⚠️ Restarted {len(dead)} embedding worker(s)")
+
+        with self._pending_lock:
+            lost = {task_id: self._pending.pop(task_id) for task_id in self._retried & self._pending.keys()}
+            self._retried -= lost.keys()
+            retry = dict(self._pending)
+            self._retried.update(retry)
+        for task_id, (_, texts) in retry.items():
+            self._tasks.put((task_id, texts))
+        for future, _ in lost.values():
+            future.set_exception(RuntimeError("Embedding workers died twice while this chunk was pending"))
+        return True
+
+    def _fail_pending(self, error):
+        with self._pending_lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+            self._retried.clear()
+        for future, _ in pending.values():
+            future.set_exception(error)
+
+    def _submit(self, texts):
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._pending_lock:
+            if self._error is not None:
+                raise self._error
+            self._pending[task_id] = (future, texts)
+        self._tasks.put((task_id, texts))
+        return future
+
+    def _chunks(self, order, lengths):
+        """
+        Split indices (sorted longest first) into chunks of similar length
+        Chunks are small enough that every process gets a share of one call,
+        and bounded by total characters so long documents travel in smaller chunks.
+        """
+        per_process = math.ceil(len(order) / self.config['processes'])
+        chunk_size = max(1, min(self.max_chunk_size, per_process))
+        char_budget = chunk_size * max(1, sum(lengths) // len(lengths))
+        chunk, chunk_chars = [], 0
+        for index in order:
+            if chunk and (len(chunk) >= chunk_size or chunk_chars + lengths[index] > char_budget):
+                yield chunk
+                chunk, chunk_chars = [], 0
+            chunk.append(index)
+            chunk_chars += lengths[index]
+        if chunk:
+            yield chunk
+
+    def encode_batch(self, texts):
+        """
+        Encode texts across the worker processes
+        Returns an array with one vector per text, in input order
+        """
+        import numpy as np
+
+        if self._closed.is_set():
+            raise RuntimeError("EmbeddingProcessPool has been closed")
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        lengths = [len(text) for text in texts]
+        # Longest first: the slowest chunks start earliest, short ones fill the gaps
+        order = sorted(range(len(texts)), key=lengths.__getitem__, reverse=True)
+        submitted = [
+            (chunk, self._submit([texts[i] for i in chunk]))
+            for chunk in self._chunks(order, lengths)
+        ]
+
+        result = None
+        for chunk, future in submitted:
+            vectors = np.asarray(future.result())
+            if result is None:
+                result = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+            result[chunk] = vectors
+        return result
+
+    def stats(self):
+        return {
+            'model': self.model_name,
+            'alive_processes': sum(process.is_alive() for process in self._processes),
+            'pending_chunks': len(self._pending),
+            'restarts': self.restarts,
+            **self.config
+        }
+
+    def close(self, timeout=30):
+        """Stop the workers after their current chunk; pending calls fail"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if self._collector is not None:
+            self._collector.join()
+        self._fail_pending(RuntimeError("EmbeddingProcessPool has been closed"))
+        self._tasks.close()
+        for reader in self._readers:
+            reader.close()
+        self._processes = []
+        self._readers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
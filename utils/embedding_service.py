@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+class EmbeddingService:
+    """
+    In-process embedding service shared by all Streamlit sessions
+
+    Encode requests from any thread are queued and grouped into micro-batches
+    (up to max_batch_size texts, waiting at most max_wait_ms for a batch to
+    fill). A single dedicated worker thread runs each batch through the
+    encode function and resolves one Future per caller.
+    """
+
+    def __init__(self, encode_batch, max_batch_size=32, max_wait_ms=5, latency_window=2048):
+        """
+        encode_batch: callable taking a list of texts and returning one vector per text
+        """
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=latency_window)
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """Queue a text for encoding and return a Future for its embedding"""
+        if self._stopped.is_set():
+            raise RuntimeError("EmbeddingService has been stopped")
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text, timeout=None):
+        """Blocking helper: encode a single text through the batching queue"""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued without waiting
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                # Stop requested: finish this batch, then exit
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            self._process(batch)
+        # Fail anything that raced in behind the stop marker
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("EmbeddingService has been stopped"))
+
+    def _process(self, batch):
+        """Encode one micro-batch and resolve its futures"""
+        # Skip requests whose callers already gave up
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for text, _, _ in batch]
+        try:
+            vectors = self.encode_batch(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._latencies.extend((finished - enqueued) * 1000 for _, _, enqueued in batch)
+
+    def stats(self):
+        """
+        Return queue depth, batch-size histogram and p50/p99 request latency (ms)
+        Latency covers queueing plus encoding for the most recent requests
+        """
+        with self._stats_lock:
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            latencies = np.array(self._latencies)
+        total_requests = sum(size * count for size, count in batch_sizes.items())
+        total_batches = sum(batch_sizes.values())
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batch_size_histogram': batch_sizes,
+            'total_requests': total_requests,
+            'total_batches': total_batches,
+            'avg_batch_size': round(total_requests / total_batches, 2) if total_batches else 0.0,
+            'p50_latency_ms': round(float(np.percentile(latencies, 50)), 2) if latencies.size else 0.0,
+            'p99_latency_ms': round(float(np.percentile(latencies, 99)), 2) if latencies.size else 0.0
+        }
+
+    def stop(self, timeout=None):
+        """Stop accepting work, finish queued requests and join the worker"""
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._queue.put(None)
+        self._worker.join(timeout)
@@ -1,38 +1,113 @@
-from sentence_transformers import SentenceTransformer
+import threading
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from utils.document import Document
+from utils.instrumentation import span, timed
+
+DEFAULT_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
 
 class ResumeJobMatcher:
-    def __init__(self, model_name='sentence-transformers/all-MiniLM-L6-v2'):
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, load_model=True):
         """
         Initialize the Sentence-BERT model
         all-MiniLM-L6-v2 creates 384-dimensional embeddings
+        With load_model=False the model is only loaded on the first local
+        encode, so a matcher backed by an EmbeddingProcessPool never loads it
+        """
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.embedding_service = None
+        self.embedding_pool = None
+        if load_model:
+            self.model  # load now rather than on the first encode
+    
+    @property
+    def model(self):
+        """The SentenceTransformer, loaded on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+    
+    def use_service(self, embedding_service):
+        """
+        Route generate_embeddings through a shared EmbeddingService so
+        concurrent sessions are micro-batched instead of encoding one by one
+        """
+        self.embedding_service = embedding_service
+    
+    def use_pool(self, embedding_pool):
+        """
+        Run forward passes on an EmbeddingProcessPool instead of this process
+        The pool must load the same model (embedding_pool.model_name)
         """
-        self.model = SentenceTransformer(model_name)
+        self.embedding_pool = embedding_pool
     
+    @timed('embedding')
     def generate_embeddings(self, text):
         """
         Generate embeddings for input text
         Returns a 384-dimensional vector
         """
+        if self.embedding_service is not None:
+            return self.embedding_service.encode(text)
+        if self.embedding_pool is not None:
+            return self.embedding_pool.encode_batch([text])[0]
         embedding = self.model.encode(text, convert_to_tensor=False)
         return embedding
     
+    @timed('embedding_batch')
+    def encode_batch(self, texts):
+        """
+        Encode a list of texts in a single forward pass
+        Returns an array with one 384-dimensional vector per text
+        """
+        if self.embedding_pool is not None:
+            return self.embedding_pool.encode_batch(texts)
+        return self.model.encode(texts, convert_to_tensor=False, batch_size=len(texts))
+    
+    def embed_documents(self, documents):
+        """
+        Compute embeddings for several Documents together instead of one by one
+        Documents that already have an embedding for this model are skipped
+        """
+        pending = [doc for doc in documents if not doc.has_embedding(self)]
+        if not pending:
+            return
+        if self.embedding_service is not None:
+            futures = [self.embedding_service.submit(doc.cleaned) for doc in pending]
+            vectors = [future.result() for future in futures]
+        else:
+            vectors = self.encode_batch([doc.cleaned for doc in pending])
+        for doc, vector in zip(pending, vectors):
+            doc.set_embedding(self, vector)
+    
+    def _embedding_for(self, source):
+        """Return the embedding for a Document (memoized) or a raw string"""
+        if isinstance(source, Document):
+            return source.embedding(self)
+        return self.generate_embeddings(source)
+    
     def calculate_similarity(self, resume_text, jd_text):
         """
         Calculate cosine similarity between resume and job description
+        Accepts Document objects (their cleaned text is embedded) or strings
         Returns similarity score as percentage (0-100%)
         """
         # Generate embeddings
-        resume_embedding = self.generate_embeddings(resume_text)
-        jd_embedding = self.generate_embeddings(jd_text)
+        resume_embedding = self._embedding_for(resume_text)
+        jd_embedding = self._embedding_for(jd_text)
         
         # Reshape for sklearn cosine_similarity
         resume_embedding = resume_embedding.reshape(1, -1)
         jd_embedding = jd_embedding.reshape(1, -1)
         
         # Calculate cosine similarity
-        similarity = cosine_similarity(resume_embedding, jd_embedding)[0][0]
+        with span('similarity'):
+            similarity = cosine_similarity(resume_embedding, jd_embedding)[0][0]
         
         # Convert to percentage
         similarity_percentage = round(similarity * 100, 2)
@@ -0,0 +1,252 @@
+"""
+Lightweight hot-path instrumentation for the analysis pipeline
+
+    with span('db_save'):
+        ...
+
+    @timed('clean_text')
+    def tokenize_lowered_text(text): ...
+
+Spans feed process-wide per-stage histograms (exported as Prometheus text or
+to a file) and, inside request_trace(), a per-request timing breakdown with an
+optional cProfile/pyinstrument profile.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar('analysis_trace', default=None)
+
+
+class MetricsRegistry:
+    """Thread-safe per-stage histograms and labelled counters"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        """Record one stage duration"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = {
+                    'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0
+                }
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def inc(self, name, amount=1, **labels):
+        """Increment a counter identified by name and labels"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def cache_hit(self, cache):
+        self.inc('analysis_cache_requests_total', cache=cache, result='hit')
+
+    def cache_miss(self, cache):
+        self.inc('analysis_cache_requests_total', cache=cache, result='miss')
+
+    def snapshot(self):
+        """Plain-dict copy of all metrics, including cache hit rates"""
+        with self._lock:
+            histograms = {
+                stage: {'counts': list(h['counts']), 'sum': h['sum'], 'count': h['count']}
+                for stage, h in self._histograms.items()
+            }
+            counters = dict(self._counters)
+        cache_totals = {}
+        for (name, labels), value in counters.items():
+            if name == 'analysis_cache_requests_total':
+                labels = dict(labels)
+                totals = cache_totals.setdefault(labels['cache'], {'hit': 0, 'miss': 0})
+                totals[labels['result']] += value
+        cache_hit_rates = {
+            cache: round(t['hit'] / (t['hit'] + t['miss']), 4) if t['hit'] + t['miss'] else 0.0
+            for cache, t in cache_totals.items()
+        }
+        return {'histograms': histograms, 'counters': counters, 'cache_hit_rates': cache_hit_rates}
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP analysis_stage_duration_seconds Time spent per pipeline stage',
+            '# TYPE analysis_stage_duration_seconds histogram'
+        ]
+        for stage, histogram in sorted(snapshot['histograms'].items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram['counts']):
+                cumulative += count
+                lines.append(f'analysis_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'analysis_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'analysis_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'analysis_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+        names = sorted({name for name, _ in snapshot['counters']})
+        for name in names:
+            lines.append(f'# TYPE {name} counter')
+            for (counter_name, labels), value in sorted(snapshot['counters'].items()):
+                if counter_name != name:
+                    continue
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        lines.append('# TYPE analysis_cache_hit_ratio gauge')
+        for cache, rate in sorted(snapshot['cache_hit_rates'].items()):
+            lines.append(f'analysis_cache_hit_ratio{{cache="{cache}"}} {rate}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_file(self, path):
+        """Atomically write the Prometheus text to a file (e.g. for node_exporter's textfile collector)"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Process-wide registry used by span() and timed()
+METRICS = MetricsRegistry()
+
+
+class RequestTrace:
+    """Per-request timing breakdown collected by spans on the request's context"""
+
+    def __init__(self):
+        self.spans = []
+        self.profile = None
+        self.started = time.perf_counter()
+        self.total_ms = None
+
+    def add(self, stage, seconds):
+        self.spans.append((stage, seconds * 1000))
+
+    def summary(self):
+        """Aggregate spans per stage (ms) in first-seen order"""
+        stages = {}
+        for stage, ms in self.spans:
+            entry = stages.setdefault(stage, {'stage': stage, 'calls': 0, 'total_ms': 0.0})
+            entry['calls'] += 1
+            entry['total_ms'] += ms
+        for entry in stages.values():
+            entry['total_ms'] = round(entry['total_ms'], 2)
+        return {
+            'total_ms': round(self.total_ms, 2) if self.total_ms is not None else None,
+            'stages': list(stages.values()),
+            'profile': self.profile
+        }
+
+
+@contextmanager
+def span(stage):
+    """Time a block: records the stage histogram and the current request trace"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        METRICS.inc('analysis_stage_errors_total', stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        METRICS.observe(stage, elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+
+def timed(stage):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def request_trace(profile=None):
+    """
+    Collect a per-request timing breakdown
+    profile: None, 'cprofile' or 'pyinstrument' (falls back to cProfile if not installed)
+    Only one request is cProfiled at a time; others run unprofiled and say so
+    in trace.profile.
+    """
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    profiler = _start_profiler(profile)
+    try:
+        yield trace
+    finally:
+        trace.profile = _stop_profiler(profiler)
+        trace.total_ms = (time.perf_counter() - trace.started) * 1000
+        _current_trace.reset(token)
+        METRICS.observe('request_total', trace.total_ms / 1000)
+
+
+# Since Python 3.12 cProfile hooks sys.monitoring, which allows one profiler
+# per process: enabling a second one while another request is profiled raises
+_cprofile_lock = threading.Lock()
+PROFILE_SKIPPED = "Not profiled: another request was being profiled"
+
+
+def _start_profiler(profile):
+    if not profile:
+        return None
+    if profile == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        except ImportError:
+            pass
+    if not _cprofile_lock.acquire(blocking=False):
+        METRICS.inc('profiles_skipped_total')
+        return PROFILE_SKIPPED
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (e.g. a debugger) holds sys.monitoring
+        _cprofile_lock.release()
+        METRICS.inc('profiles_skipped_total')
+        return PROFILE_SKIPPED
+    return profiler
+
+
+def _stop_profiler(profiler, limit=30):
+    if profiler is None or profiler is PROFILE_SKIPPED:
+        return profiler
+    if isinstance(profiler, cProfile.Profile):
+        try:
+            profiler.disable()
+        finally:
+            _cprofile_lock.release()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+    profiler.stop()
+    return profiler.output_text(unicode=True, color=False)
@@ -0,0 +1,451 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+class JobQueue:
+    """
+    Persistent analysis job queue stored in a `jobs` table next to
+    `analysis_history`. Jobs survive page reloads and app restarts; workers
+    claim them with a lease so a crashed worker's job is retried. Each claim
+    gets a new lease token; only its holder may complete or fail the job.
+    """
+
+    def __init__(self, db_name='resume_analysis.db', max_attempts=3, lease_seconds=600):
+        self.db_name = db_name
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.create_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_tables(self):
+        """Create the jobs table if it doesn't exist"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        # WAL lets the UI poll while workers write
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                worker_id TEXT,
+                lease_token TEXT,
+                lease_expires REAL,
+                resume_filename TEXT,
+                resume_type TEXT,
+                resume_bytes BLOB,
+                jd_filename TEXT,
+                jd_type TEXT,
+                jd_bytes BLOB,
+                result TEXT,
+                error TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)')
+        # Latest EmbeddingService stats of each worker process, for the UI
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS worker_stats (
+                worker_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL,
+                stats TEXT NOT NULL
+            )
+        ''')
+
+        # Tables created before lease tokens existed
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(jobs)')}
+        if 'lease_token' not in columns:
+            cursor.execute('ALTER TABLE jobs ADD COLUMN lease_token TEXT')
+
+        conn.commit()
+        conn.close()
+
+    def submit(self, resume_bytes, resume_filename, resume_type, jd_bytes, jd_filename, jd_type):
+        """Queue an analysis and return its job id"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO jobs
+            (max_attempts, resume_filename, resume_type, resume_bytes,
+             jd_filename, jd_type, jd_bytes)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            self.max_attempts,
+            resume_filename,
+            resume_type,
+            sqlite3.Binary(resume_bytes),
+            jd_filename,
+            jd_type,
+            sqlite3.Binary(jd_bytes)
+        ))
+        conn.commit()
+        conn.close()
+        return cursor.lastrowid
+
+    def get_job(self, job_id):
+        """
+        Get job status and, once finished, its result
+        Returns None if the job does not exist
+        """
+        conn = self._connect()
+        row = conn.execute('''
+            SELECT id, created_at, updated_at, status, attempts, max_attempts,
+                   worker_id, resume_filename, jd_filename, result, error
+            FROM jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def claim_next(self, worker_id):
+        """
+        Atomically claim the oldest queued job (or one whose lease expired)
+        Returns the job row including file bytes and its lease_token, or None
+        if the queue is empty
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Give up on jobs whose last attempt's lease ran out
+            conn.execute('''
+                UPDATE jobs
+                SET status = 'failed', error = COALESCE(error, 'Lease expired'),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+            ''', (now,))
+            row = conn.execute('''
+                SELECT * FROM jobs
+                WHERE (status = 'queued' OR (status = 'running' AND lease_expires < ?))
+                  AND attempts < max_attempts
+                ORDER BY id
+                LIMIT 1
+            ''', (now,)).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            lease_token = uuid.uuid4().hex
+            conn.execute('''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, worker_id = ?,
+                    lease_token = ?, lease_expires = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (worker_id, lease_token, now + self.lease_seconds, row['id']))
+            conn.commit()
+            job = dict(row)
+            job['lease_token'] = lease_token
+            return job
+        finally:
+            conn.close()
+
+    def renew_lease(self, job_id, lease_token):
+        """Extend a held lease; returns False if it was lost to another worker"""
+        conn = self._connect()
+        cursor = conn.execute('''
+            UPDATE jobs SET lease_expires = ?
+            WHERE id = ? AND lease_token = ? AND status = 'running'
+        ''', (time.time() + self.lease_seconds, job_id, lease_token))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+
+    def complete(self, job_id, lease_token, result, db=None, analysis=None):
+        """
+        Store a job's result, fenced by its lease token
+        With db and analysis (AnalysisDatabase.insert_analysis keyword
+        arguments, documents already in db.document_store), the analysis row is
+        inserted in the same transaction under work_key 'job:<id>', so a
+        retried job never saves a second row. Sets result['analysis_id'].
+        Returns False (and writes nothing) if the lease was lost.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Fencing: only the current lease holder may complete
+            row = conn.execute('''
+                SELECT 1 FROM jobs WHERE id = ? AND lease_token = ? AND status = 'running'
+            ''', (job_id, lease_token)).fetchone()
+            if row is None:
+                conn.rollback()
+                return False
+            if analysis is not None:
+                work_key = f"job:{job_id}"
+                db.insert_analysis(conn.cursor(), work_key=work_key, **analysis)
+                result['analysis_id'] = conn.execute(
+                    'SELECT id FROM analysis_history WHERE work_key = ?', (work_key,)
+                ).fetchone()[0]
+            conn.execute('''
+                UPDATE jobs
+                SET status = 'done', result = ?, error = NULL, lease_token = NULL, lease_expires = NULL,
+                    resume_bytes = NULL, jd_bytes = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (json.dumps(result), job_id))
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def fail(self, job_id, lease_token, error):
+        """Record a failure; the job is re-queued until max_attempts is reached"""
+        conn = self._connect()
+        conn.execute('''
+            UPDATE jobs
+            SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                error = ?, lease_token = NULL, lease_expires = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_token = ? AND status = 'running'
+        ''', (error, job_id, lease_token))
+        conn.commit()
+        conn.close()
+
+    def get_queue_stats(self):
+        """Count jobs per status"""
+        conn = self._connect()
+        rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        conn.close()
+        return {status: count for status, count in rows}
+
+    def publish_worker_stats(self, worker_id, stats):
+        """Store a worker's latest stats dict, replacing its previous one"""
+        conn = self._connect()
+        conn.execute('''
+            INSERT OR REPLACE INTO worker_stats (worker_id, updated_at, stats) VALUES (?, ?, ?)
+        ''', (worker_id, time.time(), json.dumps(stats)))
+        conn.commit()
+        conn.close()
+
+    def get_worker_stats(self, max_age=60):
+        """Stats of workers that published within the last max_age seconds, by worker id"""
+        conn = self._connect()
+        rows = conn.execute('''
+            SELECT worker_id, stats FROM worker_stats WHERE updated_at >= ? ORDER BY worker_id
+        ''', (time.time() - max_age,)).fetchall()
+        conn.close()
+        return {worker_id: json.loads(stats) for worker_id, stats in rows}
+
+
+class LeaseHeartbeat:
+    """
+    Renews a lease in the background while its job or shard is being processed
+    queue is a JobQueue or ScreeningQueue: anything with lease_seconds and
+    renew_lease(item_id, lease_token).
+    """
+
+    def __init__(self, queue, item_id, lease_token):
+        self.queue = queue
+        self.item_id = item_id
+        self.lease_token = lease_token
+        self.lost = False
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = self.queue.lease_seconds / 3
+        while not self._stop_event.wait(interval):
+            if not self.queue.renew_lease(self.item_id, self.lease_token):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_event.set()
+        self._thread.join()
+
+
+def run_worker(db_name, worker_id, stop_event=None, concurrency=4, poll_interval=0.5, stats_interval=5,
+               threads=None, llm='gemini', stub_latency_ms=0):
+    """
+    Worker process: load the models once, then run `concurrency` job loops
+    on threads until stop_event is set. The threads share one matcher whose
+    EmbeddingService micro-batches their encodes, and a slow Gemini call only
+    holds its own thread. The service's stats are published to the jobs
+    database every stats_interval seconds for the UI. threads pins PyTorch's
+    intra-op threads (see utils.embedding_pool.plan_pool). llm is 'gemini',
+    'stub' (StubSuggester with stub_latency_ms, for load tests) or 'none'.
+    """
+    if threads:
+        from utils.embedding_pool import pin_threads
+        pin_threads(threads)
+    # Imported here so the parent process doesn't need the models loaded
+    from utils.database import AnalysisDatabase
+    from utils.document import Document
+    from utils.embedding_service import EmbeddingService
+    from utils.feature_extractor import ResumeJobMatcher
+    from utils.instrumentation import METRICS, request_trace
+    from utils.llm_suggester import GeminiSuggester, StubSuggester
+    from utils.pipeline import analysis_row, analyze_documents
+    from utils.skill_extractor import SkillExtractor
+
+    jobs = JobQueue(db_name)
+    db = AnalysisDatabase(db_name)
+    matcher = ResumeJobMatcher()
+    embedding_service = EmbeddingService(matcher.encode_batch, max_batch_size=32, max_wait_ms=5)
+    matcher.use_service(embedding_service)
+    skill_extractor = SkillExtractor()
+    llm_suggester = None
+    if llm == 'stub':
+        llm_suggester = StubSuggester(stub_latency_ms)
+    elif llm == 'gemini':
+        try:
+            llm_suggester = GeminiSuggester()
+        except ValueError as e:
+            print(f"⚠️ {worker_id}: {e}")
+
+    # Optional per-job profile ('cprofile' or 'pyinstrument') and metrics textfile
+    profile = os.getenv('ANALYSIS_PROFILE') or None
+    metrics_dir = os.getenv('ANALYSIS_METRICS_DIR')
+    metrics_file = os.path.join(metrics_dir, f"{worker_id}.prom") if metrics_dir else None
+
+    def job_loop(thread_id):
+        while stop_event is None or not stop_event.is_set():
+            job = jobs.claim_next(thread_id)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            try:
+                with LeaseHeartbeat(jobs, job['id'], job['lease_token']) as heartbeat:
+                    with request_trace(profile=profile) as trace:
+                        resume_doc = Document.from_bytes(job['resume_bytes'], job['resume_filename'], job['resume_type'])
+                        jd_doc = Document.from_bytes(job['jd_bytes'], job['jd_filename'], job['jd_type'])
+                        result, usage = analyze_documents(resume_doc, jd_doc, matcher, skill_extractor, llm_suggester)
+                        analysis = analysis_row(db, resume_doc, jd_doc, result, matcher, skill_extractor, usage)
+                    result['debug'] = trace.summary()
+                    # The row is saved with the job's completion, so a retry can't duplicate it
+                    completed = not heartbeat.lost and jobs.complete(
+                        job['id'], job['lease_token'], result, db, analysis
+                    )
+                if not completed:
+                    print(f"⚠️ {thread_id}: lost the lease on job {job['id']}")
+            except Exception:
+                METRICS.inc('jobs_failed_total')
+                jobs.fail(job['id'], job['lease_token'], traceback.format_exc())
+            if metrics_file:
+                METRICS.write_prometheus_file(metrics_file)
+
+    threads = [
+        threading.Thread(target=job_loop, args=(f"{worker_id}-t{i}",), name=f"{worker_id}-t{i}")
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"✅ {worker_id} ready ({concurrency} job threads)")
+
+    def publish_stats():
+        while True:
+            jobs.publish_worker_stats(worker_id, embedding_service.stats())
+            if not any(thread.is_alive() for thread in threads):
+                return
+            time.sleep(stats_interval)
+
+    publisher = threading.Thread(target=publish_stats, name=f"{worker_id}-stats", daemon=True)
+    publisher.start()
+    for thread in threads:
+        thread.join()
+    publisher.join()
+    embedding_service.stop()
+
+
+class JobWorkerPool:
+    """
+    Pool of worker processes draining a JobQueue
+    Each worker loads its own model; threads_per_worker defaults to an even
+    share of the cores (plan_pool), so the workers don't oversubscribe the CPU.
+    """
+
+    def __init__(self, db_name='resume_analysis.db', num_workers=2, jobs_per_worker=4,
+                 threads_per_worker=None, llm='gemini', stub_latency_ms=0):
+        from utils.embedding_pool import plan_pool
+
+        self.db_name = db_name
+        self.jobs_per_worker = jobs_per_worker
+        self.llm = llm
+        self.stub_latency_ms = stub_latency_ms
+        self.config = plan_pool(num_workers, threads_per_worker)
+        # plan_pool lowers a worker count that would oversubscribe the cores
+        self.num_workers = min(num_workers, self.config['processes'])
+        # spawn avoids forking a process that may already hold PyTorch threads
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._processes = []
+
+    def start(self):
+        """Start the worker processes"""
+        from utils.embedding_pool import thread_env
+
+        threads = self.config['threads_per_process']
+        with thread_env(threads):
+            for i in range(self.num_workers):
+                worker_id = f"worker-{os.getpid()}-{i}"
+                process = self._context.Process(
+                    target=run_worker,
+                    args=(self.db_name, worker_id, self._stop_event, self.jobs_per_worker),
+                    kwargs={'threads': threads, 'llm': self.llm, 'stub_latency_ms': self.stub_latency_ms},
+                    name=worker_id,
+                    daemon=True
+                )
+                process.start()
+                self._processes.append(process)
+        return self
+
+    def is_alive(self):
+        return any(process.is_alive() for process in self._processes)
+
+    def worker_pids(self):
+        """PIDs of the worker processes still running"""
+        return [process.pid for process in self._processes if process.is_alive()]
+
+    def shutdown(self, timeout=30):
+        """Ask workers to stop after their current job and wait for them"""
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run analysis job workers")
+    parser.add_argument('--db', default='resume_analysis.db', help="SQLite database file")
+    parser.add_argument('--workers', type=int, default=2, help="Number of worker processes")
+    parser.add_argument('--jobs-per-worker', type=int, default=4, help="Concurrent jobs per process")
+    parser.add_argument('--threads-per-worker', type=int,
+                        help="PyTorch threads per process (default: an even share of the cores)")
+    parser.add_argument('--llm', choices=['gemini', 'stub', 'none'], default='gemini')
+    parser.add_argument('--stub-latency-ms', type=int, default=0, help="Simulated latency of the stub LLM")
+    args = parser.parse_args()
+
+    pool = JobWorkerPool(args.db, args.workers, args.jobs_per_worker, args.threads_per_worker,
+                         args.llm, args.stub_latency_ms).start()
+    try:
+        while pool.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
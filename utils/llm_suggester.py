@@ -1,10 +1,185 @@
 import google.generativeai as genai
+import math
 import os
+import time
 from dotenv import load_dotenv
+from utils.instrumentation import METRICS, timed
 
 # Load environment variables
 load_dotenv()
 
+# Rough characters per token for English text, used when a response carries
+# no usage_metadata
+CHARS_PER_TOKEN = 4
+
+# Prompt tier and output budget per match band (ResumeJobMatcher.get_match_category).
+# Strong matches only need a short polish note; weak ones get the full plan.
+# Budgets leave headroom because gemini-2.5 models count thinking tokens
+# against max_output_tokens, and google-generativeai has no setting to cap
+# thinking. Calls that end empty or at the limit are counted per band
+# (LLMUsage, the Statistics page), so check those rates before shrinking a
+# budget; an empty answer is retried once with twice the budget.
+SUGGESTION_TIERS = {
+    "Excellent Match": {
+        'max_output_tokens': 512,
+        'skills_shown': 5,
+        'sections': (
+            "Write:\n"
+            "1. **Overall Assessment** (1-2 sentences)\n"
+            "2. **Final Polish** (2 bullets on making the strongest matched skills stand out)"
+        )
+    },
+    "Moderate Match": {
+        'max_output_tokens': 768,
+        'skills_shown': 8,
+        'sections': (
+            "Write:\n"
+            "1. **Overall Assessment** (2 sentences)\n"
+            "2. **Priority Actions** (3 bullets: skills to add or emphasize, keywords to include)\n"
+            "3. **Resume Optimization Tips** (2 bullets, including ATS keywords)"
+        )
+    },
+    "Partial Fit": {
+        'max_output_tokens': 1024,
+        'skills_shown': 10,
+        'sections': (
+            "Write:\n"
+            "1. **Overall Assessment** (2-3 sentences)\n"
+            "2. **Priority Actions** (3-5 bullets)\n"
+            "3. **Skill Development Roadmap** (3 most critical missing skills, each with a project or resource)\n"
+            "4. **Resume Optimization Tips** (2-3 bullets, including ATS keywords)"
+        )
+    },
+    "Poor Fit": {
+        'max_output_tokens': 1536,
+        'skills_shown': 10,
+        'sections': (
+            "Write:\n"
+            "1. **Overall Assessment** (2-3 sentences, including key strengths)\n"
+            "2. **Priority Actions** (3-5 bullets: skills, resume sections, keywords)\n"
+            "3. **Skill Development Roadmap** (3-4 critical missing skills with resources and a timeline)\n"
+            "4. **Resume Optimization Tips** (3-4 bullets: highlighting skills, formatting, ATS)"
+        )
+    }
+}
+# Used when no band is given
+DEFAULT_TIER = "Poor Fit"
+
+SUGGESTION_PROMPT = """You are an expert career coach. Be specific, actionable and encouraging; use markdown.
+
+Semantic match: {similarity_score}% | Skills match: {skill_match_percentage}%
+Matched skills: {matched}
+Missing skills: {missing}
+Additional skills: {extra}
+
+{sections}
+"""
+
+QUICK_TIP_PROMPT = """
+As a career coach, provide one specific, actionable tip (2-3 sentences) on how to quickly add "{skill}" to a resume, even if the candidate has limited experience with it. Focus on practical learning resources or portfolio projects.
+"""
+
+QUICK_TIP_MAX_OUTPUT_TOKENS = 256
+
+
+def estimate_tokens(text):
+    """Approximate token count of a text (about 4 characters per token)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def response_outcome(response):
+    """
+    'empty' if a response has no text, 'truncated' if it stopped at
+    max_output_tokens, None if it finished normally
+    """
+    candidates = getattr(response, 'candidates', None) or []
+    if not candidates:
+        return 'empty'
+    candidate = candidates[0]
+    parts = getattr(getattr(candidate, 'content', None), 'parts', None) or []
+    if not any(getattr(part, 'text', '') for part in parts):
+        return 'empty'
+    finish_reason = getattr(candidate, 'finish_reason', None)
+    if getattr(finish_reason, 'name', finish_reason) == 'MAX_TOKENS':
+        return 'truncated'
+    return None
+
+
+def _token_counts(prompt, response_text, response=None):
+    """
+    (input_tokens, output_tokens, estimated) for one call
+    Uses the response's usage_metadata when present, estimates otherwise
+    """
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is not None and getattr(metadata, 'prompt_token_count', None):
+        output_tokens = (getattr(metadata, 'candidates_token_count', 0) or 0) + \
+            (getattr(metadata, 'thoughts_token_count', 0) or 0)
+        return metadata.prompt_token_count, output_tokens, False
+    return estimate_tokens(prompt), estimate_tokens(response_text), True
+
+
+class LLMUsage:
+    """Token and latency totals of the LLM calls made for one analysis"""
+
+    def __init__(self, band=None):
+        self.band = band
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency_ms = 0.0
+        self.estimated = False
+        self.empty_responses = 0
+        self.truncated_responses = 0
+
+    def record(self, call, input_tokens, output_tokens, latency_ms, estimated, outcome=None):
+        """
+        Add one call's usage and export it as labelled counters
+        outcome is response_outcome's 'empty' or 'truncated' for incomplete answers
+        """
+        self.calls += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.latency_ms += latency_ms
+        self.estimated = self.estimated or estimated
+        band = self.band or 'unknown'
+        METRICS.inc('llm_tokens_total', input_tokens, call=call, band=band, direction='input')
+        METRICS.inc('llm_tokens_total', output_tokens, call=call, band=band, direction='output')
+        METRICS.inc('llm_latency_ms_total', latency_ms, call=call, band=band)
+        if outcome == 'empty':
+            self.empty_responses += 1
+        elif outcome == 'truncated':
+            self.truncated_responses += 1
+        if outcome:
+            METRICS.inc('llm_incomplete_responses_total', call=call, band=band, outcome=outcome)
+
+    def to_dict(self):
+        return {
+            'band': self.band,
+            'calls': self.calls,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'latency_ms': round(self.latency_ms, 1),
+            'estimated': self.estimated,
+            'empty_responses': self.empty_responses,
+            'truncated_responses': self.truncated_responses
+        }
+
+
+def build_suggestion_prompt(similarity_score, skill_match_percentage, matched_skills,
+                            missing_skills, extra_skills, match_category=None):
+    """Compact prompt for a match band; returns (prompt, max_output_tokens)"""
+    tier = SUGGESTION_TIERS.get(match_category, SUGGESTION_TIERS[DEFAULT_TIER])
+    shown = tier['skills_shown']
+    prompt = SUGGESTION_PROMPT.format(
+        similarity_score=similarity_score,
+        skill_match_percentage=skill_match_percentage,
+        matched=', '.join(matched_skills[:shown]) if matched_skills else 'None',
+        missing=', '.join(missing_skills[:shown]) if missing_skills else 'None',
+        extra=', '.join(extra_skills[:5]) if extra_skills else 'None',
+        sections=tier['sections']
+    )
+    return prompt, tier['max_output_tokens']
+
 class GeminiSuggester:
     def __init__(self):
         """Initialize Gemini AI model with fallback options"""
@@ -35,64 +210,68 @@ class GeminiSuggester:
         if not self.model:
             raise ValueError("Could not initialize any Gemini model. Please check your API key.")
     
+    @timed('llm_suggestions')
     def generate_suggestions(self, similarity_score, skill_match_percentage, 
-                           matched_skills, missing_skills, extra_skills):
+                           matched_skills, missing_skills, extra_skills,
+                           match_category=None, usage=None):
         """
         Generate personalized resume improvement suggestions using Gemini AI
+        The prompt template and output budget depend on match_category; tokens
+        and latency of the call are added to usage (an LLMUsage) if given.
         """
-        # Create detailed prompt
-        prompt = f"""
-You are an expert career coach and resume consultant with 15+ years of experience helping candidates optimize their resumes for job applications.
-
-**Candidate Analysis:**
-- Semantic Match Score: {similarity_score}%
-- Skills Match Score: {skill_match_percentage}%
-- Matched Skills: {', '.join(matched_skills[:10]) if matched_skills else 'None'}
-- Missing Skills: {', '.join(missing_skills[:10]) if missing_skills else 'None'}
-- Additional Skills: {', '.join(extra_skills[:5]) if extra_skills else 'None'}
-
-**Your Task:**
-Provide a comprehensive, actionable resume improvement plan with the following sections:
-
-1. **Overall Assessment** (2-3 sentences)
-   - Evaluate the candidate's current position
-   - Highlight key strengths
-
-2. **Priority Actions** (3-5 bullet points)
-   - Specific skills to add or emphasize
-   - Resume sections to enhance
-   - Keywords to include
-
-3. **Skill Development Roadmap** (3-4 recommendations)
-   - Which missing skills are most critical
-   - Suggested learning resources or projects
-   - Timeline for skill acquisition
-
-4. **Resume Optimization Tips** (3-4 actionable tips)
-   - How to better highlight existing skills
-   - Formatting and keyword suggestions
-   - ATS (Applicant Tracking System) optimization
-
-Keep the tone professional, encouraging, and specific. Focus on actionable advice rather than generic suggestions.
-"""
+        prompt, max_output_tokens = build_suggestion_prompt(
+            similarity_score, skill_match_percentage, matched_skills,
+            missing_skills, extra_skills, match_category
+        )
         
-        try:
-            # Generate response from Gemini with safety settings
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,  # Balanced creativity
-                    top_p=0.9,
-                    top_k=40,
-                    max_output_tokens=2048,
+        # Balanced creativity
+        text, error = self._generate('suggestions', prompt, usage, max_output_tokens,
+                                     temperature=0.7, top_p=0.9, top_k=40)
+        if text is None:
+            return f"⚠️ Error generating suggestions: {error}\n\nPlease try again or check your API quota."
+        return text
+    
+    def _generate(self, call, prompt, usage, max_output_tokens, **config):
+        """
+        generate_content with usage accounting; returns (text, error)
+        text is None if the call failed or the model returned no text. An
+        empty answer (thinking used the whole budget) is retried once with
+        twice the budget; both calls are recorded in usage.
+        """
+        for attempt in range(2):
+            started = time.perf_counter()
+            response = text = outcome = error = None
+            try:
+                response = self.model.generate_content(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        max_output_tokens=max_output_tokens,
+                        **config
+                    )
                 )
-            )
-            return response.text
-        
-        except Exception as e:
-            return f"⚠️ Error generating suggestions: {str(e)}\n\nPlease try again or check your API quota."
+                outcome = response_outcome(response)
+                if outcome != 'empty':
+                    text = response.text
+            except Exception as e:
+                METRICS.inc('llm_errors_total', call=call)
+                error = str(e)
+            if usage is not None:
+                usage.record(call, *self._usage(prompt, text, response, started), outcome=outcome)
+            if error is not None:
+                return None, error
+            if outcome != 'empty':
+                return text, None
+            max_output_tokens *= 2
+        return None, "the model returned no text within its output budget"
+    
+    @staticmethod
+    def _usage(prompt, text, response, started):
+        latency_ms = (time.perf_counter() - started) * 1000
+        input_tokens, output_tokens, estimated = _token_counts(prompt, text, response)
+        return input_tokens, output_tokens, latency_ms, estimated
     
-    def generate_quick_tip(self, missing_skills):
+    @timed('llm_quick_tip')
+    def generate_quick_tip(self, missing_skills, usage=None):
         """
         Generate a quick tip focused on the most critical missing skill
         """
@@ -101,18 +280,56 @@ Keep the tone professional, encouraging, and specific. Focus on actionable advic
         
         top_skill = missing_skills[0] if missing_skills else "relevant technical skills"
         
-        prompt = f"""
-As a career coach, provide one specific, actionable tip (2-3 sentences) on how to quickly add "{top_skill}" to a resume, even if the candidate has limited experience with it. Focus on practical learning resources or portfolio projects.
-"""
+        prompt = QUICK_TIP_PROMPT.format(skill=top_skill)
         
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.8,
-                    max_output_tokens=256,
-                )
-            )
-            return response.text
-        except Exception as e:
+        text, _ = self._generate('quick_tip', prompt, usage, QUICK_TIP_MAX_OUTPUT_TOKENS, temperature=0.8)
+        if text is None:
             return f"💡 Quick Tip: Focus on learning {top_skill} through online courses (Coursera, Udemy) and build 2-3 small projects to demonstrate practical knowledge."
+        return text
+
+
+class StubSuggester:
+    """
+    Offline stand-in for GeminiSuggester with the same interface
+    Used for local load tests and benchmarks; latency_ms simulates the API round trip
+    """
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+    
+    def _wait(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+    
+    @timed('llm_suggestions')
+    def generate_suggestions(self, similarity_score, skill_match_percentage, 
+                           matched_skills, missing_skills, extra_skills,
+                           match_category=None, usage=None):
+        """Return a canned improvement plan after the simulated latency"""
+        prompt, _ = build_suggestion_prompt(
+            similarity_score, skill_match_percentage, matched_skills,
+            missing_skills, extra_skills, match_category
+        )
+        started = time.perf_counter()
+        self._wait()
+        text = (
+            f"**Overall Assessment**\n\nSemantic match {similarity_score}%, skills match {skill_match_percentage}%.\n\n"
+            f"**Priority Actions**\n\n- Add: {', '.join(missing_skills[:5]) if missing_skills else 'None'}\n"
+            f"- Emphasize: {', '.join(matched_skills[:5]) if matched_skills else 'None'}"
+        )
+        if usage is not None:
+            latency_ms = (time.perf_counter() - started) * 1000
+            usage.record('suggestions', estimate_tokens(prompt), estimate_tokens(text), latency_ms, True)
+        return text
+    
+    @timed('llm_quick_tip')
+    def generate_quick_tip(self, missing_skills, usage=None):
+        """Return a canned tip after the simulated latency"""
+        if not missing_skills:
+            return "✅ Great job! Your resume covers all required skills. Focus on showcasing your achievements with quantifiable results."
+        started = time.perf_counter()
+        self._wait()
+        text = f"💡 Quick Tip: Build a small project using {missing_skills[0]} and list it on your resume."
+        if usage is not None:
+            latency_ms = (time.perf_counter() - started) * 1000
+            usage.record('quick_tip', estimate_tokens(QUICK_TIP_PROMPT.format(skill=missing_skills[0])), estimate_tokens(text), latency_ms, True)
+        return text
@@ -0,0 +1,90 @@
+from utils.llm_suggester import LLMUsage
+
+def analyze_documents(resume_doc, jd_doc, matcher, skill_extractor, llm_suggester=None):
+    """
+    Run the analysis pipeline on two Documents without saving it
+    Returns (result, usage): the run_analysis result with analysis_id still
+    None, and the LLMUsage of the suggestion calls (None without an LLM)
+    Raises ValueError if either file could not be read, rather than scoring
+    the extraction error message as its text
+    """
+    for doc in (resume_doc, jd_doc):
+        if doc.extraction_error:
+            raise ValueError(f"Could not read {doc.filename}: {doc.extraction_error}")
+
+    # Calculate semantic similarity score
+    similarity_score = float(matcher.calculate_similarity(resume_doc, jd_doc))
+    match_category, status_type = matcher.get_match_category(similarity_score)
+
+    # Extract and compare skills
+    skill_analysis = skill_extractor.compare_skills(resume_doc, jd_doc)
+
+    result = {
+        'analysis_id': None,
+        'resume_filename': resume_doc.filename,
+        'jd_filename': jd_doc.filename,
+        'similarity_score': similarity_score,
+        'match_category': match_category,
+        'status_type': status_type,
+        'skill_analysis': skill_analysis,
+        'suggestions': None,
+        'quick_tip': None
+    }
+
+    # AI-powered suggestions, sized by match band; token usage is saved with the analysis
+    usage = None
+    if llm_suggester:
+        usage = LLMUsage(band=match_category)
+        result['suggestions'] = llm_suggester.generate_suggestions(
+            similarity_score,
+            skill_analysis['skill_match_percentage'],
+            skill_analysis['matched_skills'],
+            skill_analysis['missing_skills'],
+            skill_analysis['extra_skills'],
+            match_category=match_category,
+            usage=usage
+        )
+        if skill_analysis['missing_skills']:
+            result['quick_tip'] = llm_suggester.generate_quick_tip(skill_analysis['missing_skills'], usage=usage)
+        result['llm_usage'] = usage.to_dict()
+
+    return result, usage
+
+def analysis_row(db, resume_doc, jd_doc, result, matcher, skill_extractor, usage=None):
+    """
+    AnalysisDatabase.insert_analysis keyword arguments for an analyze_documents result
+    Puts both documents into the document store, so call it before opening the
+    transaction the row is inserted in
+    """
+    return {
+        'resume_doc': resume_doc,
+        'jd_doc': jd_doc,
+        'resume_sha256': db.document_store.put(resume_doc),
+        'jd_sha256': db.document_store.put(jd_doc),
+        'similarity_score': result['similarity_score'],
+        'skill_analysis': result['skill_analysis'],
+        'match_category': result['match_category'],
+        'model_version': matcher.model_name,
+        'taxonomy_version': skill_extractor.taxonomy_version,
+        'llm_usage': usage
+    }
+
+def run_analysis(resume_doc, jd_doc, matcher, skill_extractor, db, llm_suggester=None):
+    """
+    Run the full analysis pipeline on two Documents and save it to the database
+    Returns a JSON-serializable dict with everything the UI needs to render
+    """
+    result, usage = analyze_documents(resume_doc, jd_doc, matcher, skill_extractor, llm_suggester)
+
+    # Save to database
+    result['analysis_id'] = db.save_analysis(
+        resume_doc,
+        jd_doc,
+        result['similarity_score'],
+        result['skill_analysis'],
+        result['match_category'],
+        model_version=matcher.model_name,
+        taxonomy_version=skill_extractor.taxonomy_version,
+        llm_usage=usage
+    )
+    return result
@@ -0,0 +1,422 @@
+"""
+Incremental re-scoring of stored analyses
+
+    python -m utils.rescoring --workers 4 --batch-size 200
+    python -m utils.rescoring --model sentence-transformers/all-mpnet-base-v2
+
+Each analysis records the taxonomy version and embedding model that produced
+it. Re-scoring only recomputes what changed:
+
+* skills: for rows on an older taxonomy, the added/removed skills are looked
+  up in the term index and only documents that can contain one of them are
+  re-extracted; every other row just moves to the new version, since its
+  skill lists cannot have changed
+* embeddings: semantic scores are recomputed only for rows produced by a
+  different model than the target one
+
+Rows saved before the document store existed have no texts to re-score; they
+keep their versions and are reported as rows_without_documents.
+
+Batches run in parallel (skills in worker processes; embedding batches have
+their texts loaded up to two batches ahead while the current one encodes) and
+each batch commits its updates together with a checkpoint, so an interrupted
+job resumes where it stopped.
+"""
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from utils.database import AnalysisDatabase
+from utils.document_store import DocumentStore
+from utils.skill_extractor import SkillExtractor
+from utils.skills_database import ALL_SKILLS, TAXONOMY_VERSION
+
+# Rows whose skills were extracted with another taxonomy; rows without stored
+# documents are left out, since there is nothing to re-extract them from
+STALE_TAXONOMY = '''
+    (taxonomy_version IS NULL OR taxonomy_version != ?)
+    AND resume_sha256 IS NOT NULL AND jd_sha256 IS NOT NULL
+'''
+
+# Embedding batches whose texts are loaded ahead of the one being encoded
+EMBEDDING_LOAD_AHEAD = 2
+
+# Worker-process state, set up once by _init_skill_worker
+_worker_store = None
+_worker_extractor = None
+
+
+def _init_skill_worker(db_name):
+    global _worker_store, _worker_extractor
+    _worker_store = DocumentStore(db_name)
+    _worker_extractor = SkillExtractor()
+
+
+def _rescore_skill_batch(rows, candidates):
+    """
+    Recompute skill fields for one batch
+    rows: (id, resume_sha256, jd_sha256, matched, extra, missing) with JSON lists
+    candidates: documents in this batch that may contain a changed skill
+    Returns [(id, skill_analysis or None)]; None means the skills are unchanged
+    """
+    skills_by_sha = {}
+    for sha256, text, _ in _worker_store.iter_documents(include_cleaned=False, sha256s=candidates):
+        skills_by_sha[sha256] = _worker_extractor.match_skills(text.lower())
+
+    results = []
+    for analysis_id, resume_sha256, jd_sha256, matched, extra, missing in rows:
+        if resume_sha256 not in skills_by_sha and jd_sha256 not in skills_by_sha:
+            results.append((analysis_id, None))
+            continue
+        matched, extra, missing = (set(json.loads(value or '[]')) for value in (matched, extra, missing))
+        # A document that is not a candidate contains none of the changed
+        # skills, so its stored skill set is still current
+        resume_skills = skills_by_sha.get(resume_sha256, matched | extra)
+        jd_skills = skills_by_sha.get(jd_sha256, matched | missing)
+        results.append((analysis_id, _worker_extractor.compare_skill_sets(resume_skills, jd_skills)))
+    return results
+
+
+class Rescorer:
+    """Re-scores stored analyses after a taxonomy or embedding-model change"""
+
+    def __init__(self, db_name='resume_analysis.db', matcher=None, job_name='rescore',
+                 batch_size=200, workers=4):
+        self.db = AnalysisDatabase(db_name)
+        self.db_name = db_name
+        self.store = self.db.document_store
+        self.matcher = matcher
+        self.job_name = job_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.create_tables()
+
+    def create_tables(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rescore_checkpoints (
+                job_name TEXT NOT NULL,
+                phase TEXT NOT NULL,
+                last_id INTEGER NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_name, phase)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def get_checkpoint(self, phase):
+        conn = sqlite3.connect(self.db_name)
+        row = conn.execute('''
+            SELECT last_id FROM rescore_checkpoints WHERE job_name = ? AND phase = ?
+        ''', (self.job_name, phase)).fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def reset_checkpoints(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('DELETE FROM rescore_checkpoints WHERE job_name = ?', (self.job_name,))
+        conn.commit()
+        conn.close()
+
+    def _save_checkpoint(self, conn, phase, last_id):
+        conn.execute('''
+            INSERT INTO rescore_checkpoints (job_name, phase, last_id) VALUES (?, ?, ?)
+            ON CONFLICT (job_name, phase) DO UPDATE SET last_id = excluded.last_id,
+                                                     updated_at = CURRENT_TIMESTAMP
+        ''', (self.job_name, phase, last_id))
+
+    def _iter_row_batches(self, query, params, start_id):
+        """Keyset-paginate rows (id first) after start_id, batch_size at a time"""
+        last_id = start_id
+        while True:
+            conn = sqlite3.connect(self.db_name)
+            rows = conn.execute(query + ' AND id > ? ORDER BY id LIMIT ?',
+                                (*params, last_id, self.batch_size)).fetchall()
+            conn.close()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+
+    # ---- planning -------------------------------------------------------
+
+    def plan_taxonomy(self, build_index=True):
+        """
+        Candidate documents per stale taxonomy version
+        Returns {old_version: set of sha256, or None when every document must be re-extracted}
+        Without build_index (dry runs) nothing is written; documents missing
+        from the term index are then counted as candidates.
+        """
+        conn = sqlite3.connect(self.db_name)
+        versions = [row[0] for row in conn.execute(f'''
+            SELECT DISTINCT taxonomy_version FROM analysis_history
+            WHERE {STALE_TAXONOMY}
+        ''', (TAXONOMY_VERSION,))]
+        conn.close()
+
+        if build_index:
+            self.store.build_term_index()
+            unindexed = set()
+        else:
+            unindexed = self.store.unindexed_documents()
+        plan = {}
+        for version in versions:
+            old_skills = self.db.get_taxonomy_skills(version) if version else None
+            if old_skills is None:
+                # Unknown previous taxonomy: nothing to diff against
+                plan[version] = None
+            else:
+                plan[version] = self.store.find_documents_with_skills(old_skills ^ ALL_SKILLS) | unindexed
+        return plan
+
+    def count_rows_without_documents(self):
+        """Rows with no stored texts, which can't be re-scored"""
+        conn = sqlite3.connect(self.db_name)
+        count = conn.execute('''
+            SELECT COUNT(*) FROM analysis_history WHERE resume_sha256 IS NULL OR jd_sha256 IS NULL
+        ''').fetchone()[0]
+        conn.close()
+        return count
+
+    def describe(self):
+        """What a run would recompute, without changing anything"""
+        plan = self.plan_taxonomy(build_index=False)
+        conn = sqlite3.connect(self.db_name)
+        stale_taxonomy = conn.execute(f'''
+            SELECT COUNT(*) FROM analysis_history WHERE {STALE_TAXONOMY}
+        ''', (TAXONOMY_VERSION,)).fetchone()[0]
+        stale_model = 0
+        if self.matcher is not None:
+            from utils.feature_extractor import DEFAULT_MODEL_NAME
+            stale_model = conn.execute('''
+                SELECT COUNT(*) FROM analysis_history
+                WHERE COALESCE(model_version, ?) != ?
+                  AND resume_sha256 IS NOT NULL AND jd_sha256 IS NOT NULL
+            ''', (DEFAULT_MODEL_NAME, self.matcher.model_name)).fetchone()[0]
+        conn.close()
+        return {
+            'taxonomy_version': TAXONOMY_VERSION,
+            'stale_taxonomy_rows': stale_taxonomy,
+            'candidate_documents': {
+                str(version): ('all' if candidates is None else len(candidates))
+                for version, candidates in plan.items()
+            },
+            'model_version': self.matcher.model_name if self.matcher is not None else None,
+            'stale_model_rows': stale_model,
+            'rows_without_documents': self.count_rows_without_documents()
+        }
+
+    # ---- skills phase ---------------------------------------------------
+
+    def rescore_skills(self):
+        """Bring every analysis onto the current taxonomy"""
+        plan = self.plan_taxonomy()
+        summary = {'rows': 0, 'recomputed': 0, 'unchanged': 0}
+        if not plan:
+            return summary
+
+        query = f'''
+            SELECT id, resume_sha256, jd_sha256, matched_skills, extra_skills,
+                   missing_skills, taxonomy_version
+            FROM analysis_history
+            WHERE {STALE_TAXONOMY}
+        '''
+        batches = self._iter_row_batches(query, (TAXONOMY_VERSION,), self.get_checkpoint('skills'))
+
+        # spawn: the parent may already hold a loaded PyTorch model
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_skill_worker, initargs=(self.db_name,)) as pool:
+            in_flight = deque()
+            for rows in batches:
+                in_flight.append((rows, self._submit_skill_batch(pool, rows, plan)))
+                # Bounded window: results are committed in id order for checkpointing
+                while len(in_flight) >= self.workers * 2:
+                    self._commit_skill_batch(*in_flight.popleft(), summary)
+            while in_flight:
+                self._commit_skill_batch(*in_flight.popleft(), summary)
+        return summary
+
+    def _submit_skill_batch(self, pool, rows, plan):
+        work, candidates = [], set()
+        for analysis_id, resume_sha256, jd_sha256, matched, extra, missing, version in rows:
+            version_candidates = plan.get(version)
+            for sha256 in (resume_sha256, jd_sha256):
+                if version_candidates is None or sha256 in version_candidates:
+                    candidates.add(sha256)
+            work.append((analysis_id, resume_sha256, jd_sha256, matched, extra, missing))
+        return pool.submit(_rescore_skill_batch, work, candidates)
+
+    def _commit_skill_batch(self, rows, future, summary):
+        results = future.result()
+        recomputed = [(analysis_id, analysis) for analysis_id, analysis in results if analysis is not None]
+        unchanged = [analysis_id for analysis_id, analysis in results if analysis is None]
+
+        conn = sqlite3.connect(self.db_name, timeout=30)
+        conn.executemany('''
+            UPDATE analysis_history
+            SET skill_match_score = ?, total_matched_skills = ?, total_missing_skills = ?,
+                total_extra_skills = ?, matched_skills = ?, missing_skills = ?, extra_skills = ?,
+                taxonomy_version = ?
+            WHERE id = ?
+        ''', [(
+            analysis['skill_match_percentage'],
+            analysis['total_matched'],
+            len(analysis['missing_skills']),
+            len(analysis['extra_skills']),
+            json.dumps(analysis['matched_skills']),
+            json.dumps(analysis['missing_skills']),
+            json.dumps(analysis['extra_skills']),
+            TAXONOMY_VERSION,
+            analysis_id
+        ) for analysis_id, analysis in recomputed])
+        conn.executemany('UPDATE analysis_history SET taxonomy_version = ? WHERE id = ?',
+                         [(TAXONOMY_VERSION, analysis_id) for analysis_id in unchanged])
+        self._save_checkpoint(conn, 'skills', rows[-1][0])
+        conn.commit()
+        conn.close()
+
+        summary['rows'] += len(rows)
+        summary['recomputed'] += len(recomputed)
+        summary['unchanged'] += len(unchanged)
+
+    # ---- embeddings phase -----------------------------------------------
+
+    def _adopt_legacy_model_version(self):
+        """Rows saved before model versioning were all scored with the default model"""
+        from utils.feature_extractor import DEFAULT_MODEL_NAME
+
+        conn = sqlite3.connect(self.db_name, timeout=30)
+        conn.execute('UPDATE analysis_history SET model_version = ? WHERE model_version IS NULL',
+                     (DEFAULT_MODEL_NAME,))
+        conn.commit()
+        conn.close()
+
+    def rescore_embeddings(self):
+        """Recompute semantic scores for rows produced by another embedding model"""
+        summary = {'rows': 0, 'recomputed': 0, 'documents_embedded': 0}
+        if self.matcher is None:
+            return summary
+        model_version = self.matcher.model_name
+        self._adopt_legacy_model_version()
+
+        query = '''
+            SELECT id, resume_sha256, jd_sha256 FROM analysis_history
+            WHERE model_version != ?
+              AND resume_sha256 IS NOT NULL AND jd_sha256 IS NOT NULL
+        '''
+        batches = self._iter_row_batches(query, (model_version,), self.get_checkpoint('embeddings'))
+
+        def load_texts(rows):
+            needed = {sha256 for _, resume_sha256, jd_sha256 in rows for sha256 in (resume_sha256, jd_sha256)}
+            return rows, {sha256: cleaned for sha256, _, cleaned in
+                          self.store.iter_documents(include_text=False, sha256s=needed)}
+
+        # Decompress the next batches while the current one encodes; the
+        # window is bounded so only a few batches of texts are held at once
+        with ThreadPoolExecutor(1) as loader:
+            loading = deque()
+            for rows in batches:
+                loading.append(loader.submit(load_texts, rows))
+                if len(loading) > EMBEDDING_LOAD_AHEAD:
+                    self._commit_embedding_batch(*loading.popleft().result(), model_version, summary)
+            while loading:
+                self._commit_embedding_batch(*loading.popleft().result(), model_version, summary)
+        return summary
+
+    def _commit_embedding_batch(self, rows, texts, model_version, summary):
+        keys = list(texts)
+        vectors = np.asarray(self.matcher.encode_batch([texts[key] for key in keys]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        index = {key: i for i, key in enumerate(keys)}
+
+        updates = []
+        for analysis_id, resume_sha256, jd_sha256 in rows:
+            if resume_sha256 not in index or jd_sha256 not in index:
+                continue
+            similarity = float(np.dot(vectors[index[resume_sha256]], vectors[index[jd_sha256]]))
+            score = round(similarity * 100, 2)
+            match_category, _ = self.matcher.get_match_category(score)
+            updates.append((score, match_category, model_version, analysis_id))
+
+        conn = sqlite3.connect(self.db_name, timeout=30)
+        conn.executemany('''
+            UPDATE analysis_history
+            SET semantic_score = ?, match_category = ?, model_version = ?
+            WHERE id = ?
+        ''', updates)
+        self._save_checkpoint(conn, 'embeddings', rows[-1][0])
+        conn.commit()
+        conn.close()
+
+        summary['rows'] += len(rows)
+        summary['recomputed'] += len(updates)
+        summary['documents_embedded'] += len(keys)
+
+    def run(self):
+        """Run both phases; returns a summary of what was recomputed"""
+        started = time.perf_counter()
+        summary = {
+            'taxonomy_version': TAXONOMY_VERSION,
+            'skills': self.rescore_skills(),
+            'model_version': self.matcher.model_name if self.matcher is not None else None,
+            'embeddings': self.rescore_embeddings(),
+            'rows_without_documents': self.count_rows_without_documents()
+        }
+        # Finished: a later run of the same job starts from the beginning
+        self.reset_checkpoints()
+        summary['elapsed_s'] = round(time.perf_counter() - started, 2)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally re-score stored analyses")
+    parser.add_argument('--db', default='resume_analysis.db', help="SQLite database file")
+    parser.add_argument('--model', help="Target embedding model (default: ResumeJobMatcher's default)")
+    parser.add_argument('--skip-embeddings', action='store_true', help="Only bring skills onto the current taxonomy")
+    parser.add_argument('--job-name', default='rescore', help="Checkpoint name; rerun with the same name to resume")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4, help="Processes for skill re-extraction")
+    parser.add_argument('--embedding-processes', type=int, default=0,
+                        help="Encode on an EmbeddingProcessPool of this many processes (default: in this process)")
+    parser.add_argument('--embedding-threads', type=int,
+                        help="PyTorch threads per encoding process (default: an even share of the cores)")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be recomputed")
+    args = parser.parse_args()
+
+    matcher = None
+    embedding_pool = None
+    if not args.skip_embeddings:
+        from utils.embedding_pool import EmbeddingProcessPool, pin_threads, plan_pool
+        from utils.feature_extractor import DEFAULT_MODEL_NAME, ResumeJobMatcher
+
+        model_name = args.model or DEFAULT_MODEL_NAME
+        if args.dry_run:
+            # Only the model name is needed to count stale rows
+            matcher = ResumeJobMatcher(model_name, load_model=False)
+        elif args.embedding_processes:
+            matcher = ResumeJobMatcher(model_name, load_model=False)
+            embedding_pool = EmbeddingProcessPool(model_name, args.embedding_processes, args.embedding_threads).start()
+            matcher.use_pool(embedding_pool)
+        else:
+            # Same thread budget as the pool and the workers (see utils.embedding_pool)
+            pin_threads(plan_pool(1, args.embedding_threads)['threads_per_process'])
+            matcher = ResumeJobMatcher(model_name)
+
+    rescorer = Rescorer(args.db, matcher, args.job_name, args.batch_size, args.workers)
+    try:
+        result = rescorer.describe() if args.dry_run else rescorer.run()
+    finally:
+        if embedding_pool is not None:
+            embedding_pool.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
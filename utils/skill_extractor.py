@@ -1,17 +1,27 @@
-from utils.skills_database import ALL_SKILLS, SKILLS_DATABASE
+from utils.skills_database import ALL_SKILLS, SKILLS_DATABASE, TAXONOMY_VERSION
+from utils.document import Document
+from utils.instrumentation import timed
 import re
 
 class SkillExtractor:
     def __init__(self):
         self.all_skills = ALL_SKILLS
         self.skills_by_category = SKILLS_DATABASE
+        self.taxonomy_version = TAXONOMY_VERSION
     
     def extract_skills(self, text):
         """
         Extract skills from text using pattern matching
         Returns set of found skills
         """
-        text_lower = text.lower()
+        return self.match_skills(text.lower())
+    
+    @timed('skill_extraction')
+    def match_skills(self, text_lower):
+        """
+        Extract skills from text that is already lowercased
+        Returns set of found skills
+        """
         found_skills = set()
         
         for skill in self.all_skills:
@@ -22,6 +32,12 @@ class SkillExtractor:
         
         return found_skills
     
+    def _skills_for(self, source):
+        """Return the skill set for a Document (memoized) or a raw string"""
+        if isinstance(source, Document):
+            return source.skills(self)
+        return self.extract_skills(source)
+    
     def categorize_skills(self, skills):
         """
         Categorize extracted skills by domain
@@ -38,12 +54,20 @@ class SkillExtractor:
     def compare_skills(self, resume_text, jd_text):
         """
         Compare skills between resume and job description
+        Accepts Document objects or raw strings
         Returns matched, missing, and extra skills
         """
         # Extract skills from both texts
-        resume_skills = self.extract_skills(resume_text)
-        jd_skills = self.extract_skills(jd_text)
+        resume_skills = self._skills_for(resume_text)
+        jd_skills = self._skills_for(jd_text)
         
+        return self.compare_skill_sets(resume_skills, jd_skills)
+    
+    def compare_skill_sets(self, resume_skills, jd_skills):
+        """
+        Compare already-extracted skill sets (used by compare_skills and re-scoring)
+        Returns matched, missing, and extra skills
+        """
         # Calculate skill gaps
         matched_skills = resume_skills.intersection(jd_skills)
         missing_skills = jd_skills - resume_skills
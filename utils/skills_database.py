@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 # Comprehensive skill database organized by category
 SKILLS_DATABASE = {
     "programming_languages": [
@@ -39,3 +42,9 @@ SKILLS_DATABASE = {
 ALL_SKILLS = set()
 for category, skills in SKILLS_DATABASE.items():
     ALL_SKILLS.update(skills)
+
+# Version of the taxonomy, stored with every analysis so results can be
+# re-scored when skills are added or removed
+TAXONOMY_VERSION = hashlib.sha256(
+    json.dumps(sorted(ALL_SKILLS)).encode('utf-8')
+).hexdigest()[:12]
@@ -4,6 +4,7 @@ import string
 import nltk
 from nltk.corpus import stopwords
 from bs4 import BeautifulSoup
+from utils.instrumentation import timed
 
 # Download NLTK stopwords (run once)
 try:
@@ -11,6 +12,18 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
+# Built once at import instead of on every clean_text call
+STOP_WORDS = frozenset(stopwords.words('english'))
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+# Prefixes of the messages the extract functions return instead of raising
+EXTRACTION_ERROR_PREFIXES = ("Error extracting PDF: ", "Error reading TXT: ")
+
+def is_extraction_error(text):
+    """True if text is an extract_text_from_pdf/txt error message rather than content"""
+    return text.startswith(EXTRACTION_ERROR_PREFIXES)
+
+@timed('extract_pdf')
 def extract_text_from_pdf(file):
     """Extract text from PDF file using PyMuPDF"""
     try:
@@ -30,6 +43,7 @@ def extract_text_from_pdf(file):
     except Exception as e:
         return f"Error extracting PDF: {str(e)}"
 
+@timed('extract_txt')
 def extract_text_from_txt(file):
     """Extract text from TXT file"""
     try:
@@ -47,9 +61,14 @@ def clean_text(text):
     - Remove extra whitespaces
     - Remove stopwords
     """
-    # Convert to lowercase
-    text = text.lower()
-    
+    return ' '.join(tokenize_lowered_text(text.lower()))
+
+@timed('clean_text')
+def tokenize_lowered_text(text):
+    """
+    Run the clean_text pipeline on text that is already lowercased
+    Returns the list of filtered tokens so callers can reuse them
+    """
     # Remove HTML tags if any
     text = BeautifulSoup(text, "html.parser").get_text()
     
@@ -63,17 +82,7 @@ def clean_text(text):
     text = re.sub(r'\d+', '', text)
     
     # Remove punctuation
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    
-    # Remove extra whitespaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Remove stopwords
-    stop_words = set(stopwords.words('english'))
-    words = text.split()
-    filtered_words = [word for word in words if word not in stop_words]
-    
-    # Join words back
-    cleaned_text = ' '.join(filtered_words)
+    text = text.translate(PUNCTUATION_TABLE)
     
-    return cleaned_text
+    # Remove stopwords (split() also collapses extra whitespace)
+    return [word for word in text.split() if word not in STOP_WORDS]
@@ -1,5 +1,16 @@
 import plotly.graph_objects as go
 import pandas as pd
+import threading
+from collections import OrderedDict
+from utils.instrumentation import METRICS
+
+# Most points sent to the browser per trend trace
+TREND_MAX_POINTS = 1000
+# Figure specs kept in memory, keyed by chart, database and data version
+FIGURE_CACHE_SIZE = 32
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
 
 def create_gauge_chart(score, title):
     """
@@ -126,3 +137,89 @@ def create_category_breakdown_chart(categorized_skills):
     )
     
     return fig
+
+def cached_figure(key, build):
+    """
+    Return the figure for key, building it with build() on a miss
+    Specs are cached as plain dicts and a fresh Figure is returned each time,
+    so callers can't modify the cached copy. Put the data version in the key.
+    """
+    with _figure_cache_lock:
+        spec = _figure_cache.get(key)
+        if spec is not None:
+            _figure_cache.move_to_end(key)
+    if spec is not None:
+        METRICS.cache_hit('figure_spec')
+        return go.Figure(spec)
+    
+    METRICS.cache_miss('figure_spec')
+    fig = build()
+    with _figure_cache_lock:
+        _figure_cache[key] = fig.to_dict()
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return fig
+
+def create_score_trend_chart(trend_df):
+    """
+    Create a WebGL line chart of bucketed score trends
+    trend_df comes from AnalysisDatabase.get_score_trend: one row per time
+    bucket with the mean score and its min-max range shown as a band.
+    """
+    fig = go.Figure()
+    show_range = bool(len(trend_df)) and trend_df['count'].max() > 1
+    series = [
+        ('semantic', 'Semantic Score', '#3399FF', 'rgba(51,153,255,0.15)'),
+        ('skill', 'Skill Match', '#00CC66', 'rgba(0,204,102,0.15)')
+    ]
+    
+    for prefix, name, color, band_color in series:
+        if show_range:
+            fig.add_trace(go.Scattergl(
+                x=trend_df['timestamp'],
+                y=trend_df[f'{prefix}_max'],
+                mode='lines',
+                line=dict(width=0),
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+            fig.add_trace(go.Scattergl(
+                x=trend_df['timestamp'],
+                y=trend_df[f'{prefix}_min'],
+                mode='lines',
+                line=dict(width=0),
+                fill='tonexty',
+                fillcolor=band_color,
+                name=f'{name} range',
+                hoverinfo='skip'
+            ))
+        fig.add_trace(go.Scattergl(
+            x=trend_df['timestamp'],
+            y=trend_df[f'{prefix}_mean'],
+            mode='lines',
+            line=dict(color=color, width=2),
+            name=name,
+            customdata=trend_df['count'],
+            hovertemplate='<b>%{x}</b><br>' + name + ': %{y:.1f}%<br>Analyses: %{customdata}<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        title="Match Scores Trend",
+        xaxis_title="Date",
+        yaxis_title="Score (%)",
+        yaxis=dict(range=[0, 100]),
+        height=450,
+        font={'family': "Arial"},
+        hovermode='x unified'
+    )
+    
+    return fig
+
+def get_score_trend_figure(db, max_points=TREND_MAX_POINTS):
+    """
+    Score trend figure for an AnalysisDatabase, at most max_points per trace
+    Buckets are aggregated in SQL and the figure is rebuilt only when the
+    table's data version changes.
+    """
+    key = ('score_trend', db.db_name, db.get_data_version(), max_points)
+    return cached_figure(key, lambda: create_score_trend_chart(db.get_score_trend(buckets=max_points)))